@@ -0,0 +1,169 @@
+"""
+asyncio HID transport layer
+
+Wraps a connected HID transport so that transfers can be awaited from an asyncio event loop.  The blocking
+transport calls are made on a dedicated I/O thread per transport, so a single event loop can drive many
+debuggers at once.
+
+Requires Python 3.5 or later.  No other module imports the asyncio modules, so the rest of the package still works
+on Python 2.
+"""
+import asyncio
+import threading
+import queue
+from logging import getLogger
+
+from ..pyedbglib_errors import PyedbglibTimeoutError
+
+# Python 3.5 and 3.6 only have get_event_loop, which returns the running loop when called from a coroutine
+_get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+class AsyncHidTransport(object):
+    """
+    asyncio front-end for a HID transport
+
+    Each request is executed as a whole on the I/O thread, so a transfer which times out or is cancelled after
+    it has been started still consumes its response.  A request cancelled before the I/O thread has started on it
+    is never sent.  After a timeout any late reports from the tool are read and discarded before the next request,
+    so that they are not taken as the response to it.  This needs a transport with set_read_timeout.
+    """
+
+    # Read timeout in milliseconds while discarding late reports, and the most reports to discard
+    DRAIN_TIMEOUT_MS = 50
+    MAX_DRAIN_REPORTS = 16
+
+    def __init__(self, transport, timeout=None):
+        """
+        :param transport: connected HID transport, for example a CyHidApiTransport
+        :param timeout: default timeout in seconds for each request, None to wait forever
+        """
+        self.logger = getLogger(__name__)
+        self.transport = transport
+        self.timeout = timeout
+        self._requests = queue.Queue()
+        # Set when a request has timed out, so that the transport is drained before the next request
+        self._timed_out = threading.Event()
+        self._thread = threading.Thread(target=self._io_thread, name="AsyncHidTransport I/O")
+        self._thread.daemon = True
+        self._thread.start()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Stops the I/O thread once all queued requests have been handled"""
+        if self._thread.is_alive():
+            self._requests.put(None)
+            self._thread.join()
+
+    def get_report_size(self):
+        """
+        Get the packet size in bytes
+
+        :return: bytes per packet/report
+        """
+        return self.transport.get_report_size()
+
+    def _io_thread(self):
+        """Executes queued requests on the wrapped transport"""
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            function, args, future, loop = request
+            if self._timed_out.is_set():
+                self._timed_out.clear()
+                self._drain()
+            if future.cancelled():
+                self.logger.debug("Skipping cancelled request")
+                continue
+            try:
+                result = function(*args)
+            except Exception as error:  # pylint: disable=broad-except
+                loop.call_soon_threadsafe(self._set_exception, future, error)
+            else:
+                loop.call_soon_threadsafe(self._set_result, future, result)
+
+    def _drain(self):
+        """Reads and discards reports which arrived after their request timed out"""
+        set_read_timeout = getattr(self.transport, 'set_read_timeout', None)
+        if set_read_timeout is None:
+            self.logger.warning("Cannot discard late reports: transport has no read timeout")
+            return
+        previous_timeout = getattr(self.transport, 'read_timeout_ms', None)
+        set_read_timeout(self.DRAIN_TIMEOUT_MS)
+        try:
+            for _ in range(self.MAX_DRAIN_REPORTS):
+                self.transport.hid_read()
+                self.logger.debug("Discarded late report")
+        except PyedbglibTimeoutError:
+            pass
+        except Exception as error:  # pylint: disable=broad-except
+            self.logger.warning("Draining transport failed: %s", error)
+        finally:
+            set_read_timeout(previous_timeout)
+
+    @staticmethod
+    def _set_result(future, result):
+        if not future.done():
+            future.set_result(result)
+
+    @staticmethod
+    def _set_exception(future, error):
+        if not future.done():
+            future.set_exception(error)
+
+    async def _request(self, function, args, timeout):
+        """
+        Queues a request for the I/O thread and waits for its outcome
+
+        :param function: transport function to call
+        :param args: arguments to the function
+        :param timeout: timeout in seconds, None to use the default timeout
+        :return: return value of the function
+        """
+        if not self._thread.is_alive():
+            raise IOError("AsyncHidTransport is closed")
+        loop = _get_running_loop()
+        future = loop.create_future()
+        self._requests.put((function, args, future, loop))
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError as error:
+            self._timed_out.set()
+            raise PyedbglibTimeoutError("HID request timed out after {:.3f}s".format(timeout)) from error
+
+    async def hid_transfer(self, data_send, timeout=None):
+        """
+        Sends HID data and receives response
+
+        :param data_send: data to send
+        :param timeout: timeout in seconds, None to use the default timeout
+        :return: response
+        """
+        return await self._request(self.transport.hid_transfer, (data_send,), timeout)
+
+    async def hid_write(self, data_send, timeout=None):
+        """
+        Sends HID data
+
+        :param data_send: data to send
+        :param timeout: timeout in seconds, None to use the default timeout
+        :return: number of bytes sent
+        """
+        return await self._request(self.transport.hid_write, (data_send,), timeout)
+
+    async def hid_read(self, timeout=None):
+        """
+        Reads HID data
+
+        :param timeout: timeout in seconds, None to use the default timeout
+        :return: data read
+        """
+        return await self._request(self.transport.hid_read, (), timeout)
@@ -11,6 +11,9 @@ except ImportError:
 from logging import getLogger
 from .hidtransportbase import HidTool
 from .hidtransportbase import HidTransportBase
+from .devicecache import device_cache, device_key
+from ..util.backoff import PollBackoff
+from ..pyedbglib_errors import PyedbglibTimeoutError
 
 
 class CyHidApiTransport(HidTransportBase):
@@ -22,6 +25,18 @@ class CyHidApiTransport(HidTransportBase):
         super(CyHidApiTransport, self).__init__()
         self.blocking = True
         self.hid_device = None
+        # Read timeout in milliseconds, None to wait forever
+        self.read_timeout_ms = None
+        # Delays between reads in non-blocking mode
+        self.read_backoff = PollBackoff(initial_delay=0.0005, factor=2.0, max_delay=0.01)
+
+    def set_read_timeout(self, timeout_ms):
+        """
+        Sets the time to wait for a response before giving up with a PyedbglibTimeoutError
+
+        :param timeout_ms: timeout in milliseconds, None to wait forever
+        """
+        self.read_timeout_ms = timeout_ms
 
     def _linux_udev_rule_check(self, device):
         """
@@ -43,7 +58,9 @@ class CyHidApiTransport(HidTransportBase):
         :return: number of devices connected
         """""
         self.logger.debug("Detecting Atmel/Microchip CMSIS-DAP compliant devices on USB")
-        devices = hid.enumerate()
+        self.devices = []
+        detected_keys = set()
+        devices = device_cache.get("hidapi", hid.enumerate)
         for device in devices:
             if device['vendor_id'] == 0x03EB:
                 # Python 2.7 does not know how to deal with unicode symbols implicitly
@@ -72,6 +89,10 @@ class CyHidApiTransport(HidTransportBase):
                                           device['serial_number'],
                                           device['product_string'],
                                           device['manufacturer_string'])
+                # Tools with several HID interfaces are listed once per interface, but are opened by serial number
+                if device_key(detected_device) in detected_keys:
+                    continue
+                detected_keys.add(device_key(detected_device))
                 self._linux_udev_rule_check(detected_device)
 
                 # Default to 64 until proven otherwise
@@ -127,14 +148,6 @@ class CyHidApiTransport(HidTransportBase):
         self.logger.info("Serial Number: {:s}".format(
             self.hid_device.get_serial_number_string()))
 
-    @staticmethod
-    def _hid_pad(data, size):
-        # Always send a full frame, plus the bonus-byte
-        while len(data) < size:
-            data.append(0x00)
-        # Put in the bonus byte
-        return bytearray([0]) + data
-
     def hid_transfer(self, data_send):
         """
         Sends HID data and receives response
@@ -145,22 +158,51 @@ class CyHidApiTransport(HidTransportBase):
         self.hid_write(data_send)
         return self.hid_read()
 
-    def hid_write(self, data_send):
+    def _hid_write_report(self, report):
         """
-        Sends HID data
+        Sends one padded report
 
-        :param data_send: data to send
+        :param report: report, including the report number byte
         :return: number of bytes sent
         """
-        # pad
-        data_send = self._hid_pad(data_send, self.device.packet_size)
-
-        # Write
-        self.logger.debug("HID::write of {:d} bytes".format(len(data_send)))
-        numbytes = self.hid_device.write(data_send)
+        self.logger.debug("HID::write of {:d} bytes".format(len(report)))
+        numbytes = self.hid_device.write(report)
         self.logger.debug("HID::write sent {:d} bytes".format(numbytes))
         return numbytes
 
+    def hid_transfer_into(self, data_send, buffer):
+        """
+        Sends HID data and receives the response into a buffer supplied by the caller
+
+        :param data_send: data to send
+        :param buffer: bytearray to receive the response into, at least one report in size
+        :return: number of bytes received
+        """
+        self.hid_write(data_send)
+        return self.hid_read_into(buffer)
+
+    def _hid_device_read(self):
+        """
+        Reads one report from the HID device
+
+        :return: list of bytes read
+        """
+        if self.blocking:
+            if self.read_timeout_ms is None:
+                return self.hid_device.read(self.device.packet_size)
+            # Let HIDAPI do the waiting
+            response = self.hid_device.read(self.device.packet_size, max(1, int(self.read_timeout_ms)))
+        else:
+            # Back off between reads rather than spinning on a busy tool
+            timeout = None if self.read_timeout_ms is None else self.read_timeout_ms / 1000.0
+            poller = self.read_backoff.start(timeout)
+            response = self.hid_device.read(self.device.packet_size)
+            while not response and poller.wait():
+                response = self.hid_device.read(self.device.packet_size)
+        if not response:
+            raise PyedbglibTimeoutError("HID read timed out after {} ms".format(self.read_timeout_ms))
+        return response
+
     def hid_read(self):
         """
         Reads HID data
@@ -168,12 +210,20 @@ class CyHidApiTransport(HidTransportBase):
         :return: data read
         """
         self.logger.debug("HID::read")
-        if self.blocking:
-            response = self.hid_device.read(self.device.packet_size)
-        else:
-            response = []
-            while not response:
-                # TODO: Non-blocking mode should have a timeout here.
-                response = self.hid_device.read(self.device.packet_size)
+        response = self._hid_device_read()
         self.logger.debug("HID::read read {:d} bytes".format(len(response)))
         return bytearray(response)
+
+    def hid_read_into(self, buffer):
+        """
+        Reads HID data into a buffer supplied by the caller
+
+        :param buffer: bytearray to read into, at least one report in size
+        :return: number of bytes read
+        """
+        self.logger.debug("HID::read_into")
+        response = self._hid_device_read()
+        numbytes = len(response)
+        buffer[0:numbytes] = response
+        self.logger.debug("HID::read_into read {:d} bytes".format(numbytes))
+        return numbytes
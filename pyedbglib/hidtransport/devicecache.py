@@ -0,0 +1,101 @@
+"""
+Cached device enumeration
+
+Enumerating the USB bus is slow when many tools are connected.  The transports share a DeviceCache so that
+constructing several transports (or a SerialPortMap) in quick succession can enumerate the bus only once.
+
+Caching is off by default, as tools connected or disconnected while an enumeration is reused are not seen.  To
+turn it on::
+
+    from pyedbglib.hidtransport.devicecache import device_cache
+    device_cache.ttl = 2.0
+"""
+import threading
+import time
+from contextlib import contextmanager
+from logging import getLogger
+
+# Default time in seconds that an enumeration is reused: caching is off unless asked for
+DEFAULT_TTL = 0
+
+
+class DeviceCache(object):
+    """Caches the result of device enumeration functions for a limited time"""
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        """
+        :param ttl: time in seconds that an enumeration is reused, 0 to always enumerate
+        """
+        self.logger = getLogger(__name__)
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Enumerations pinned by reuse, per thread
+        self._local = threading.local()
+
+    def get(self, key, enumerate_function):
+        """
+        Get the devices enumerated by a function, enumerating again only if the cached result has expired
+
+        :param key: cache key identifying the enumeration, for example the transport library name
+        :param enumerate_function: function returning a list of devices
+        :return: list of devices
+        """
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned is not None:
+            if key not in pinned:
+                pinned[key] = enumerate_function()
+            return list(pinned[key])
+        if self.ttl <= 0:
+            return list(enumerate_function())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                self.logger.debug("Using cached enumeration for '%s'", key)
+                return list(entry[1])
+        devices = enumerate_function()
+        with self._lock:
+            self._entries[key] = (time.time(), devices)
+        return list(devices)
+
+    @contextmanager
+    def reuse(self):
+        """
+        Enumerate at most once per key on the calling thread until the block exits, whatever the TTL
+
+        Other threads are not affected.
+        """
+        if getattr(self._local, 'pinned', None) is not None:
+            yield
+            return
+        self._local.pinned = {}
+        try:
+            yield
+        finally:
+            self._local.pinned = None
+
+    def invalidate(self, key=None):
+        """
+        Forget cached enumerations
+
+        :param key: cache key to forget, None to forget all
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+# Cache shared by all transports
+device_cache = DeviceCache()
+
+
+def device_key(device):
+    """
+    Get the key identifying a tool
+
+    :param device: HidTool instance
+    :return: (vendor ID, product ID, serial number) tuple
+    """
+    return device.vendor_id, device.product_id, device.serial_number
@@ -0,0 +1,280 @@
+"""
+HID transport layer using the Linux hidraw driver directly
+
+Devices are enumerated through sysfs and accessed through their /dev/hidraw* nodes, so neither the compiled hid
+module nor libusb is needed.
+"""
+import os
+import select
+import sys
+from logging import getLogger
+from .hidtransportbase import HidTool
+from .hidtransportbase import HidTransportBase
+from .devicecache import device_cache, device_key
+from ..pyedbglib_errors import PyedbglibTimeoutError
+
+SYSFS_HIDRAW_CLASS = "/sys/class/hidraw"
+DEV_ROOT = "/dev"
+
+# Atmel/Microchip USB vendor ID
+MICROCHIP_VENDOR_ID = 0x03EB
+
+
+def _read_sysfs_attribute(directory, name, default=""):
+    """
+    Reads one sysfs attribute file
+
+    :param directory: sysfs directory
+    :param name: attribute name
+    :param default: value to return if the attribute is missing or unreadable
+    :return: attribute value, stripped of whitespace
+    """
+    try:
+        with open(os.path.join(directory, name), 'r') as attribute:
+            return attribute.read().strip()
+    except (IOError, OSError):
+        return default
+
+
+class HidrawTransport(HidTransportBase):
+    """Implements all HID transport methods on top of the Linux hidraw driver"""
+
+    def __init__(self, sysfs_root=SYSFS_HIDRAW_CLASS, dev_root=DEV_ROOT):
+        self.logger = getLogger(__name__)
+        self.logger.debug("Linux hidraw transport")
+        self.sysfs_root = sysfs_root
+        self.dev_root = dev_root
+        self.fd = None
+        # Read timeout in milliseconds, None to wait forever
+        self.read_timeout_ms = None
+        super(HidrawTransport, self).__init__()
+
+    def set_read_timeout(self, timeout_ms):
+        """
+        Sets the time to wait for a response before giving up with a PyedbglibTimeoutError
+
+        :param timeout_ms: timeout in milliseconds, None to wait forever
+        """
+        self.read_timeout_ms = timeout_ms
+
+    def fileno(self):
+        """
+        Get the file descriptor of the open device, for use with select, epoll or an event loop
+
+        :return: file descriptor
+        """
+        return self.fd
+
+    def _usb_device_directory(self, hidraw_name):
+        """
+        Finds the sysfs directories of the USB interface and device a hidraw node belongs to
+
+        :param hidraw_name: name of the hidraw node, for example 'hidraw0'
+        :return: (interface directory, device directory), with None for any that was not found
+        """
+        directory = os.path.realpath(os.path.join(self.sysfs_root, hidraw_name, "device"))
+        interface_directory = None
+        while directory and directory != os.path.dirname(directory):
+            if interface_directory is None and os.path.exists(os.path.join(directory, "bInterfaceNumber")):
+                interface_directory = directory
+            if os.path.exists(os.path.join(directory, "idVendor")):
+                return interface_directory, directory
+            directory = os.path.dirname(directory)
+        return interface_directory, None
+
+    def _enumerate(self):
+        """
+        Enumerate the Atmel/Microchip hidraw nodes in sysfs
+
+        :return: list of device dicts with the same keys as hid.enumerate()
+        """
+        try:
+            hidraw_names = sorted(os.listdir(self.sysfs_root))
+        except OSError:
+            self.logger.debug("No hidraw devices found in %s", self.sysfs_root)
+            return []
+
+        devices = []
+        for hidraw_name in hidraw_names:
+            interface_directory, usb_directory = self._usb_device_directory(hidraw_name)
+            if usb_directory is None:
+                continue
+            try:
+                vendor_id = int(_read_sysfs_attribute(usb_directory, "idVendor"), 16)
+                product_id = int(_read_sysfs_attribute(usb_directory, "idProduct"), 16)
+            except ValueError:
+                continue
+            if vendor_id != MICROCHIP_VENDOR_ID:
+                continue
+            interface_number = -1
+            if interface_directory is not None:
+                interface_number = int(_read_sysfs_attribute(interface_directory, "bInterfaceNumber", "-1"), 16)
+            devices.append({'vendor_id': vendor_id,
+                            'product_id': product_id,
+                            'serial_number': _read_sysfs_attribute(usb_directory, "serial"),
+                            'product_string': _read_sysfs_attribute(usb_directory, "product"),
+                            'manufacturer_string': _read_sysfs_attribute(usb_directory, "manufacturer"),
+                            'path': os.path.join(self.dev_root, hidraw_name),
+                            'interface_number': interface_number})
+        return devices
+
+    def detect_devices(self):
+        """
+        Detect connected CMSIS-DAP devices, populating an internal list
+        :return: number of devices connected
+        """
+        self.logger.debug("Detecting Atmel/Microchip CMSIS-DAP compliant devices using hidraw")
+        self.devices = []
+        detected_keys = {}
+        for device in device_cache.get("hidraw:" + self.sysfs_root, self._enumerate):
+            detected_device = HidTool(device['vendor_id'],
+                                      device['product_id'],
+                                      device['serial_number'],
+                                      device['product_string'],
+                                      device['manufacturer_string'])
+            detected_device.path = device['path']
+            detected_device.interface_number = device['interface_number']
+            # Tools with several HID interfaces have one node per interface, keep the first interface only
+            key = device_key(detected_device)
+            if key in detected_keys:
+                index = detected_keys[key]
+                if 0 <= detected_device.interface_number < self.devices[index].interface_number:
+                    detected_device.packet_size = 64
+                    self.devices[index] = detected_device
+                continue
+            detected_keys[key] = len(self.devices)
+
+            log_str = "Detected {:04X}/{:04X}: '{}' ({}) from {} at {}"
+            self.logger.debug(log_str.format(detected_device.vendor_id,
+                                             detected_device.product_id,
+                                             detected_device.product_string,
+                                             detected_device.serial_number,
+                                             detected_device.manufacturer_string,
+                                             detected_device.path))
+
+            # Default to 64 until proven otherwise
+            detected_device.packet_size = 64
+            self.devices.append(detected_device)
+        return len(self.devices)
+
+    @staticmethod
+    def _open_device_node(path):
+        """
+        Opens a hidraw device node
+
+        :param path: path to the device node
+        :return: file descriptor
+        """
+        return os.open(path, os.O_RDWR)
+
+    def hid_connect(self, device):
+        """
+        Make a HID connection to the debugger
+
+        :param device:
+        :return:
+        """
+        self.logger.debug(
+            "Opening 0x%04X/%04X: '%s' (%s) at %s",
+            device.vendor_id, device.product_id, device.product_string, device.serial_number, device.path)
+        try:
+            self.fd = self._open_device_node(device.path)
+        except OSError:
+            if sys.platform.startswith("linux"):
+                self.logger.error('Unable to open %s - check that a udev rule exists for this device:\n'
+                                  'SUBSYSTEM=="hidraw",ATTRS{idVendor}=="%04X",ATTRS{idProduct}=="%04X",MODE="0666"',
+                                  device.path, device.vendor_id, device.product_id)
+            raise
+        return device
+
+    def hid_disconnect(self):
+        """
+        Disconnect from HID
+
+        :return:
+        """
+        self.logger.debug("Disconnecting hidraw")
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def hid_info(self):
+        """
+        Retrieve USB descriptor information
+
+        :return:
+        """
+        self.logger.info("Manufacturer: {:s}".format(self.device.manufacturer_string))
+        self.logger.info("Product: {:s}".format(self.device.product_string))
+        self.logger.info("Serial Number: {:s}".format(self.device.serial_number))
+
+    def hid_transfer(self, data_send):
+        """
+        Sends HID data and receives response
+
+        :param data_send:
+        :return: response
+        """
+        self.hid_write(data_send)
+        return self.hid_read()
+
+    def hid_transfer_into(self, data_send, buffer):
+        """
+        Sends HID data and receives the response into a buffer supplied by the caller
+
+        :param data_send: data to send
+        :param buffer: bytearray to receive the response into, at least one report in size
+        :return: number of bytes received
+        """
+        self.hid_write(data_send)
+        return self.hid_read_into(buffer)
+
+    def _hid_write_report(self, report):
+        """
+        Sends one padded report
+
+        :param report: report, including the report number byte which hidraw strips off for unnumbered reports
+        :return: number of bytes sent
+        """
+        self.logger.debug("HID::write of {:d} bytes".format(len(report)))
+        numbytes = os.write(self.fd, report)
+        self.logger.debug("HID::write sent {:d} bytes".format(numbytes))
+        return numbytes
+
+    def _wait_readable(self):
+        """Waits for a report to arrive, raising PyedbglibTimeoutError if the read timeout passes first"""
+        timeout = None if self.read_timeout_ms is None else self.read_timeout_ms / 1000.0
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            raise PyedbglibTimeoutError("HID read timed out after {} ms".format(self.read_timeout_ms))
+
+    def hid_read(self):
+        """
+        Reads HID data
+
+        :return: data read
+        """
+        self.logger.debug("HID::read")
+        self._wait_readable()
+        response = bytearray(os.read(self.fd, self.device.packet_size))
+        self.logger.debug("HID::read read {:d} bytes".format(len(response)))
+        return response
+
+    def hid_read_into(self, buffer):
+        """
+        Reads HID data into a buffer supplied by the caller
+
+        :param buffer: bytearray to read into, at least one report in size
+        :return: number of bytes read
+        """
+        self.logger.debug("HID::read_into")
+        self._wait_readable()
+        if hasattr(os, 'readv'):
+            # Read straight into the caller's buffer
+            numbytes = os.readv(self.fd, [memoryview(buffer)[0:self.device.packet_size]])
+        else:
+            response = os.read(self.fd, self.device.packet_size)
+            numbytes = len(response)
+            buffer[0:numbytes] = response
+        self.logger.debug("HID::read_into read {:d} bytes".format(numbytes))
+        return numbytes
@@ -22,6 +22,8 @@ class HidTool(object):
         self.serial_number = serial_number
         self.product_string = product_string
         self.manufacturer_string = manufacturer_string
+        # Device node, for transports which open devices by path
+        self.path = None
         self.firmware_version = ""
         self.device_vendor_id = ""
         self.device_name = ""
@@ -45,12 +47,21 @@ class HidTool(object):
 
 
 class HidTransportBase(object):
-    """Base class for HID transports"""
+    """
+    Base class for HID transports
+
+    A transport is not thread safe: every write goes through one report buffer, and a response is read by whoever
+    reads next.  Threads sharing a transport must make sure only one of them uses it at a time; JTAGICE3 protocol
+    objects do this through the Jtagice3Multiplexer of the transport.
+    """
 
     def __init__(self):
         self.logger = getLogger(__name__)
         self.devices = []
         self.device = None
+        # Report buffer reused for every write, with the report number byte first
+        self._report_buffer = None
+        self._report_padding = None
         self.detect_devices()
         self.connected = False
 
@@ -156,6 +167,124 @@ class HidTransportBase(object):
         """Raise error as this method needs to be overridden."""
         raise NotImplementedError("method needs to be defined by sub-class")
 
+    def hid_transfer(self, data_send):
+        """Raise error as this method needs to be overridden."""
+        raise NotImplementedError("method needs to be defined by sub-class")
+
+    def hid_read(self):
+        """Raise error as this method needs to be overridden."""
+        raise NotImplementedError("method needs to be defined by sub-class")
+
+    def _get_report_buffer(self):
+        """
+        Get the report buffer, allocating it the first time and whenever the packet size changes
+
+        :return: bytearray of one report plus the report number byte
+        """
+        size = self.device.packet_size + 1
+        if self._report_buffer is None or len(self._report_buffer) != size:
+            self._report_buffer = bytearray(size)
+            self._report_padding = memoryview(bytearray(size))
+        return self._report_buffer
+
+    def _hid_pad(self, data):
+        """
+        Copies data into the report buffer, padded to a full report
+
+        :param data: data to send
+        :return: report buffer, including the report number byte
+        """
+        numbytes = len(data)
+        report = self._get_report_buffer()
+        if numbytes >= len(report):
+            # Oversized packets are sent as they are
+            return bytearray(1) + bytearray(data)
+        report[1:numbytes + 1] = data
+        return self._pad_report_frame(numbytes)
+
+    def _pad_report_frame(self, length):
+        """
+        Pads the report buffer after the data already written into its frame
+
+        :param length: number of bytes written into the frame
+        :return: report buffer, including the report number byte
+        """
+        report = self._get_report_buffer()
+        # Always send a full frame, plus the bonus-byte
+        report[0] = 0
+        report[length + 1:] = self._report_padding[length + 1:]
+        return report
+
+    def get_report_frame(self):
+        """
+        Get the frame of the report buffer for building a packet in place
+
+        The frame excludes the report number byte.  Data written into it is sent by hid_write_frame or
+        hid_transfer_frame.  The frame is reused by every write on this transport, so it must be filled in after
+        any other packet has been sent, and by the only thread using the transport.
+
+        :return: memoryview of one report
+        """
+        return memoryview(self._get_report_buffer())[1:]
+
+    def _hid_write_report(self, report):
+        """Raise error as this method needs to be overridden."""
+        raise NotImplementedError("method needs to be defined by sub-class")
+
+    def hid_write(self, data_send):
+        """
+        Sends HID data
+
+        :param data_send: data to send
+        :return: number of bytes sent
+        """
+        return self._hid_write_report(self._hid_pad(data_send))
+
+    def hid_write_frame(self, length):
+        """
+        Sends the packet built in the report frame
+
+        :param length: number of bytes written into the frame, the rest is padded
+        :return: number of bytes sent
+        """
+        return self._hid_write_report(self._pad_report_frame(length))
+
+    def hid_transfer_frame(self, length):
+        """
+        Sends the packet built in the report frame and receives the response
+
+        :param length: number of bytes written into the frame, the rest is padded
+        :return: response
+        """
+        self.hid_write_frame(length)
+        return self.hid_read()
+
+    def hid_transfer_into(self, data_send, buffer):
+        """
+        Sends HID data and receives the response into a buffer supplied by the caller
+
+        Transports which can read directly into the buffer should override this.
+
+        :param data_send: data to send
+        :param buffer: bytearray to receive the response into, at least one report in size
+        :return: number of bytes received
+        """
+        response = self.hid_transfer(data_send)
+        buffer[0:len(response)] = response
+        return len(response)
+
+    def supports_pipelining(self):
+        """
+        Check if the transport can keep several packets in flight
+
+        Transports supporting this can send packets using hid_write before the responses to previous packets have
+        been collected using hid_read.
+
+        :return: True if pipelining is supported
+        """
+        # pylint: disable=no-self-use
+        return True
+
     def get_report_size(self):
         """
         Get the packet size in bytes
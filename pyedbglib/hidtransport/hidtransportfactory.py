@@ -1,7 +1,7 @@
 """
 Factory for HID transport connections.
 
-Currently supports only Cython/HIDAPI
+Supports Cython/HIDAPI on all platforms and the native hidraw driver on Linux
 """
 
 import platform
@@ -30,10 +30,11 @@ def hid_transport(library="hidapi"):
 
         housekeeper = housekeepingprotocol.Jtagice3HousekeepingProtocol(transport)
 
-    :param library: Transport library to use, currently only 'hidapi' is supported which will use the libusb hidapi
+    :param library: Transport library to use, either 'hidapi' which will use the libusb hidapi, or 'hidraw' which
+        will use the Linux hidraw driver directly
     :type library: string
     :returns: Instance of transport layer object
-    :rtype: class:cyhidapi:CyHidApiTransport
+    :rtype: class:cyhidapi:CyHidApiTransport or class:hidrawtransport:HidrawTransport
     """
     logger = getLogger(__name__)
     operating_system = platform.system().lower()
@@ -50,6 +51,16 @@ def hid_transport(library="hidapi"):
         logger.error(msg)
         raise PyedbglibNotSupportedError(msg)
 
+    # Native Linux hidraw transport, without the compiled hid module
+    if library == 'hidraw':
+        if operating_system in ['linux', 'linux2']:
+            from .hidrawtransport import HidrawTransport
+            return HidrawTransport()
+
+        msg = "System '{0:s}' not implemented for library '{1:s}'".format(operating_system, library)
+        logger.error(msg)
+        raise PyedbglibNotSupportedError(msg)
+
     # Other transports may include cmsis-dap DLL, atusbhid (dll or so) etc
     msg = "Transport library '{0}' not implemented.".format(library)
     logger.error(msg)
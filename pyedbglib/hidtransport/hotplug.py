@@ -0,0 +1,148 @@
+"""
+Hotplug detection
+
+A HotplugWatcher reports tools being connected or disconnected, and keeps the shared enumeration cache up to date
+when caching is turned on.
+"""
+import os
+import sys
+import threading
+from logging import getLogger
+from .devicecache import device_cache, device_key
+from .hidtransportfactory import hid_transport
+
+SYSFS_USB_DEVICES = "/sys/bus/usb/devices"
+SYSFS_HIDRAW_DEVICES = "/sys/class/hidraw"
+
+
+class HotplugWatcher(object):
+    """
+    Watches for tools being connected or disconnected
+
+    On Linux the USB and hidraw device lists in sysfs are polled, which is cheap, and the bus is only enumerated when
+    they have changed.  A tool may show up on USB before its HID interface is bound, so after a change the bus is
+    enumerated again at every poll until an enumeration finds no change.  On other systems the bus is enumerated at
+    every poll, so a longer interval should be used there.
+    Callbacks are called on the watcher thread with the HidTool that was added or removed.
+    """
+
+    def __init__(self, on_add=None, on_remove=None, interval=0.5, library="hidapi"):
+        """
+        :param on_add: function called with each HidTool connected
+        :param on_remove: function called with each HidTool disconnected
+        :param interval: polling interval in seconds
+        :param library: transport library used to enumerate tools
+        """
+        self.logger = getLogger(__name__)
+        self.on_add = on_add
+        self.on_remove = on_remove
+        self.interval = interval
+        self.library = library
+        self.devices = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._snapshot = None
+
+    def start(self):
+        """Enumerates the connected tools and starts watching for changes"""
+        self._snapshot = self._sysfs_snapshot()
+        with self._lock:
+            self.devices = self._enumerate(invalidate=False)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="HotplugWatcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops watching"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def get_devices(self):
+        """
+        Get the tools currently connected
+
+        :return: list of HidTool
+        """
+        with self._lock:
+            return list(self.devices)
+
+    @staticmethod
+    def _sysfs_snapshot():
+        """
+        Get the USB and hidraw devices listed in sysfs
+
+        :return: set of sysfs device paths, or None if sysfs is not available
+        """
+        if not sys.platform.startswith("linux"):
+            return None
+        snapshot = set()
+        for directory in (SYSFS_USB_DEVICES, SYSFS_HIDRAW_DEVICES):
+            try:
+                snapshot.update(os.path.join(directory, name) for name in os.listdir(directory))
+            except OSError:
+                if directory == SYSFS_USB_DEVICES:
+                    return None
+        return frozenset(snapshot)
+
+    def _enumerate(self, invalidate=True):
+        """
+        Enumerate the connected tools
+
+        :param invalidate: forget the cached enumeration first
+        :return: list of HidTool
+        """
+        if invalidate:
+            device_cache.invalidate()
+        return hid_transport(self.library).devices
+
+    def _watch(self):
+        """Polls for changes until stopped"""
+        settling = False
+        while not self._stop.wait(self.interval):
+            snapshot = self._sysfs_snapshot()
+            changed = snapshot != self._snapshot
+            if snapshot is not None and not changed and not settling:
+                continue
+            try:
+                devices = self._enumerate()
+            except Exception as error:  # pylint: disable=broad-except
+                # The snapshot is left as it was, so the next poll enumerates again
+                self.logger.warning("Enumeration failed while watching for tools: %s", error)
+                continue
+            self._snapshot = snapshot
+            # Enumerate again at the next poll until the result is stable
+            settling = self.update(devices) or changed
+
+    def update(self, devices):
+        """
+        Updates the list of connected tools and reports the tools added and removed
+
+        :param devices: list of HidTool now connected
+        :return: True if any tool was added or removed
+        """
+        with self._lock:
+            previous = dict((device_key(device), device) for device in self.devices)
+            current = dict((device_key(device), device) for device in devices)
+            removed = [device for key, device in previous.items() if key not in current]
+            added = [device for key, device in current.items() if key not in previous]
+            self.devices = [previous.get(device_key(device), device) for device in devices]
+        for device in removed:
+            self.logger.debug("Tool removed: '%s' (%s)", device.product_string, device.serial_number)
+            if self.on_remove is not None:
+                self.on_remove(device)
+        for device in added:
+            self.logger.debug("Tool added: '%s' (%s)", device.product_string, device.serial_number)
+            if self.on_add is not None:
+                self.on_add(device)
+        return bool(removed or added)
@@ -0,0 +1,180 @@
+"""
+Pool of connections to several tools
+
+A ToolPool connects to every tool matching a filter and runs the same operation on all of them concurrently, for
+example to program several boards at once::
+
+    from pyedbglib.hidtransport.toolpool import ToolPool
+    from pyedbglib.protocols.housekeepingprotocol import Jtagice3HousekeepingProtocol
+
+    def read_voltage(transport):
+        housekeeper = Jtagice3HousekeepingProtocol(transport)
+        housekeeper.start_session()
+        try:
+            return housekeeper.read_target_voltage()
+        finally:
+            housekeeper.end_session()
+
+    with ToolPool(product='nedbg') as pool:
+        for serial_number, result in pool.run(read_voltage).items():
+            if result.ok:
+                print("{}: {:.2f}V".format(serial_number, result.value))
+            else:
+                print("{}: failed ({})".format(serial_number, result.error))
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from logging import getLogger
+from .hidtransportfactory import hid_transport
+from .devicecache import device_cache
+from ..pyedbglib_errors import PyedbglibError
+
+
+class ToolResult(object):
+    """Result of an operation run on one tool in a ToolPool"""
+
+    def __init__(self, serial_number, value=None, error=None):
+        """
+        :param serial_number: serial number of the tool
+        :param value: value returned by the operation
+        :param error: exception raised by the operation, None if it succeeded
+        """
+        self.serial_number = serial_number
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        """True if the operation succeeded"""
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return "ToolResult({!r}, value={!r})".format(self.serial_number, self.value)
+        return "ToolResult({!r}, error={!r})".format(self.serial_number, self.error)
+
+
+class ToolPool(object):
+    """
+    Connects to all tools matching a filter and hands out their transports
+
+    Each transport is leased to one user at a time, so an operation run on the pool never shares a tool with
+    another operation.
+    """
+
+    def __init__(self, serial_number_substring='', product=None, library="hidapi", max_workers=None,
+                 transport_factory=None):
+        """
+        :param serial_number_substring: connect to tools with serial numbers ending with this, '' for all
+        :param product: connect to tools of this product type only, None for any
+        :param library: transport library to use, see hidtransportfactory.hid_transport
+        :param max_workers: maximum number of tools operated on concurrently, None for one thread per tool
+        :param transport_factory: function returning a new transport, defaults to hid_transport(library)
+        """
+        self.logger = getLogger(__name__)
+        self.serial_number_substring = serial_number_substring
+        self.product = product
+        self.max_workers = max_workers
+        if transport_factory is None:
+            transport_factory = lambda: hid_transport(library)
+        self.transport_factory = transport_factory
+        self.transports = {}
+        self._locks = {}
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """
+        Connects to all matching tools
+
+        Every transport created enumerates the bus, so the bus is enumerated once and that result is reused by
+        the transports of all tools.
+
+        :return: number of tools connected
+        """
+        with device_cache.reuse():
+            return self._open()
+
+    def _open(self):
+        """Connects to all matching tools, see open"""
+        candidates = self.transport_factory().get_matching_tools(self.serial_number_substring, self.product)
+        for device in candidates:
+            if device.serial_number in self.transports:
+                continue
+            transport = self.transport_factory()
+            try:
+                connected = transport.connect(serial_number=device.serial_number, product=self.product)
+            except IOError as error:
+                self.logger.error("Unable to connect to %s (%s): %s", device.product_string, device.serial_number,
+                                  error)
+                connected = False
+            if not connected:
+                transport.disconnect()
+                continue
+            self.logger.debug("Connected to %s (%s)", device.product_string, device.serial_number)
+            self.transports[device.serial_number] = transport
+            self._locks[device.serial_number] = threading.Lock()
+        return len(self.transports)
+
+    def close(self):
+        """Disconnects from all tools"""
+        for serial_number in list(self.transports):
+            with self._locks[serial_number]:
+                self.transports.pop(serial_number).disconnect()
+        self._locks = {}
+
+    def serial_numbers(self):
+        """
+        Get the serial numbers of the tools connected
+
+        :return: list of serial numbers
+        """
+        return sorted(self.transports)
+
+    @contextmanager
+    def lease(self, serial_number):
+        """
+        Leases the transport of one tool, waiting until no one else is using it
+
+        :param serial_number: serial number of the tool
+        :return: context manager giving the transport
+        """
+        if serial_number not in self.transports:
+            raise PyedbglibError("Tool '{}' is not connected in this pool".format(serial_number))
+        with self._locks[serial_number]:
+            yield self.transports[serial_number]
+
+    def _run_one(self, serial_number, operation, args, kwargs):
+        """Runs an operation on one tool, catching any error"""
+        try:
+            with self.lease(serial_number) as transport:
+                return ToolResult(serial_number, value=operation(transport, *args, **kwargs))
+        except Exception as error:  # pylint: disable=broad-except
+            self.logger.error("Operation failed on %s: %s", serial_number, error)
+            return ToolResult(serial_number, error=error)
+
+    def run(self, operation, *args, **kwargs):
+        """
+        Runs an operation on all tools concurrently
+
+        The operation is called as operation(transport, *args, **kwargs) once per tool, each on its own thread.
+        Protocol objects must be created inside the operation from the transport given.
+
+        :param operation: function to run
+        :return: dict of ToolResult by serial number
+        """
+        serial_numbers = self.serial_numbers()
+        if not serial_numbers:
+            return {}
+        max_workers = self.max_workers or len(serial_numbers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = dict((serial_number,
+                            executor.submit(self._run_one, serial_number, operation, args, kwargs))
+                           for serial_number in serial_numbers)
+        return dict((serial_number, future.result()) for serial_number, future in futures.items())
@@ -14,6 +14,8 @@ class MpLabTransport(object):
         self.logger = getLogger(__name__)
         self.mplabcomm = tool
         self.packet_size = tool.GetPacketSize()
+        # Packet buffer reused for packets built in place
+        self._frame = bytearray(self.packet_size)
 
     def get_report_size(self):
         """
@@ -23,6 +25,11 @@ class MpLabTransport(object):
         """
         return self.mplabcomm.GetPacketSize()
 
+    def supports_pipelining(self):
+        """Blind writes and reads are not supported, so only one packet can be in flight"""
+        # pylint: disable=no-self-use
+        return False
+
     def hid_write(self, packet):
         """Sends a packet to HID and does not wait for a response"""
         # pylint: disable=unused-argument, no-self-use
@@ -43,3 +50,40 @@ class MpLabTransport(object):
         self.mplabcomm.Receive(response, len(response))
         # Convert and return
         return response
+
+    def hid_transfer_into(self, packet, buffer):
+        """
+        Sends a packet and receives the response into a buffer supplied by the caller
+
+        :param packet: packet to send
+        :param buffer: bytearray to receive the response into, at least one report in size
+        :return: number of bytes received
+        """
+        self.mplabcomm.Send(packet, len(packet))
+        self.mplabcomm.Receive(buffer, self.packet_size)
+        return self.packet_size
+
+    def get_report_frame(self):
+        """
+        Get the frame of the packet buffer for building a packet in place
+
+        :return: memoryview of one packet
+        """
+        return memoryview(self._frame)
+
+    def hid_write_frame(self, length):
+        """Sends the packet built in the frame and does not wait for a response"""
+        # pylint: disable=unused-argument, no-self-use
+        raise PyedbglibNotSupportedError("Blind write not supported")
+
+    def hid_transfer_frame(self, length):
+        """
+        Sends the packet built in the frame and receives a response
+
+        :param length: number of bytes written into the frame
+        :return: response
+        """
+        self.mplabcomm.Send(self._frame, length)
+        response = bytearray(self.packet_size)
+        self.mplabcomm.Receive(response, len(response))
+        return response
@@ -1,10 +1,16 @@
 """Interface to GEN4 script engine, based on Asynchronous Transport Interface"""
 
+import hashlib
+from collections import OrderedDict
 from logging import getLogger
+from concurrent.futures import Future
 from ..protocols.ati import AsynchronousTransportInterface
 from ..protocols.ati import get_ati_header
 from ..protocols.ati import ATI_EXEC_GEN4_SCRIPT
 from ..protocols.ati import ATI_RESPONSE_BUFFER_SIZE
+from ..protocols.ati import ATI_CTRL_TYPE_CMDRSP
+from ..protocols.ati import ATI_FRAME_PAYLOAD
+from ..protocols.ati import ATI_READY_TIMEOUT
 
 from ..pyedbglib_errors import PyedbglibNotSupportedError
 from ..util import binary
@@ -26,6 +32,9 @@ DATA_SOURCE_UNDEFINED = 0xFF
 DATA_DEST_UNDEFINED = 0xFF
 SCRIPT_SOURCE_INLINE = 0xFF
 
+# Offset of the parameter values in the command byte-stream (source ID, dest ID and number of parameters)
+GEN4_CMD_PARAMETERS_OFFSET = 3
+
 class Gen4Exception(Exception):
     """Custom Exception for GEN4 scripts"""
 
@@ -102,12 +111,232 @@ class Gen4ControllerCommand(object):
         return stream
 
 
+class Gen4CompiledScript(object):
+    """
+    A Gen4ControllerCommand compiled into the ATI frames which send it
+
+    The frames are built once.  Running the script again with other parameter values only patches the parameter bytes
+    in the frames.
+    """
+
+    def __init__(self, frames, parameter_offsets, payload_size):
+        """
+        :param frames: ATI frames writing the command buffer
+        :param parameter_offsets: list of (offset, size) of each parameter value in the command buffer
+        :param payload_size: number of command buffer bytes in each frame
+        """
+        self.frames = frames
+        self.parameter_offsets = parameter_offsets
+        self.payload_size = payload_size
+
+    def copy(self):
+        """
+        Get a copy with its own frames, which can be patched without affecting this script
+
+        :return: Gen4CompiledScript instance
+        """
+        return Gen4CompiledScript([bytearray(frame) for frame in self.frames], self.parameter_offsets,
+                                  self.payload_size)
+
+    def patch(self, parameters):
+        """
+        Sets new parameter values
+
+        :param parameters: list of parameter values (byte arrays), the same number and sizes as the compiled command
+        """
+        if len(parameters) != len(self.parameter_offsets):
+            raise Gen4Exception("Script takes {} parameters, {} given".format(len(self.parameter_offsets),
+                                                                           len(parameters)))
+        for (offset, size), value in zip(self.parameter_offsets, parameters):
+            if len(value) != size:
+                raise Gen4Exception("Parameter at offset {} is {} bytes, {} given".format(offset, size, len(value)))
+            for i, byte in enumerate(bytearray(value)):
+                fragment, position = divmod(offset + i, self.payload_size)
+                self.frames[fragment][ATI_FRAME_PAYLOAD + position] = byte
+
+
+class Gen4Response(object):
+    """
+    Response to a script execution
+
+    Only the script status is checked up front; the other fields are decoded when they are read.
+    """
+
+    def __init__(self, raw_results, data=None):
+        """
+        :param raw_results: response buffer contents, without the leading byte
+        :param data: data read back from the data buffer of the script, if any
+        """
+        self.raw_results = raw_results
+        self.data = data
+
+    def check(self):
+        """
+        Checks that the script succeeded
+
+        :raises Gen4Exception: if the script status is not OK
+        """
+        if self.script_status != 0x00:
+            raise Gen4Exception("Script failed, script status: 0x{:02X}".format(self.script_status))
+
+    def _le16(self, field):
+        return binary.unpack_le16(self.raw_results[field:field + 2])
+
+    @property
+    def version(self):
+        """Response envelope version"""
+        return self.raw_results[GEN4_RSP_VERSION_FIELD]
+
+    @property
+    def script_status(self):
+        """Script status, 0 for success"""
+        return self.raw_results[GEN4_RSP_SCRIPT_STATUS_FIELD]
+
+    @property
+    def engine_status(self):
+        """Script engine status"""
+        return self.raw_results[GEN4_RSP_ENGINE_STATUS_FIELD]
+
+    @property
+    def execution_time(self):
+        """Execution time reported by the tool"""
+        return self._le16(GEN4_RSP_EXECTIME_FIELD)
+
+    @property
+    def bytes_sent(self):
+        """Number of data bytes sent by the script"""
+        return self._le16(GEN4_RSP_BYTES_SENT_FIELD)
+
+    @property
+    def bytes_received(self):
+        """Number of data bytes received by the script"""
+        return self._le16(GEN4_RSP_BYTES_RECEIVED_FIELD)
+
+    @property
+    def result(self):
+        """32-bit result returned by the script"""
+        return binary.unpack_le32(self.raw_results[GEN4_RSP_RESULT_FIELD:GEN4_RSP_RESULT_FIELD + 4])
+
+
+class Gen4Pipeline(object):
+    """
+    Runs scripts one after another, overlapping host transfers with script execution
+
+    The data for the next script is written to one data buffer while the current script runs on the other, and data
+    read back by a script is collected while the next script runs.  Each submitted script gets a Future which is
+    resolved with a Gen4Response when the following script is submitted or the pipeline is flushed.
+    """
+
+    def __init__(self, controller, buffer_ids=(0, 1)):
+        """
+        :param controller: Gen4Controller instance
+        :param buffer_ids: IDs of the two data buffers to alternate between
+        """
+        self.controller = controller
+        self.buffer_ids = buffer_ids
+        self._next = 0
+        # (future, buffer ID, bytes to read back) of the script running on the tool
+        self._running = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def submit(self, script, data=None, read_bytes=None):
+        """
+        Queues a script for execution
+
+        :param script: script byte-code, a Gen4CompiledScript, or a function(buffer_id) returning either of them for
+            the data buffer given to this script
+        :param data: bytes-like data to write to the data buffer before the script runs, None for none
+        :param read_bytes: number of bytes to read back from the data buffer after the script runs, None for none
+        :return: Future resolved with the Gen4Response
+        """
+        buffer_id = self.buffer_ids[self._next]
+        future = Future()
+        previous = None
+        try:
+            if data is not None:
+                self.controller.write_data_buffer(buffer_id, data)
+            previous = self._finish()
+            if callable(script):
+                script = script(buffer_id)
+            if isinstance(script, Gen4CompiledScript):
+                self.controller.send_frames(0, script.frames)
+            else:
+                self.controller.start_script_execution(script)
+            self._running = (future, buffer_id, read_bytes)
+            # Only move on to the other buffer once this one is in use by a running script
+            self._next ^= 1
+        except Exception as error:  # pylint: disable=broad-except
+            future.set_exception(error)
+        self._collect(previous)
+        return future
+
+    def flush(self):
+        """Waits for the last script submitted and resolves its Future"""
+        self._collect(self._finish())
+
+    def _finish(self):
+        """Waits for the running script, without reading back its data yet"""
+        if self._running is None:
+            return None
+        future, buffer_id, read_bytes = self._running
+        self._running = None
+        try:
+            response = Gen4Response(self.controller.receive_script_execution_response())
+            response.check()
+        except Exception as error:  # pylint: disable=broad-except
+            future.set_exception(error)
+            return None
+        return future, response, buffer_id, read_bytes
+
+    def _collect(self, finished):
+        """Reads back the data of a finished script and resolves its Future"""
+        if finished is None:
+            return
+        future, response, buffer_id, read_bytes = finished
+        try:
+            if read_bytes:
+                response.data = self.controller.read_data_buffer(buffer_id, read_bytes)
+        except Exception as error:  # pylint: disable=broad-except
+            future.set_exception(error)
+            return
+        future.set_result(response)
+
+
+def script_command_buffer(script):
+    """
+    Generates the command buffer contents which start a script
+
+    :param script: array containing binary script byte-code to execute
+    :return: bytearray
+    """
+    cmd = get_ati_header(ATI_EXEC_GEN4_SCRIPT)
+    cmd.extend(bytearray([GEN4_ENVELOPE_VERSION_MAJOR, GEN4_ENVELOPE_VERSION_MINOR]))
+    cmd.extend([1])  # 1 section only
+    cmd.extend(binary.pack_le16(len(script)))
+    cmd.extend(script)
+    return cmd
+
+
 class Gen4Controller(AsynchronousTransportInterface):
     """Wrapper for accessing GEN4 "scripts" in 5G FW."""
 
-    def __init__(self, transport):
-        AsynchronousTransportInterface.__init__(self, transport)
+    # Number of compiled scripts to keep, least recently used ones are dropped first
+    MAX_COMPILED_SCRIPTS = 32
+
+    def __init__(self, transport, ready_timeout=ATI_READY_TIMEOUT):
+        """
+        :param transport: transport to use
+        :param ready_timeout: seconds to wait for an ATI buffer to become ready, None to wait forever
+        """
+        AsynchronousTransportInterface.__init__(self, transport, ready_timeout=ready_timeout)
         self.logger = getLogger(__name__)
+        # Compiled scripts by content hash, least recently used first
+        self.compiled_scripts = OrderedDict()
 
     def new_command(self, content=None):
         """
@@ -124,12 +353,77 @@ class Gen4Controller(AsynchronousTransportInterface):
 
         :param script: array containing binary script byte-code to execute
         """
-        cmd = get_ati_header(ATI_EXEC_GEN4_SCRIPT)
-        cmd.extend(bytearray([GEN4_ENVELOPE_VERSION_MAJOR, GEN4_ENVELOPE_VERSION_MINOR]))
-        cmd.extend([1])  # 1 section only
-        cmd.extend(binary.pack_le16(len(script)))
-        cmd.extend(script)
-        self.write_command_buffer(cmd)
+        self.write_command_buffer(script_command_buffer(script))
+
+    def compile_script(self, command):
+        """
+        Compiles a command into the frames which send it, or gets it from the cache of compiled scripts
+
+        Commands which differ only in their parameter values share one cached script.  Each call returns a copy of
+        it patched with the parameter values of the command, so the script returned belongs to the caller.
+
+        :param command: Gen4ControllerCommand instance
+        :return: Gen4CompiledScript instance with the parameter values of command
+        """
+        stream = command.generate_bytestream()
+        cmd = script_command_buffer(stream)
+        parameter_offsets = []
+        offset = len(cmd) - len(stream) + GEN4_CMD_PARAMETERS_OFFSET
+        for parameter in command.parameters:
+            parameter_offsets.append((offset, len(parameter)))
+            offset += len(parameter)
+        # The hash covers the command with the parameter values blanked out
+        template = bytearray(cmd)
+        for offset, size in parameter_offsets:
+            template[offset:offset + size] = bytearray(size)
+        key = (hashlib.sha1(bytes(template)).hexdigest(), tuple(size for _, size in parameter_offsets))
+        cached = self.compiled_scripts.pop(key, None)
+        if cached is None:
+            cached = Gen4CompiledScript(self.build_frames(0, cmd, buffer_type=ATI_CTRL_TYPE_CMDRSP),
+                                        parameter_offsets, self.fragment_size - ATI_FRAME_PAYLOAD)
+        compiled = cached.copy()
+        compiled.patch(command.parameters)
+        self.compiled_scripts[key] = cached
+        if len(self.compiled_scripts) > self.MAX_COMPILED_SCRIPTS:
+            self.compiled_scripts.popitem(last=False)
+        return compiled
+
+    def clear_compiled_scripts(self):
+        """Forgets all compiled scripts"""
+        self.compiled_scripts.clear()
+
+    def pipeline(self, buffer_ids=(0, 1)):
+        """
+        Makes a pipeline for running many scripts back to back
+
+        :param buffer_ids: IDs of the two data buffers to alternate between
+        :return: Gen4Pipeline instance
+        """
+        return Gen4Pipeline(self, buffer_ids)
+
+    def execute_compiled(self, compiled, parameters=None):
+        """
+        Runs a compiled script
+
+        :param compiled: Gen4CompiledScript instance from compile_script
+        :param parameters: new parameter values, None to keep the current values
+        :return: result
+        """
+        if parameters is not None:
+            compiled.patch(parameters)
+        self.send_frames(0, compiled.frames)
+        return self.finish_script_execution()
+
+    def execute_many(self, command, parameter_sets):
+        """
+        Runs the same script with each of a list of parameter sets
+
+        :param command: Gen4ControllerCommand instance
+        :param parameter_sets: iterable of lists of parameter values
+        :return: list of results
+        """
+        compiled = self.compile_script(command)
+        return [self.execute_compiled(compiled, parameters) for parameters in parameter_sets]
 
     def receive_script_execution_response(self):
         """
@@ -149,30 +443,44 @@ class Gen4Controller(AsynchronousTransportInterface):
         :return: results
         """
         self.start_script_execution(script)
-        raw_results = self.receive_script_execution_response()
-
-        rsp_version = raw_results[GEN4_RSP_VERSION_FIELD]
-        if rsp_version > GEN4_ENVELOPE_RESPONSE_VERSION:
-            self.logger.error("Unsupported response version (%d)", rsp_version)
-
-        script_status = raw_results[GEN4_RSP_SCRIPT_STATUS_FIELD]
-        self.logger.debug("Script status: %d", script_status)
-        if script_status != 0x00:
-            raise Gen4Exception("Script failed, script status: 0x{:02X}".format(script_status))
+        return self.finish_script_execution()
 
-        engine_status = raw_results[GEN4_RSP_ENGINE_STATUS_FIELD]
-        self.logger.debug("Engine status: %d", engine_status)
+    def execute_write_stream(self, script_for_buffer, chunks, buffer_ids=(0, 1)):
+        """
+        Runs a script on each chunk of a data stream, sending the next chunk while the current script runs
 
-        execution_time = binary.unpack_le16(raw_results[GEN4_RSP_EXECTIME_FIELD:GEN4_RSP_EXECTIME_FIELD + 2])
-        self.logger.debug("Execution time: %d", execution_time)
+        :param script_for_buffer: function(buffer_id) returning the script which consumes a data buffer
+        :param chunks: iterable of bytes-like chunks, each no larger than the data buffer
+        :param buffer_ids: IDs of the two data buffers to alternate between
+        :return: generator of script results, one per chunk
+        """
+        return self.write_stream(chunks, lambda buffer_id: self.start_script_execution(script_for_buffer(buffer_id)),
+                                 lambda buffer_id: self.finish_script_execution(), buffer_ids)
 
-        data_sent = binary.unpack_le16(raw_results[GEN4_RSP_BYTES_SENT_FIELD:GEN4_RSP_BYTES_SENT_FIELD + 2])
-        self.logger.debug("Data sent: %d", data_sent)
+    def execute_read_stream(self, script_for_buffer, count, num_bytes=None, buffer_ids=(0, 1)):
+        """
+        Runs scripts which fill data buffers, reading each buffer while the next script runs
+
+        :param script_for_buffer: function(buffer_id, index) returning the script which fills a data buffer with
+            chunk number index
+        :param count: number of chunks to read
+        :param num_bytes: number of bytes to read from each buffer, None for the whole buffer
+        :param buffer_ids: IDs of the two data buffers to alternate between
+        :return: generator of bytearrays read, one per chunk
+        """
+        def start(buffer_id, index):
+            self.start_script_execution(script_for_buffer(buffer_id, index))
 
-        data_received = binary.unpack_le16(raw_results[GEN4_RSP_BYTES_RECEIVED_FIELD:GEN4_RSP_BYTES_RECEIVED_FIELD + 2])
-        self.logger.debug("Data received: %d", data_received)
+        return self.read_stream(count, start, lambda buffer_id: self.finish_script_execution(), num_bytes, buffer_ids)
 
-        result = binary.unpack_le32(raw_results[GEN4_RSP_RESULT_FIELD:GEN4_RSP_RESULT_FIELD + 4])
-        self.logger.debug("Result: %08X", result)
+    def finish_script_execution(self):
+        """
+        Waits for the script started by start_script_execution and checks its response
 
-        return result
+        :return: result
+        """
+        response = Gen4Response(self.receive_script_execution_response())
+        if response.version > GEN4_ENVELOPE_RESPONSE_VERSION:
+            self.logger.error("Unsupported response version (%d)", response.version)
+        response.check()
+        return response.result
@@ -1,10 +1,15 @@
 """Interface to primitive sequence executer, based on Asynchronous Transport interface"""
 
+import copy
 from logging import getLogger
 from ..protocols.ati import AsynchronousTransportInterface
 from ..protocols.ati import get_ati_header
 from ..protocols.ati import ATI_EXEC_PIC_PRIMITIVE
+from ..protocols.ati import ATI_CTRL_TYPE_CMDRSP
+from ..protocols.ati import ATI_FRAME_PAYLOAD
 from ..protocols.ati import ATI_RESPONSE_BUFFER_SIZE
+from ..protocols.ati import ATI_READY_TIMEOUT
+from ..pyedbglib_errors import PyedbglibError
 from ..pyedbglib_errors import PyedbglibNotSupportedError
 from ..util import binary
 
@@ -15,6 +20,11 @@ DATA_SOURCE_UNDEFINED = 0xFF
 DATA_DEST_UNDEFINED = 0xFF
 PRIMITIVE_SOURCE_INLINE = 0xFF
 
+# Parameter fields: ID, flags and 32-bit little endian value
+PRIMITIVE_PARAMETER_ID = 0
+PRIMITIVE_PARAMETER_FLAGS = 1
+PRIMITIVE_PARAMETER_VALUE = 2
+
 
 class PrimitiveControllerCommand(object):
     """
@@ -58,13 +68,31 @@ class PrimitiveControllerCommand(object):
         self.prim_source = src_id
 
     def add_parameter(self, param_id, value, flags=0):
-        """Adds a parameter to the command"""
-        param = bytearray()
-        param.extend(param_id)
-        param.extend(flags)
-        param.extend(binary.pack_le32(value))
+        """
+        Adds a parameter to the command
+
+        :param param_id: parameter ID
+        :param value: 32-bit parameter value
+        :param flags: parameter flags
+        """
+        param = bytearray(PRIMITIVE_PARAMETER_VALUE + 4)
+        param[PRIMITIVE_PARAMETER_ID] = param_id
+        param[PRIMITIVE_PARAMETER_FLAGS] = flags
+        param[PRIMITIVE_PARAMETER_VALUE:] = binary.pack_le32(value)
         self.parameters.append(param)
-        raise PyedbglibNotSupportedError("Parameters are not yet supported!")
+
+    def set_parameter(self, param_id, value):
+        """
+        Updates the value of a parameter, adding it if the command does not have it yet
+
+        :param param_id: parameter ID
+        :param value: 32-bit parameter value
+        """
+        for param in self.parameters:
+            if param[PRIMITIVE_PARAMETER_ID] == param_id:
+                param[PRIMITIVE_PARAMETER_VALUE:] = binary.pack_le32(value)
+                return
+        self.add_parameter(param_id, value)
 
     def generate_bytestream(self):
         """
@@ -89,11 +117,39 @@ class PrimitiveControllerCommand(object):
         return stream
 
 
+def primitive_command_buffer(primitive_blocks):
+    """
+    Generates the command buffer contents which execute primitive blocks
+
+    :param primitive_blocks: blocks to execute, up to 255 blocks of up to 255 bytes each
+    :return: bytearray
+    :raises PyedbglibError: if there are too many blocks or a block is too long
+    """
+    if len(primitive_blocks) > 0xFF:
+        raise PyedbglibError("Too many primitive blocks ({}), at most 255 can be executed at once".format(
+            len(primitive_blocks)))
+    cmd = get_ati_header(ATI_EXEC_PIC_PRIMITIVE)
+    cmd.extend(bytearray([PRIMITIVE_ENVELOPE_VERSION_MAJOR, PRIMITIVE_ENVELOPE_VERSION_MINOR]))
+    cmd.extend([len(primitive_blocks)])  # number of blocks
+    for block in primitive_blocks:
+        # The block length is sent as one byte
+        if len(block) > 0xFF:
+            raise PyedbglibError("Primitive block of {} bytes is too long, blocks are at most 255 bytes".format(
+                len(block)))
+        cmd.extend([len(block)])
+        cmd.extend(block)
+    return cmd
+
+
 class PrimitiveController(AsynchronousTransportInterface):
     """Wrapper for accessing primitives and sequences thereof in 5G FW."""
 
-    def __init__(self, transport):
-        AsynchronousTransportInterface.__init__(self, transport)
+    def __init__(self, transport, ready_timeout=ATI_READY_TIMEOUT):
+        """
+        :param transport: transport to use
+        :param ready_timeout: seconds to wait for an ATI buffer to become ready, None to wait forever
+        """
+        AsynchronousTransportInterface.__init__(self, transport, ready_timeout=ready_timeout)
         self.logger = getLogger(__name__)
 
     def new_command(self, content=None):
@@ -101,14 +157,13 @@ class PrimitiveController(AsynchronousTransportInterface):
         return PrimitiveControllerCommand(content)
 
     def start_primitive_execution(self, primitive_blocks):
-        """Starts a primitive executing and returns immediately"""
-        cmd = get_ati_header(ATI_EXEC_PIC_PRIMITIVE)
-        cmd.extend(bytearray([PRIMITIVE_ENVELOPE_VERSION_MAJOR, PRIMITIVE_ENVELOPE_VERSION_MINOR]))
-        cmd.extend([len(primitive_blocks)])  # number of blocks
-        for block in primitive_blocks:
-            cmd.extend([len(block)])
-            cmd.extend(block)
-        self.write_command_buffer(cmd)
+        """
+        Starts a primitive executing and returns immediately
+
+        :param primitive_blocks: blocks to execute, up to 255 blocks of up to 255 bytes each
+        :raises PyedbglibError: if there are too many blocks or a block is too long
+        """
+        self.write_command_buffer(primitive_command_buffer(primitive_blocks))
 
     def receive_primitive_execution_response(self):
         """
@@ -143,3 +198,52 @@ class PrimitiveController(AsynchronousTransportInterface):
         :return: results
         """
         return self.execute([primitive_block])[0]
+
+    def _build_parameter_frames(self, command):
+        """
+        Builds the command buffer frames which execute a command as a single block
+
+        :param command: PrimitiveControllerCommand instance
+        :return: list of ATI frames, and dict of the command buffer offset of each parameter value by parameter ID
+        """
+        stream = command.generate_bytestream()
+        cmd = primitive_command_buffer([stream])
+        # The parameters follow the data source, data destination and parameter count bytes of the block
+        offset = len(cmd) - len(stream) + 3
+        value_offsets = {}
+        for parameter in command.parameters:
+            value_offsets[parameter[PRIMITIVE_PARAMETER_ID]] = offset + PRIMITIVE_PARAMETER_VALUE
+            offset += len(parameter)
+        return self.build_frames(0, cmd, buffer_type=ATI_CTRL_TYPE_CMDRSP), value_offsets
+
+    def execute_with_parameters(self, command, parameter_sets):
+        """
+        Runs the same command once for each set of parameter values
+
+        The command buffer frames are built once, and only the parameter values in them are patched for each set,
+        unless a set adds a parameter.  ATI writes the command buffer whole, so every frame is still sent for each
+        set.
+
+        :param command: PrimitiveControllerCommand instance, which is not modified
+        :param parameter_sets: iterable of dicts of parameter ID to value
+        :return: list of results, one per parameter set
+        """
+        command = copy.deepcopy(command)
+        payload_size = self.fragment_size - ATI_FRAME_PAYLOAD
+        frames = []
+        value_offsets = {}
+        results = []
+        for parameters in parameter_sets:
+            # A new parameter changes the layout of the block, so the frames are built again
+            rebuild = not frames or any(param_id not in value_offsets for param_id in parameters)
+            for param_id, value in parameters.items():
+                command.set_parameter(param_id, value)
+                if not rebuild:
+                    for i, byte in enumerate(binary.pack_le32(value)):
+                        fragment, position = divmod(value_offsets[param_id] + i, payload_size)
+                        frames[fragment][ATI_FRAME_PAYLOAD + position] = byte
+            if rebuild:
+                frames, value_offsets = self._build_parameter_frames(command)
+            self.send_frames(0, frames)
+            results.append(self.receive_primitive_execution_response()[0:4])
+        return results
@@ -0,0 +1,109 @@
+"""
+CMSIS-DAP wrapper for custom commands (using vendor extensions), for use with AsyncHidTransport
+
+asyncio counterpart of avrcmsisdap.AvrCommand.  Requires Python 3.5 or later.
+"""
+import asyncio
+from logging import getLogger
+from ..util import print_helpers
+from .asyncdapwrapper import AsyncDapWrapper
+from .avrcmsisdap import AvrCommand
+from .avrcmsisdap import AvrCommandError
+from .avrcmsisdap import AvrFrameCodec
+from .avrcmsisdap import default_poll_strategies
+
+
+class AsyncAvrCommand(AsyncDapWrapper):
+    """
+    Wraps AVR command and responses
+    """
+
+    # Vendor Commands used to transport AVR over CMSIS-DAP
+    AVR_COMMAND = AvrCommand.AVR_COMMAND
+    AVR_RESPONSE = AvrCommand.AVR_RESPONSE
+    AVR_EVENT = AvrCommand.AVR_EVENT
+
+    # Longest retry delay on AVR receive frame
+    AVR_RETRY_DELAY_MS = AvrCommand.AVR_RETRY_DELAY_MS
+
+    # Classes of commands, each with its own strategy for waiting for the response
+    POLL_DEFAULT = AvrCommand.POLL_DEFAULT
+    POLL_MEMORY = AvrCommand.POLL_MEMORY
+    POLL_ERASE = AvrCommand.POLL_ERASE
+    POLL_STEP = AvrCommand.POLL_STEP
+
+    def __init__(self, transport, no_timeouts=False):
+        self.no_timeouts = no_timeouts
+        self.timeout = 1000
+        AsyncDapWrapper.__init__(self, transport)
+        self.ep_size = transport.get_report_size()
+        self.codec = AvrFrameCodec(self.ep_size)
+        self.poll_strategies = default_poll_strategies()
+        # Number of AVR_RESPONSE polls needed by the last command
+        self.last_poll_count = 0
+        self.logger = getLogger(__name__)
+        self.logger.debug("Created async AVR command on DAP wrapper")
+
+    async def poll_events(self):
+        """
+        Polling for events from AVRs
+
+        :return: response from events
+        """
+        self.logger.debug("Polling AVR events")
+        return await self.dap_command_response(bytearray([self.AVR_EVENT]))
+
+    def set_poll_strategy(self, poll_class, strategy):
+        """
+        Sets how to wait for the responses to a class of commands
+
+        :param poll_class: command class, for example POLL_MEMORY
+        :param strategy: PollBackoff instance, its timeout is overridden by the timeout of this object
+        """
+        self.poll_strategies[poll_class] = strategy
+
+    async def _avr_response_receive_frame(self, poll_class=POLL_DEFAULT):
+        strategy = self.poll_strategies.get(poll_class, self.poll_strategies[self.POLL_DEFAULT])
+        poller = strategy.start(None if self.no_timeouts else self.timeout / 1000.0)
+        while True:
+            resp = await self.dap_command_response(bytearray([self.AVR_RESPONSE]))
+            self.last_poll_count += 1
+            if resp[0] != self.AVR_RESPONSE:
+                # Response received is not valid.  Abort.
+                raise AvrCommandError("AVR response DAP command failed; invalid token: 0x{:02X}".format(resp[0]))
+            if resp[1] != 0x00:
+                return resp
+            self.logger.debug("Resp: %s", print_helpers.bytelist_to_hex_string(resp))
+
+            delay = poller.next_delay()
+            if delay is None:
+                raise AvrCommandError("AVR response timeout")
+            # Give other tools on the event loop a go while this one is busy
+            await asyncio.sleep(delay)
+
+    async def avr_command_response(self, command, poll_class=POLL_DEFAULT):
+        """
+        Sends an AVR command and receives a response
+
+        The number of polls needed to collect the response is left in last_poll_count.
+
+        :param command: Command bytes to send
+        :param poll_class: command class selecting how to wait for the response
+        :return: Response bytes received (list)
+        """
+        self.last_poll_count = 0
+        fragments = self.codec.fragment_command_packet(command)
+        self.logger.debug("Sending AVR command")
+        for index, fragment in enumerate(fragments):
+            resp = await self.dap_command_response(fragment)
+            self.codec.check_command_fragment_response(resp, index == len(fragments) - 1)
+
+        # Receive response
+        frame = await self._avr_response_receive_frame(poll_class)
+        fragment_info, _, response = self.codec.parse_response_fragment(frame)
+        packets_remaining = (fragment_info & 0xF) - 1
+        for _ in range(0, packets_remaining):
+            frame = await self._avr_response_receive_frame(poll_class)
+            fragment_info, _, data = self.codec.parse_response_fragment(frame)
+            response.extend(data)
+        return list(response)
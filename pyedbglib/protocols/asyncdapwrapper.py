@@ -0,0 +1,48 @@
+"""
+Wrapper for any protocol over CMSIS-DAP, for use with AsyncHidTransport
+
+Requires Python 3.5 or later.
+"""
+
+from logging import getLogger
+
+
+class AsyncDapWrapper(object):
+    """Base class for any asyncio CMSIS-DAP protocol wrapper"""
+
+    def __init__(self, transport):
+        """
+        :param transport: AsyncHidTransport instance
+        """
+        self.logger = getLogger(__name__)
+        self.transport = transport
+        self.logger.debug("Created AsyncDapWrapper")
+
+    async def dap_command_response(self, packet, timeout=None):
+        """
+        Send a command, receive a response
+
+        :param packet: bytes to send
+        :param timeout: timeout in seconds, None to use the transport default
+        :return: response received
+        """
+        return await self.transport.hid_transfer(packet, timeout)
+
+    async def dap_command_write(self, packet, timeout=None):
+        """
+        Send a packet
+
+        :param packet: packed data to sent
+        :param timeout: timeout in seconds, None to use the transport default
+        :return: bytes sent
+        """
+        return await self.transport.hid_write(packet, timeout)
+
+    async def dap_command_read(self, timeout=None):
+        """
+        Receive data
+
+        :param timeout: timeout in seconds, None to use the transport default
+        :return: data received
+        """
+        return await self.transport.hid_read(timeout)
@@ -2,6 +2,8 @@
 
 from logging import getLogger
 from .dapwrapper import DapWrapper
+from ..util.backoff import PollBackoff
+from ..pyedbglib_errors import PyedbglibTimeoutError
 
 # ATI frame header fields
 ATI_FRAME_VENDOR_COMMAND_ID = 0
@@ -34,6 +36,9 @@ ATI_QUERY = 0
 ATI_DATA_BUFFER_SIZE = 512
 ATI_RESPONSE_BUFFER_SIZE = 512
 
+# Seconds to wait for a buffer to become ready before giving up, None to wait as long as a script runs
+ATI_READY_TIMEOUT = None
+
 ATI_ENVELOPE_VERSION = 1
 ATI_ENVELOPE_VERSION_VARIANT_DEFAULT = 0
 
@@ -42,6 +47,42 @@ ATI_EXEC_GEN4_SCRIPT = 0x10
 ATI_EXEC_PIC_PRIMITIVE = 0x30
 
 
+def iter_chunks(data, chunk_size):
+    """
+    Splits data into chunks without copying it
+
+    :param data: bytes-like data
+    :param chunk_size: maximum number of bytes per chunk
+    :return: generator of memoryview chunks
+    """
+    view = _as_view(data)
+    for offset in range(0, len(view), chunk_size):
+        yield view[offset:offset + chunk_size]
+
+
+def _as_view(data):
+    if isinstance(data, memoryview):
+        return data
+    if isinstance(data, (bytes, bytearray)):
+        return memoryview(data)
+    return memoryview(bytearray(data))
+
+
+def _write_frame(buffer_id, flags, data):
+    frame = bytearray(ATI_FRAME_PAYLOAD)
+    frame[ATI_FRAME_VENDOR_COMMAND_ID] = VENDOR_COMMAND_ATI
+    frame[ATI_FRAME_FLAGS] = (0 << ATI_CTRL_BIT_READNWRITE) | flags | buffer_id & 0x07
+    frame[ATI_FRAME_LENGTH] = (len(data) >> 8)
+    frame[ATI_FRAME_LENGTH + 1] = (len(data) & 0xFF)
+    frame += data
+    return frame
+
+
+def _write_accepted(resp):
+    # Flags = 1 means not ready yet, Flags = 2 means ok, data was received
+    return resp[0] == ATI_OK_FRAME[0] and resp[1] == ATI_OK_FRAME[1]
+
+
 def get_ati_header(handler, handler_variant=0):
     """
     Generates an ATI header for an ATI consumer
@@ -56,13 +97,24 @@ def get_ati_header(handler, handler_variant=0):
 class AsynchronousTransportInterface(DapWrapper):
     """Generic wrapper class for the Asynchronous Transport Interface (ATI)"""
 
-    def __init__(self, transport):
+    def __init__(self, transport, ready_poll=None, ready_timeout=ATI_READY_TIMEOUT):
+        """
+        :param transport: transport to use
+        :param ready_poll: PollBackoff policy for polling buffers which are not ready, None for the default
+        :param ready_timeout: seconds to wait for a buffer to become ready, None to use the timeout of ready_poll,
+            which by default waits forever since a buffer is not ready until the script using it has finished
+        """
         self.transport = transport
         super(AsynchronousTransportInterface, self).__init__(self.transport)
         self.logger = getLogger(__name__)
         # TODO: The buffer size should be queried from the tool implementation.
         self.data_buffer_size = ATI_DATA_BUFFER_SIZE
         self.fragment_size = self.transport.get_report_size()
+        self.ready_poll = ready_poll or PollBackoff(initial_delay=0.0005, factor=2.0, max_delay=0.01,
+                                                    immediate_polls=2)
+        self.ready_timeout = ready_timeout
+        # Number of polls which found the buffer not ready during the last buffer operation
+        self.not_ready_polls = 0
 
     def write_metadata_buffer(self, buffer_id, data):
         """
@@ -129,39 +181,85 @@ class AsynchronousTransportInterface(DapWrapper):
         :param data: bytearray of data bytes to write to the buffer
         """
         self.logger.info("Writing fragment to buffer %d (%d bytes)", buffer_id, len(data))
-        frame = bytearray(ATI_FRAME_PAYLOAD)
-        frame[ATI_FRAME_VENDOR_COMMAND_ID] = VENDOR_COMMAND_ATI
-        frame[ATI_FRAME_FLAGS] = (0 << ATI_CTRL_BIT_READNWRITE) | flags | buffer_id & 0x07
-        frame[ATI_FRAME_LENGTH] = (len(data) >> 8)
-        frame[ATI_FRAME_LENGTH + 1] = (len(data) & 0xFF)
-        frame.extend(data)
-        resp = ATI_FAILURE_FRAME
-        # Flags = 1 means not ready yet, Flags = 2 means ok, data was received
-        while resp[0] != ATI_OK_FRAME[0] or resp[1] != ATI_OK_FRAME[1]:
+        self._poll_until_ready(buffer_id, _write_frame(buffer_id, flags, data), _write_accepted)
+
+    def build_frames(self, buffer_id, data, buffer_type=ATI_CTRL_TYPE_DATA):
+        """
+        Builds the fragments which write data to a buffer, to be sent (possibly many times) with send_frames
+
+        :param buffer_id: ID of buffer to write data to
+        :param data: bytes-like data to be written
+        :param buffer_type: ATI_CTRL_TYPE_DATA, ATI_CTRL_TYPE_METADATA,
+                     ATI_CTRL_TYPE_CMDRSP or ATI_CTRL_TYPE_SYS
+        :return: list of ATI frames (bytearrays)
+        """
+        bytes_to_send = self.fragment_size - ATI_FRAME_PAYLOAD
+        view = _as_view(data)
+        frames = []
+        for offset in range(0, len(view), bytes_to_send):
+            flags = buffer_type
+            if offset == 0:
+                flags |= (1 << ATI_CTRL_BIT_FRAME_SOF)
+            if offset + bytes_to_send >= len(view):
+                flags |= (1 << ATI_CTRL_BIT_FRAME_EOF)
+            frames.append(_write_frame(buffer_id, flags, view[offset:offset + bytes_to_send]))
+        return frames
+
+    def send_frames(self, buffer_id, frames):
+        """
+        Sends fragments made by build_frames
+
+        :param buffer_id: ID of the buffer the frames write to
+        :param frames: list of ATI frames
+        """
+        self.not_ready_polls = 0
+        for frame in frames:
+            self._poll_until_ready(buffer_id, frame, _write_accepted)
+
+    def _poll_until_ready(self, buffer_id, frame, is_ready):
+        """
+        Sends a frame until the tool accepts it, backing off according to the ready_poll policy
+
+        :param buffer_id: ID of the buffer, for error messages
+        :param frame: ATI frame to send
+        :param is_ready: function returning True if a response shows that the tool was ready
+        :return: the accepted response
+        :raises PyedbglibTimeoutError: if the buffer is not ready before ready_timeout or the policy timeout
+        """
+        poller = self.ready_poll.start(self.ready_timeout)
+        while True:
             resp = self.dap_command_response(frame)
             self.logger.debug("Resp[0]: 0x%02X; Resp[1]: 0x%02X", resp[0], resp[1])
+            if is_ready(resp):
+                return resp
+            self.not_ready_polls += 1
+            if not poller.wait():
+                raise PyedbglibTimeoutError("Timeout waiting for ATI buffer {} after {} polls".format(
+                    buffer_id, poller.polls))
 
     def write_buffer(self, buffer_id, data, buffer_type=ATI_CTRL_TYPE_DATA):
         """
         Write data to a buffer. Will handle chopping of data to suit USB endpoint size
 
         :param buffer_id: ID of buffer to write data to
-        :param data: bytearray of data bytes to be written
+        :param data: bytearray (or other bytes-like object, such as a memoryview) of data bytes to be written
         :param buffer_type: ATI_CTRL_TYPE_DATA, ATI_CTRL_TYPE_METADATA,
                      ATI_CTRL_TYPE_CMDRSP or ATI_CTRL_TYPE_SYS
         """
         self.logger.info("Writing buffer %d (%d bytes)", buffer_id, len(data))
+        self.not_ready_polls = 0
         flags = buffer_type | (1 << ATI_CTRL_BIT_FRAME_SOF)
         bytes_to_send = self.fragment_size - ATI_FRAME_PAYLOAD
-        while data:
-            if bytes_to_send >= len(data):
-                bytes_to_send = len(data)
+        # Send views of the data rather than copying what is left for every fragment
+        view = _as_view(data)
+        offset = 0
+        while offset < len(view):
+            if offset + bytes_to_send >= len(view):
+                bytes_to_send = len(view) - offset
                 flags |= (1 << ATI_CTRL_BIT_FRAME_EOF)
-            # Extract a chunk
-            data_frame = data[:bytes_to_send]
-            self.send_fragment(buffer_id, flags, data_frame)
+            self.send_fragment(buffer_id, flags, view[offset:offset + bytes_to_send])
             flags = buffer_type
-            data = data[bytes_to_send:]
+            offset += bytes_to_send
 
     def receive_fragment(self, buffer_id, flags, bytes_to_receive):
         """
@@ -179,11 +277,8 @@ class AsynchronousTransportInterface(DapWrapper):
         frame[ATI_FRAME_FLAGS] = (1 << ATI_CTRL_BIT_READNWRITE) | flags | buffer_id & 0x07
         frame[ATI_FRAME_LENGTH] = (bytes_to_receive >> 8)
         frame[ATI_FRAME_LENGTH + 1] = (bytes_to_receive & 0xFF)
-        resp = ATI_FAILURE_FRAME
         # Flags = 0 means more data, flags = 2 means EOF and flags = 1 means data not ready yet
-        while resp[0] != VENDOR_COMMAND_ATI or resp[1] != 0x00:
-            resp = self.dap_command_response(frame)
-            self.logger.debug("Resp[0]: 0x%02X; Resp[1]: 0x%02X", resp[0], resp[1])
+        resp = self._poll_until_ready(buffer_id, frame, lambda resp: resp[0] == VENDOR_COMMAND_ATI and resp[1] == 0x00)
 
         bytes_received = (resp[ATI_FRAME_LENGTH] << 8) + resp[ATI_FRAME_LENGTH + 1]
         data = resp[ATI_FRAME_PAYLOAD:ATI_FRAME_PAYLOAD + bytes_received]
@@ -202,6 +297,7 @@ class AsynchronousTransportInterface(DapWrapper):
         if num_bytes is None:
             num_bytes = self.data_buffer_size
         self.logger.info("Reading buffer %d (%d bytes)", buffer_id, num_bytes)
+        self.not_ready_polls = 0
         flags = buffer_type | (1 << ATI_CTRL_BIT_FRAME_SOF)
         bytes_to_receive = self.fragment_size - ATI_FRAME_PAYLOAD
         data_read = bytearray()
@@ -219,3 +315,92 @@ class AsynchronousTransportInterface(DapWrapper):
             flags = buffer_type
             data_read += data
         return data_read
+
+    def write_stream(self, chunks, start, finish, buffer_ids=(0, 1)):
+        """
+        Streams data to the tool through two data buffers, filling one while the tool consumes the other
+
+        The next chunk is written while the tool works on the previous one:
+        write A, start A, write B, finish A, start B, write A, finish B, start A...
+
+        :param chunks: iterable of bytes-like chunks, each no larger than the data buffer
+        :param start: function(buffer_id) which starts the tool consuming a buffer and returns immediately
+        :param finish: function(buffer_id) which waits for the tool to be done with a buffer and returns the result
+        :param buffer_ids: IDs of the two data buffers to alternate between
+        :return: generator of the results of finish, one per chunk.  If the generator is closed early or fails,
+            finish is still called for a buffer which was started.
+        """
+        chunks = iter(chunks)
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        index = 0
+        self.write_data_buffer(buffer_ids[0], chunk)
+        start(buffer_ids[0])
+        running = buffer_ids[0]
+        try:
+            for chunk in chunks:
+                index ^= 1
+                self.write_data_buffer(buffer_ids[index], chunk)
+                running = None
+                result = finish(buffer_ids[index ^ 1])
+                start(buffer_ids[index])
+                running = buffer_ids[index]
+                yield result
+            running = None
+            yield finish(buffer_ids[index])
+        finally:
+            if running is not None:
+                self._finish_abandoned(finish, running)
+
+    def read_stream(self, count, start, finish, num_bytes=None, buffer_ids=(0, 1)):
+        """
+        Streams data from the tool through two data buffers, reading one while the tool fills the other
+
+        The previous buffer is read while the tool works on the next one:
+        start A, finish A, start B, read A, finish B, start A, read B...
+
+        :param count: number of buffers to read
+        :param start: function(buffer_id, index) which starts the tool filling a buffer with chunk number index and
+            returns immediately
+        :param finish: function(buffer_id) which waits for the tool to be done with a buffer
+        :param num_bytes: number of bytes to read from each buffer, None for the whole buffer
+        :param buffer_ids: IDs of the two data buffers to alternate between
+        :return: generator of bytearrays read, one per buffer.  If the generator is closed early or fails, finish is
+            still called for a buffer which was started.
+        """
+        if count <= 0:
+            return
+        buffer_id = buffer_ids[0]
+        start(buffer_id, 0)
+        running = buffer_id
+        try:
+            running = None
+            finish(buffer_id)
+            for index in range(1, count):
+                next_buffer_id = buffer_ids[index & 1]
+                start(next_buffer_id, index)
+                running = next_buffer_id
+                data = self.read_data_buffer(buffer_id, num_bytes)
+                running = None
+                finish(next_buffer_id)
+                buffer_id = next_buffer_id
+                yield data
+            yield self.read_data_buffer(buffer_id, num_bytes)
+        finally:
+            if running is not None:
+                self._finish_abandoned(finish, running)
+
+    def _finish_abandoned(self, finish, buffer_id):
+        """
+        Waits for the tool to be done with a buffer left behind by a stream which was stopped early
+
+        Errors are logged rather than raised, so that they do not hide the reason the stream was stopped.
+
+        :param finish: function(buffer_id) which waits for the tool to be done with a buffer
+        :param buffer_id: ID of the buffer
+        """
+        try:
+            finish(buffer_id)
+        except Exception as error:  # pylint: disable=broad-except
+            self.logger.warning("Abandoned work on ATI buffer %d failed: %s", buffer_id, error)
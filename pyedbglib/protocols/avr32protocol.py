@@ -24,6 +24,19 @@ class Avr32Protocol(Jtagice3Protocol):
     CMD_AVR32_IS_PROTECTED = 0x18
     CMD_AVR32_ERASE_SECTION = 0x19
 
+    # Event IDs
+    EVT_AVR32_BREAK = 0x40  # Break event
+
+    # How to wait for the responses to commands which take longer or shorter than most
+    COMMAND_POLL_CLASSES = {
+        CMD_AVR32_ERASE: Jtagice3Protocol.POLL_ERASE,
+        CMD_AVR32_ERASE_SECTION: Jtagice3Protocol.POLL_ERASE,
+        CMD_AVR32_READ: Jtagice3Protocol.POLL_MEMORY,
+        CMD_AVR32_WRITE: Jtagice3Protocol.POLL_MEMORY,
+        CMD_AVR32_HALT: Jtagice3Protocol.POLL_STEP,
+        CMD_AVR32_STEP: Jtagice3Protocol.POLL_STEP,
+    }
+
     RSP_AVR32_OK = 0x80
     RSP_AVR32_LIST = 0x81
     RSP_AVR32_ID = 0x82
@@ -5,7 +5,11 @@ Implements Avr8Protocol, a sub-protocol in the JTAGICE3 family of protocols.
 from logging import getLogger
 from .jtagice3protocol import Jtagice3Protocol
 from .avr8protocolerrors import AVR8_ERRORS
+from ..pyedbglib_errors import PyedbglibError
 from ..util import binary
+from ..util.memorycache import MemoryCache
+from ..util.memoryverify import MemoryVerifier, crc32
+from ..util.writeplanner import FlashWritePlanner, execute_plan
 
 
 class Avr8Protocol(Jtagice3Protocol):
@@ -44,6 +48,20 @@ class Avr8Protocol(Jtagice3Protocol):
     CMD_AVR8_SW_BREAK_CLEAR_ALL = 0x45  # Clear all software breakpoints
     CMD_AVR8_PAGE_ERASE = 0x50  # Erase page
 
+    # How to wait for the responses to commands which take longer or shorter than most
+    COMMAND_POLL_CLASSES = {
+        CMD_AVR8_ERASE: Jtagice3Protocol.POLL_ERASE,
+        CMD_AVR8_PAGE_ERASE: Jtagice3Protocol.POLL_ERASE,
+        CMD_AVR8_MEMORY_READ: Jtagice3Protocol.POLL_MEMORY,
+        CMD_AVR8_MEMORY_READ_MASKED: Jtagice3Protocol.POLL_MEMORY,
+        CMD_AVR8_MEMORY_WRITE: Jtagice3Protocol.POLL_MEMORY,
+        CMD_AVR8_CRC: Jtagice3Protocol.POLL_MEMORY,
+        CMD_AVR8_STOP: Jtagice3Protocol.POLL_STEP,
+        CMD_AVR8_RUN: Jtagice3Protocol.POLL_STEP,
+        CMD_AVR8_RUN_TO_ADDRESS: Jtagice3Protocol.POLL_STEP,
+        CMD_AVR8_STEP: Jtagice3Protocol.POLL_STEP,
+    }
+
     # Response IDs
     RSP_AVR8_OK = 0x80  # All OK
     RSP_AVR8_LIST = 0x81  # List of items returned
@@ -197,6 +215,11 @@ class Avr8Protocol(Jtagice3Protocol):
     AVR8_MEMTYPE_OCD = 0xD1  # On-chip debug memory
     AVR8_MEMTYPE_SIB = 0xD3  # UPDI System Information Block access
 
+    # Memory types which are written in whole pages
+    PAGED_MEMTYPES = (AVR8_MEMTYPE_SPM, AVR8_MEMTYPE_FLASH_PAGE, AVR8_MEMTYPE_EEPROM_PAGE, AVR8_MEMTYPE_APPL_FLASH,
+                      AVR8_MEMTYPE_BOOT_FLASH, AVR8_MEMTYPE_APPL_FLASH_ATOMIC, AVR8_MEMTYPE_BOOT_FLASH_ATOMIC,
+                      AVR8_MEMTYPE_EEPROM_ATOMIC, AVR8_MEMTYPE_USER_SIGNATURE)
+
     # Erase modes
     ERASE_CHIP = 0x00  # Erase the entire chip
     ERASE_APP = 0x01  # Erase application section only
@@ -207,10 +230,23 @@ class Avr8Protocol(Jtagice3Protocol):
     ERASE_EEPROM_PAGE = 0x06  # Erase EEPROM page
     ERASE_USERSIG = 0x07  # Erase User Signature page
 
+    # Bytes around the data in memory read responses and memory write commands, including the JTAGICE3 header
+    MEMORY_READ_OVERHEAD = 4 + 2 + 1
+    MEMORY_WRITE_OVERHEAD = 5 + 3 + 4 + 4 + 1
+
     def __init__(self, transport):
         self.logger = getLogger(__name__)
         super(Avr8Protocol, self).__init__(
             transport, Jtagice3Protocol.HANDLER_AVR8_GENERIC)
+        # Page sizes by memory type, used to align streamed memory accesses
+        self.page_sizes = {}
+        # Largest memory access to do in one command, None to fill a whole AVR command
+        self.max_memory_chunk = None
+        # Optional cache of memory read while the target is halted, see enable_memory_cache
+        self.memory_cache = None
+        self.cached_memtypes = ()
+        # True while the core is known to be halted, see set_target_halted
+        self.target_halted = False
 
     def error_as_string(self, code):
         """
@@ -271,6 +307,7 @@ class Avr8Protocol(Jtagice3Protocol):
         :param use_reset: reset
         :return:
         """
+        self.set_target_halted(False)
         self.logger.debug("Activate physical")
         # try:
         device_id = self.check_response(self.jtagice3_command_response(
@@ -283,6 +320,7 @@ class Avr8Protocol(Jtagice3Protocol):
 
     def deactivate_physical(self):
         """Deactivates the physical interface"""
+        self.set_target_halted(False)
         self.logger.debug("Deactivate physical")
         self.check_response(self.jtagice3_command_response(bytearray([self.CMD_AVR8_DEACTIVATE_PHYSICAL,
                                                                       self.CMD_VERSION0])))
@@ -290,12 +328,16 @@ class Avr8Protocol(Jtagice3Protocol):
     # Programming mode entry / exit commands
     def enter_progmode(self):
         """Enters programming mode"""
+        self.set_target_halted(False)
         self.logger.debug("Enter prog mode")
         self.check_response(self.jtagice3_command_response(bytearray([self.CMD_AVR8_PROG_MODE_ENTER,
                                                                       self.CMD_VERSION0])))
+        # The core does not run in programming mode
+        self.set_target_halted(True)
 
     def leave_progmode(self):
         """Exits programming mode"""
+        self.set_target_halted(False)
         self.logger.debug("Leave prog mode")
         self.check_response(self.jtagice3_command_response(bytearray([self.CMD_AVR8_PROG_MODE_LEAVE,
                                                                       self.CMD_VERSION0])))
@@ -316,12 +358,14 @@ class Avr8Protocol(Jtagice3Protocol):
 
         :param do_break: break execution on attach?
         """
+        self.set_target_halted(False)
         self.logger.debug("Attach")
         self.check_response(self.jtagice3_command_response(bytearray([self.CMD_AVR8_ATTACH, self.CMD_VERSION0,
                                                                       int(do_break)])))
 
     def detach(self):
         """Detaches the debugger from the target"""
+        self.set_target_halted(False)
         self.logger.debug("Detach")
         self.check_response(self.jtagice3_command_response(bytearray([self.CMD_AVR8_DETACH, self.CMD_VERSION0])))
 
@@ -334,13 +378,86 @@ class Avr8Protocol(Jtagice3Protocol):
         :param mode: flash erase mode to use
         :param address: start address to erase from
         """
+        self.invalidate_memory_cache()
         return self.check_response(self.jtagice3_command_response(
             bytearray([self.CMD_AVR8_ERASE, self.CMD_VERSION0, mode]) + binary.pack_le32(address)))
 
+    def page_erase(self, address):
+        """
+        Erase one flash page
+
+        :param address: address of the page to erase
+        """
+        self.invalidate_memory_cache()
+        return self.check_response(self.jtagice3_command_response(
+            bytearray([self.CMD_AVR8_PAGE_ERASE, self.CMD_VERSION0]) + binary.pack_le32(address)))
+
+    def enable_memory_cache(self, memtypes=None, block_size=16):
+        """
+        Caches memory reads while the target is halted
+
+        Reads are only cached while target_halted is True, which is after reset and in programming mode, or after
+        set_target_halted(True) is called on a BREAK event.  Nothing calls it unless an AvrEventListener is told to
+        with track_halts, otherwise the caller must do it.  The cache is cleared by every command which runs the
+        core, changes the connection or writes to the target.  Only enable it for memory types where reading has no
+        side effects; when the SRAM memory type includes I/O registers, reading a peripheral data register may clear
+        it on the target but not in the cache.
+
+        :param memtypes: memory types to cache, None for EEPROM and flash
+        :param block_size: bytes fetched at a time, the register file is always fetched whole and paged memory types
+            a page at a time, using the page size set when reading
+        """
+        if memtypes is None:
+            memtypes = (self.AVR8_MEMTYPE_EEPROM, self.AVR8_MEMTYPE_EEPROM_PAGE, self.AVR8_MEMTYPE_SPM,
+                        self.AVR8_MEMTYPE_FLASH_PAGE, self.AVR8_MEMTYPE_APPL_FLASH, self.AVR8_MEMTYPE_BOOT_FLASH)
+        self.cached_memtypes = tuple(memtypes)
+        self.memory_cache = MemoryCache(block_size, self._cache_block_size, self.memory_chunk_size)
+
+    def _cache_block_size(self, memtype):
+        """Get the block size of a memory type in the memory cache, None for the default"""
+        if memtype == self.AVR8_MEMTYPE_REGFILE:
+            return 32
+        return self.page_sizes.get(memtype)
+
+    def disable_memory_cache(self):
+        """Stops caching memory reads"""
+        self.memory_cache = None
+        self.cached_memtypes = ()
+
+    def invalidate_memory_cache(self):
+        """Forgets all cached memory, for use when the target may have changed behind this object's back"""
+        if self.memory_cache is not None:
+            self.memory_cache.invalidate()
+
+    def set_target_halted(self, halted):
+        """
+        Records whether the core is known to be halted, which is when memory reads may be cached
+
+        Commands which run the core or change the connection clear this themselves.  Call it with True on receiving
+        a BREAK event, or have an AvrEventListener do so with track_halts.
+
+        :param halted: True if the core is halted, False if it may be running
+        """
+        self.invalidate_memory_cache()
+        self.target_halted = halted
+
     def memory_read(self, memtype, address, num_bytes):
         """
         Read memory form the target
 
+        :param memtype: memory type (section)
+        :param address: start address
+        :param num_bytes: number of bytes
+        :return: bytearray of memory read
+        """
+        if self.target_halted and memtype in self.cached_memtypes:
+            return self.memory_cache.read(memtype, address, num_bytes, self._memory_read_uncached)
+        return bytearray(self._memory_read_uncached(memtype, address, num_bytes))
+
+    def _memory_read_uncached(self, memtype, address, num_bytes):
+        """
+        Read memory form the target, bypassing the cache
+
         :param memtype: memory type (section)
         :param address: start address
         :param num_bytes: number of bytes
@@ -351,6 +468,26 @@ class Avr8Protocol(Jtagice3Protocol):
             bytearray([self.CMD_AVR8_MEMORY_READ, self.CMD_VERSION0, memtype]) +
             binary.pack_le32(address) + binary.pack_le32(num_bytes)))
 
+    def memory_crc(self, memtype, address, num_bytes):
+        """
+        Calculates the CRC of a memory range on the tool, without reading it out
+
+        The range is given as for CMD_AVR8_MEMORY_READ, and the CRC is returned little endian in a data response.
+
+        :param memtype: memory type (section)
+        :param address: start address
+        :param num_bytes: number of bytes
+        :return: CRC value
+        """
+        self.logger.debug("Calculating memory CRC...")
+        data = self.check_response(self.jtagice3_command_response(
+            bytearray([self.CMD_AVR8_CRC, self.CMD_VERSION0, memtype]) +
+            binary.pack_le32(address) + binary.pack_le32(num_bytes)))
+        crc = 0
+        for index, value in enumerate(data):
+            crc |= value << (8 * index)
+        return crc
+
     def memory_write(self, memtype, address, data):
         """
         Write memory to target
@@ -359,17 +496,158 @@ class Avr8Protocol(Jtagice3Protocol):
         :param address: start address
         :param data: data to write
         """
+        self.invalidate_memory_cache()
         data = bytearray(data)
         return self.check_response(self.jtagice3_command_response(
             bytearray([self.CMD_AVR8_MEMORY_WRITE, self.CMD_VERSION0, memtype]) + binary.pack_le32(
                 address) + binary.pack_le32(len(data)) + bytearray([0x00]) + data))
 
+    def set_page_size(self, memtype, page_size):
+        """
+        Sets the page size of a memory type, so that streamed accesses to it are done in whole pages
+
+        :param memtype: memory type
+        :param page_size: page size in bytes
+        """
+        self.page_sizes[memtype] = page_size
+
+    def memory_chunk_size(self, memtype, write=False):
+        """
+        Get the largest number of bytes to read or write in one command
+
+        The size is limited by the number of fragments in one AVR command and rounded down to whole pages when the
+        page size of the memory type is known.
+
+        :param memtype: memory type
+        :param write: True for writes, False for reads
+        :return: chunk size in bytes
+        """
+        overhead = self.MEMORY_WRITE_OVERHEAD if write else self.MEMORY_READ_OVERHEAD
+        chunk = self.max_packet_size() - overhead
+        if self.max_memory_chunk is not None:
+            chunk = min(chunk, self.max_memory_chunk)
+        page_size = self.page_sizes.get(memtype)
+        if page_size and chunk >= page_size:
+            chunk -= chunk % page_size
+        return chunk
+
+    def memory_read_stream(self, memtype, address, num_bytes, chunk=None):
+        """
+        Read memory from the target in chunks, yielding each chunk as it is read
+
+        :param memtype: memory type (section)
+        :param address: start address
+        :param num_bytes: number of bytes
+        :param chunk: bytes to read per command, None to use memory_chunk_size
+        :return: generator of bytearray chunks
+        """
+        if chunk is None:
+            chunk = self.memory_chunk_size(memtype)
+        end = address + num_bytes
+        while address < end:
+            read_size = min(chunk, end - address)
+            yield bytearray(self.memory_read(memtype, address, read_size))
+            address += read_size
+
+    def memory_write_stream(self, memtype, address, chunks, chunk=None, erased_value=0xFF):
+        """
+        Write memory to the target from an iterable of data chunks of any size
+
+        The data is regrouped into commands of up to chunk bytes, which start at chunk aligned addresses except for
+        the first.  Only one command worth of data is held at a time.  Memory types in PAGED_MEMTYPES need their page
+        size set with set_page_size first, so that no command crosses a page boundary: the data is padded with
+        erased_value to start and end on page boundaries, which leaves the rest of those pages unchanged when they
+        have been erased.
+
+        :param memtype: memory type / region to access
+        :param address: start address
+        :param chunks: iterable of data chunks
+        :param chunk: bytes to write per command, None to use memory_chunk_size
+        :param erased_value: value of erased memory, used as padding for paged memory types
+        :return: number of bytes of data written, not counting padding
+        :raises PyedbglibError: if the page size of a paged memory type is not set or chunk is not whole pages
+        """
+        if chunk is None:
+            chunk = self.memory_chunk_size(memtype, write=True)
+        pending = bytearray()
+        page_size = None
+        if memtype in self.PAGED_MEMTYPES:
+            page_size = self.page_sizes.get(memtype)
+            if not page_size:
+                raise PyedbglibError("Page size of memory type 0x{:02X} must be set to stream writes".format(memtype))
+            if chunk % page_size:
+                raise PyedbglibError("Write chunk of {} bytes is not whole {} byte pages".format(chunk, page_size))
+            pending.extend([erased_value] * (address % page_size))
+            address -= address % page_size
+        written = 0
+        for data in chunks:
+            pending.extend(data)
+            written += len(data)
+            while len(pending) >= chunk - address % chunk:
+                write_size = chunk - address % chunk
+                self.memory_write(memtype, address, pending[:write_size])
+                del pending[:write_size]
+                address += write_size
+        if page_size and len(pending) % page_size:
+            pending.extend([erased_value] * (page_size - len(pending) % page_size))
+        if pending:
+            self.memory_write(memtype, address, pending)
+        return written
+
+    def write_flash_image(self, image, page_size, memtype=AVR8_MEMTYPE_FLASH_PAGE, chip_erase=True):
+        """
+        Programs a sparse memory image into flash using the fewest commands
+
+        :param image: iterable of (address, data) segments, or a dict of data by address
+        :param page_size: flash page size in bytes, as in the device data written by write_device_data
+        :param memtype: memory type to write
+        :param chip_erase: True to start with a chip erase, False to page erase only the pages written
+        :return: list of WriteOperation executed
+        """
+        planner = FlashWritePlanner(page_size, self.memory_chunk_size(memtype, write=True))
+        operations = planner.plan(image, chip_erase)
+        self.logger.debug("Writing flash image in %d commands", len(operations))
+        execute_plan(self, operations, memtype, self.ERASE_CHIP)
+        return operations
+
+    def verify_flash_image(self, image, page_size, memtype=AVR8_MEMTYPE_FLASH_PAGE, host_crc=crc32):
+        """
+        Checks that flash matches an image, using CRCs calculated by the tool where they match host_crc
+
+        :param image: iterable of (address, data) segments, or a dict of data by address
+        :param page_size: flash page size in bytes
+        :param memtype: memory type to verify
+        :param host_crc: function computing the CRC of a bytearray the same way as the tool, None to read back
+            all of the image
+        :return: True if flash matches the image
+        """
+        return MemoryVerifier(self, memtype, page_size, host_crc=host_crc).verify(image)
+
+    def update_flash_image(self, image, page_size, memtype=AVR8_MEMTYPE_FLASH_PAGE, host_crc=crc32):
+        """
+        Programs only the pages of an image which differ from flash
+
+        :param image: iterable of (address, data) segments, or a dict of data by address
+        :param page_size: flash page size in bytes
+        :param memtype: memory type to write
+        :param host_crc: function computing the CRC of a bytearray the same way as the tool, None to read back
+            all of the image
+        :return: list of WriteOperation executed
+        """
+        changed = MemoryVerifier(self, memtype, page_size, host_crc=host_crc).diff(image)
+        self.logger.debug("%d pages differ from the image", len(changed))
+        if not changed:
+            return []
+        return self.write_flash_image(changed, page_size, memtype, chip_erase=False)
+
     # Debugging flow-control functions
 
     def reset(self):
         """Resets the core and holds it in reset"""
+        self.set_target_halted(False)
         self.logger.debug("AVR core reset")
         self.check_response(self.jtagice3_command_response(bytearray([self.CMD_AVR8_RESET, self.CMD_VERSION0, 0x01])))
+        self.set_target_halted(True)
 
     def step(self):
         """
@@ -378,6 +656,7 @@ class Avr8Protocol(Jtagice3Protocol):
         A BREAK event will be generated when it has completed.
         This behaviour originates from previous debuggers which could do C level stepping which took time.
         """
+        self.set_target_halted(False)
         self.logger.debug("AVR core step")
         self.check_response(
             self.jtagice3_command_response(bytearray([self.CMD_AVR8_STEP, self.CMD_VERSION0, 0x01, 0x01])))
@@ -388,11 +667,13 @@ class Avr8Protocol(Jtagice3Protocol):
 
         A BREAK even will be generated when it has successfully stopped.
         """
+        self.set_target_halted(False)
         self.logger.debug("AVR core halt request")
         self.check_response(self.jtagice3_command_response(bytearray([self.CMD_AVR8_STOP, self.CMD_VERSION0, 0x01])))
 
     def run(self):
         """Resumes core execution"""
+        self.set_target_halted(False)
         self.logger.debug("AVR core resume")
         self.check_response(self.jtagice3_command_response(bytearray([self.CMD_AVR8_RUN, self.CMD_VERSION0])))
 
@@ -403,6 +684,7 @@ class Avr8Protocol(Jtagice3Protocol):
         A BREAK event will be generated when/if it reaches the address.
         :param address:
         """
+        self.set_target_halted(False)
         self.logger.debug("AVR core run to address")
         self.check_response(self.jtagice3_command_response(
             bytearray([self.CMD_AVR8_RUN_TO_ADDRESS, self.CMD_VERSION0]) + binary.pack_le32(address)))
@@ -427,6 +709,7 @@ class Avr8Protocol(Jtagice3Protocol):
 
         :param program_counter:
         """
+        self.invalidate_memory_cache()
         self.check_response(self.jtagice3_command_response(
             bytearray([self.CMD_AVR8_PC_WRITE, self.CMD_VERSION0]) + binary.pack_le32(program_counter)))
 
@@ -3,8 +3,8 @@ CMSIS-DAP wrapper for custom commands (using vendor extensions)
 This mechanism is used to pass JTAGICE3-style commands for AVR devices
 over the CMSIS-DAP interface
 """
-import time
 from logging import getLogger
+from ..util.backoff import PollBackoff
 from ..util.binary import unpack_be16
 from ..util import print_helpers
 from .cmsisdap import CmsisDapUnit
@@ -29,14 +29,27 @@ class AvrCommand(CmsisDapUnit):
     AVR_MORE_FRAGMENTS = 0x00
     AVR_FINAL_FRAGMENT = 0x01
 
-    # Retry delay on AVR receive frame
+    # The fragment count is sent in 4 bits
+    AVR_MAX_FRAGMENTS = 15
+
+    # Longest retry delay on AVR receive frame
     AVR_RETRY_DELAY_MS = 50
 
+    # Classes of commands, each with its own strategy for waiting for the response
+    POLL_DEFAULT = 'default'
+    POLL_MEMORY = 'memory'
+    POLL_ERASE = 'erase'
+    POLL_STEP = 'step'
+
     def __init__(self, transport, no_timeouts=False):
         self.no_timeouts = no_timeouts
         self.timeout = 1000
         CmsisDapUnit.__init__(self, transport)
         self.ep_size = transport.get_report_size()
+        self.codec = AvrFrameCodec(self.ep_size)
+        self.poll_strategies = default_poll_strategies()
+        # Number of AVR_RESPONSE polls needed by the last command
+        self.last_poll_count = 0
         self.logger = getLogger(__name__)
         self.logger.debug("Created AVR command on DAP wrapper")
 
@@ -50,12 +63,30 @@ class AvrCommand(CmsisDapUnit):
         resp = self.dap_command_response(bytearray([self.AVR_EVENT]))
         return resp
 
-    def _avr_response_receive_frame(self):
-        retries = int(self.timeout / self.AVR_RETRY_DELAY_MS)
-        # Get the delay in seconds
-        delay = self.AVR_RETRY_DELAY_MS / 1000
-        while retries or self.no_timeouts:
+    def set_poll_strategy(self, poll_class, strategy):
+        """
+        Sets how to wait for the responses to a class of commands
+
+        :param poll_class: command class, for example POLL_MEMORY
+        :param strategy: PollBackoff instance, its timeout is overridden by the timeout of this object
+        """
+        self.poll_strategies[poll_class] = strategy
+
+    def _start_polling(self, poll_class):
+        """
+        Starts waiting for a response according to the strategy for a class of commands
+
+        :param poll_class: command class
+        :return: BackoffPoller instance
+        """
+        strategy = self.poll_strategies.get(poll_class, self.poll_strategies[self.POLL_DEFAULT])
+        return strategy.start(None if self.no_timeouts else self.timeout / 1000.0)
+
+    def _avr_response_receive_frame(self, poll_class=POLL_DEFAULT):
+        poller = self._start_polling(poll_class)
+        while True:
             resp = self.dap_command_response(bytearray([self.AVR_RESPONSE]))
+            self.last_poll_count += 1
             if resp[0] != self.AVR_RESPONSE:
                 # Response received is not valid.  Abort.
                 raise AvrCommandError("AVR response DAP command failed; invalid token: 0x{:02X}".format(resp[0]))
@@ -63,72 +94,176 @@ class AvrCommand(CmsisDapUnit):
                 return resp
             self.logger.debug("Resp: %s", print_helpers.bytelist_to_hex_string(resp))
 
-            # Delay in seconds
-            time.sleep(delay)
-            retries -= 1
-        raise AvrCommandError("AVR response timeout")
+            # Re-poll straight away at first, then back off
+            if not poller.wait():
+                raise AvrCommandError("AVR response timeout")
+
+    def max_packet_size(self):
+        """
+        Get the largest command or response that fits in one AVR command
+
+        :return: size in bytes
+        """
+        return self.AVR_MAX_FRAGMENTS * (self.ep_size - 4)
 
     # Chops command up into fragments
     def _fragment_command_packet(self, command_packet):
-        packets_total = int((len(command_packet) / (self.ep_size - 4)) + 1)
-        self.logger.debug("Fragmenting AVR command into {:d} chunks".format(packets_total))
-        fragments = []
-        for i in range(0, packets_total):
-            command_fragment = bytearray([self.AVR_COMMAND, ((i + 1) << 4) + packets_total])
-            if (len(command_packet) - (i * (self.ep_size - 4))) > (self.ep_size - 4):
-                length = self.ep_size - 4
-            else:
-                length = len(command_packet) - (i * (self.ep_size - 4))
+        return self.codec.fragment_command_packet(command_packet)
 
-            command_fragment.append(int(length >> 8))
-            command_fragment.append(int(length & 0xFF))
+    # Sends an AVR command and waits for response
+    def avr_command_response(self, command, poll_class=POLL_DEFAULT):
+        """
+        Sends an AVR command and receives a response
 
-            for j in range(0, self.ep_size - 4):
-                if j < length:
-                    command_fragment.append(command_packet[i * (self.ep_size - 4) + j])
-                else:
-                    command_fragment.append(0x00)
+        The number of polls needed to collect the response is left in last_poll_count.
 
-            fragments.append(command_fragment)
-        return fragments
+        :param command: Command bytes to send
+        :param poll_class: command class selecting how to wait for the response
+        :return: Response bytes received (list)
+        """
+        self.avr_command_send(command)
+        return self.avr_response_receive(poll_class)
 
-    # Sends an AVR command and waits for response
-    def avr_command_response(self, command):
+    def avr_command_send(self, command):
         """
-        Sends an AVR command and receives a response
+        Sends an AVR command without waiting for its response
 
         :param command: Command bytes to send
-        :return: Response bytes received
         """
         fragments = self._fragment_command_packet(command)
         self.logger.debug("Sending AVR command")
-        for fragment in fragments:
+        for index, fragment in enumerate(fragments):
             self.logger.debug("Sending AVR command 0x{:02X}".format(fragment[0]))
             resp = self.dap_command_response(fragment)
-            if resp[0] != self.AVR_COMMAND:
-                raise AvrCommandError("AVR command DAP command failed; invalid token: 0x{:02X}".format(resp[0]))
-            if fragment == fragments[-1]:
-                if resp[1] != self.AVR_FINAL_FRAGMENT:
-                    raise AvrCommandError(
-                        "AVR command DAP command failed; invalid final fragment ack: 0x{:02X}".format(resp[1]))
-            else:
-                if resp[1] != self.AVR_MORE_FRAGMENTS:
-                    raise AvrCommandError(
-                        "AVR command DAP command failed; invalid non-final fragment ack: 0x{:02X}".format(resp[1]))
-
-        # Receive response
-        fragment_info, _, response = self._avr_response_receive_fragment()
+            self.codec.check_command_fragment_response(resp, index == len(fragments) - 1)
+
+    def avr_response_receive(self, poll_class=POLL_DEFAULT):
+        """
+        Waits for and receives the response to an AVR command
+
+        The number of polls needed to collect the response is left in last_poll_count.
+
+        :param poll_class: command class selecting how to wait for the response
+        :return: Response bytes received (list)
+        """
+        self.last_poll_count = 0
+        fragment_info, _, response = self._avr_response_receive_fragment(poll_class)
         packets_remaining = (fragment_info & 0xF) - 1
         for _ in range(0, packets_remaining):
-            fragment_info, _, data = self._avr_response_receive_fragment()
+            fragment_info, _, data = self._avr_response_receive_fragment(poll_class)
             response.extend(data)
-        return response
+        self.logger.debug("AVR response collected in %d polls", self.last_poll_count)
+        # The fragments are collected in a bytearray, but responses have always been returned as lists
+        return list(response)
 
-    def _avr_response_receive_fragment(self):
-        fragment = []
+    def _avr_response_receive_fragment(self, poll_class=POLL_DEFAULT):
         # Receive a frame
-        response = self._avr_response_receive_frame()
+        response = self._avr_response_receive_frame(poll_class)
+        return self.codec.parse_response_fragment(response)
 
+
+def default_poll_strategies():
+    """
+    Get the default strategies for waiting for AVR responses
+
+    Most commands complete within a few milliseconds, so the tool is re-polled straight away and then at a
+    quickly growing interval.  Erase takes tens of milliseconds, so polling for it starts slower.
+
+    :return: dict of PollBackoff instances by command class
+    """
+    max_delay = AvrCommand.AVR_RETRY_DELAY_MS / 1000.0
+    return {
+        AvrCommand.POLL_DEFAULT: PollBackoff(initial_delay=0.001, factor=2.0, max_delay=max_delay),
+        AvrCommand.POLL_MEMORY: PollBackoff(initial_delay=0.001, factor=2.0, max_delay=0.01),
+        AvrCommand.POLL_STEP: PollBackoff(initial_delay=0.0005, factor=2.0, max_delay=0.01),
+        AvrCommand.POLL_ERASE: PollBackoff(initial_delay=0.005, factor=2.0, max_delay=max_delay, immediate_polls=0),
+    }
+
+
+class AvrFrameCodec(object):
+    """
+    Builds AVR command fragments and parses AVR response fragments
+
+    The codec does no I/O, so it is shared by the blocking and the asyncio AVR command wrappers.
+    """
+
+    # Zeroed fragments with the AVR_COMMAND token in place, by endpoint size
+    _fragment_templates = {}
+
+    def __init__(self, ep_size):
+        self.logger = getLogger(__name__)
+        self.ep_size = ep_size
+        self.template = self._fragment_template(ep_size)
+
+    @classmethod
+    def _fragment_template(cls, ep_size):
+        """
+        Get the template command fragment for an endpoint size, creating it the first time
+
+        :param ep_size: endpoint size in bytes
+        :return: bytearray of one zeroed fragment starting with the AVR_COMMAND token
+        """
+        template = cls._fragment_templates.get(ep_size)
+        if template is None:
+            template = bytearray(ep_size)
+            template[0] = AvrCommand.AVR_COMMAND
+            cls._fragment_templates[ep_size] = template
+        return template
+
+    def fragment_command_packet(self, command_packet):
+        """
+        Chops a command up into fragments which each fit in one report
+
+        :param command_packet: command bytes
+        :return: list of fragments
+        """
+        payload_size = self.ep_size - 4
+        if not isinstance(command_packet, (bytearray, bytes)):
+            command_packet = bytearray(command_packet)
+        # Fragments are sliced out of the command without copying it first
+        source = memoryview(command_packet)
+        numbytes = len(source)
+        packets_total = numbytes // payload_size + 1
+        self.logger.debug("Fragmenting AVR command into {:d} chunks".format(packets_total))
+        fragments = []
+        for i in range(0, packets_total):
+            start = i * payload_size
+            length = min(payload_size, numbytes - start)
+            command_fragment = bytearray(self.template)
+            command_fragment[1] = ((i + 1) << 4) + packets_total
+            command_fragment[2] = length >> 8
+            command_fragment[3] = length & 0xFF
+            command_fragment[4:4 + length] = source[start:start + length]
+            fragments.append(command_fragment)
+        return fragments
+
+    @staticmethod
+    def check_command_fragment_response(resp, final):
+        """
+        Checks the response to a command fragment
+
+        :param resp: response received
+        :param final: True if the fragment sent was the final fragment
+        """
+        if resp[0] != AvrCommand.AVR_COMMAND:
+            raise AvrCommandError("AVR command DAP command failed; invalid token: 0x{:02X}".format(resp[0]))
+        if final:
+            if resp[1] != AvrCommand.AVR_FINAL_FRAGMENT:
+                raise AvrCommandError(
+                    "AVR command DAP command failed; invalid final fragment ack: 0x{:02X}".format(resp[1]))
+        else:
+            if resp[1] != AvrCommand.AVR_MORE_FRAGMENTS:
+                raise AvrCommandError(
+                    "AVR command DAP command failed; invalid non-final fragment ack: 0x{:02X}".format(resp[1]))
+
+    @staticmethod
+    def parse_response_fragment(response):
+        """
+        Extracts the payload of a response fragment
+
+        :param response: AVR_RESPONSE frame received
+        :return: fragment info, payload size, payload as a bytearray
+        """
         # Get the payload size from the header information
         size = unpack_be16(response[2:4])
 
@@ -137,8 +272,7 @@ class AvrCommand(CmsisDapUnit):
             raise AvrCommandError("Response size does not match the header information.")
 
         # Extract data
-        for i in range(0, size):
-            fragment.append(response[4 + i])
+        fragment = bytearray(response[4:4 + size])
 
         fragment_info = response[1]
         return fragment_info, size, fragment
@@ -0,0 +1,318 @@
+"""
+Events sent by the tool, such as the target hitting a breakpoint
+
+Example waiting for a step to complete::
+
+    avr = Avr8Protocol(transport)
+    with AvrEventListener(AvrCommand(transport)) as listener:
+        waiter = listener.expect(BreakEvent)
+        avr.step()
+        event = waiter.wait(timeout=1.0)
+
+A listener can also record BREAK events in an Avr8Protocol object, so that its memory cache is used while the target
+is halted::
+
+    avr.enable_memory_cache()
+    listener.track_halts(avr)
+
+The listener polls AVR_EVENT from its own thread, so give it its own AvrCommand object.  Polls are done under the
+lock of the Jtagice3Multiplexer of the transport, which every JTAGICE3 command also holds from sending the command
+until its response is collected, so a poll never takes the response to a command.
+"""
+import threading
+from logging import getLogger
+from ..util.backoff import PollBackoff
+from ..util.binary import unpack_be16, unpack_le16, unpack_le32
+from .avrcmsisdap import AvrCommand, AvrCommandError
+from .jtagice3multiplexer import Jtagice3Multiplexer
+from .jtagice3protocol import Jtagice3Protocol
+from .avr8protocol import Avr8Protocol
+from .avr32protocol import Avr32Protocol
+from .housekeepingprotocol import Jtagice3HousekeepingProtocol
+
+
+class AvrEvent(object):
+    """Event which has no specific type"""
+
+    def __init__(self, handler, event_id, sequence_id, payload):
+        self.handler = handler
+        self.event_id = event_id
+        self.sequence_id = sequence_id
+        self.payload = payload
+
+    def __repr__(self):
+        return "{}(handler=0x{:02X}, event_id=0x{:02X}, payload={})".format(
+            self.__class__.__name__, self.handler, self.event_id, list(self.payload))
+
+
+class BreakEvent(AvrEvent):
+    """The target stopped, for example at a breakpoint or after a step"""
+
+    def __init__(self, handler, event_id, sequence_id, payload):
+        AvrEvent.__init__(self, handler, event_id, sequence_id, payload)
+        # Program counter (word address) and the reason for the break
+        self.program_counter = unpack_le32(payload[0:4]) if len(payload) >= 4 else None
+        self.cause = payload[4] if len(payload) >= 5 else None
+
+
+class IdrEvent(AvrEvent):
+    """The target wrote to the debugger data register (OCD register)"""
+
+    def __init__(self, handler, event_id, sequence_id, payload):
+        AvrEvent.__init__(self, handler, event_id, sequence_id, payload)
+        self.value = payload[0] if payload else None
+
+
+class PowerEvent(AvrEvent):
+    """Target power was turned on or off"""
+
+    def __init__(self, handler, event_id, sequence_id, payload):
+        AvrEvent.__init__(self, handler, event_id, sequence_id, payload)
+        self.powered = bool(payload[0]) if payload else None
+
+
+class SleepEvent(AvrEvent):
+    """The target entered or left a sleep mode"""
+
+    def __init__(self, handler, event_id, sequence_id, payload):
+        AvrEvent.__init__(self, handler, event_id, sequence_id, payload)
+        self.sleeping = bool(payload[0]) if payload else None
+
+
+# Event types by (handler, event ID)
+EVENT_TYPES = {
+    (Jtagice3Protocol.HANDLER_AVR8_GENERIC, Avr8Protocol.EVT_AVR8_BREAK): BreakEvent,
+    (Jtagice3Protocol.HANDLER_AVR8_GENERIC, Avr8Protocol.EVT_AVR8_IDR): IdrEvent,
+    (Jtagice3Protocol.HANDLER_AVR32_GENERIC, Avr32Protocol.EVT_AVR32_BREAK): BreakEvent,
+    (Jtagice3Protocol.HANDLER_HOUSEKEEPING, Jtagice3HousekeepingProtocol.EVT_HOUSEKEEPING_POWER): PowerEvent,
+    (Jtagice3Protocol.HANDLER_HOUSEKEEPING, Jtagice3HousekeepingProtocol.EVT_HOUSEKEEPING_SLEEP): SleepEvent,
+}
+
+
+def parse_event(response):
+    """
+    Parses the response to an AVR_EVENT poll
+
+    :param response: AVR_EVENT response: 0x82, size (16-bit big endian) and the event packet
+    :return: AvrEvent instance, or None if there was no event
+    """
+    if not response or response[0] != AvrCommand.AVR_EVENT:
+        raise AvrCommandError("Invalid AVR event response")
+    if len(response) < 3:
+        return None
+    size = unpack_be16(response[1:3])
+    if size == 0:
+        return None
+    packet = response[3:3 + size]
+    # Event packet: token, sequence ID (16-bit little endian), handler, event ID and payload
+    if len(packet) < 5 or packet[0] != Jtagice3Protocol.JTAGICE3_TOKEN:
+        raise AvrCommandError("Invalid AVR event packet")
+    handler = packet[3]
+    event_id = packet[4]
+    event_type = EVENT_TYPES.get((handler, event_id), AvrEvent)
+    return event_type(handler, event_id, unpack_le16(packet[1:3]), bytearray(packet[5:]))
+
+
+class EventWaiter(object):
+    """Waits for one event of a given type, see AvrEventListener.expect"""
+
+    def __init__(self, listener, event_type):
+        self.listener = listener
+        self.event_type = event_type
+        self.event = None
+        self._ready = threading.Event()
+
+    def _offer(self, event):
+        if self.event is None and isinstance(event, self.event_type):
+            self.event = event
+            self._ready.set()
+            return True
+        return False
+
+    def wait(self, timeout=None):
+        """
+        Waits for the event
+
+        :param timeout: timeout in seconds, None to wait forever
+        :return: the event, or None if the timeout passed first
+        """
+        try:
+            self._ready.wait(timeout)
+            return self.event
+        finally:
+            self.listener._remove_waiter(self)  # pylint: disable=protected-access
+
+
+class AvrEventListener(object):
+    """
+    Polls for events in a background thread and dispatches them
+
+    Polling starts fast and backs off while no events arrive, returning to the fast rate after each event.  Events
+    are passed to registered callbacks, to asyncio queues and to threads waiting for them.  Callbacks are called
+    from the listener thread.
+    """
+
+    def __init__(self, avr_command, backoff=None):
+        """
+        :param avr_command: AvrCommand instance to poll events with, not used by other threads
+        :param backoff: PollBackoff policy for the poll rate, None for the default
+        """
+        self.logger = getLogger(__name__)
+        self.avr_command = avr_command
+        self.backoff = backoff or PollBackoff(initial_delay=0.001, factor=2.0, max_delay=0.05, immediate_polls=2)
+        # Shared with the JTAGICE3 commands on the transport
+        self.lock = Jtagice3Multiplexer.for_transport(avr_command.transport).lock
+        self._callbacks = []
+        self._queues = []
+        self._waiters = []
+        self._halt_trackers = []
+        self._dispatch_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        # Number of AVR_EVENT polls done
+        self.polls = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def add_callback(self, callback):
+        """
+        Registers a function to be called with each event
+
+        :param callback: function taking an AvrEvent
+        """
+        with self._dispatch_lock:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        """
+        Unregisters a function added with add_callback
+
+        :param callback: function to remove
+        """
+        with self._dispatch_lock:
+            self._callbacks.remove(callback)
+
+    def track_halts(self, protocol):
+        """
+        Calls set_target_halted(True) on a protocol object on each of its BREAK events
+
+        This is done before the event is passed on, so anyone woken by the event finds the target marked halted.
+
+        :param protocol: Avr8Protocol instance
+        """
+        with self._dispatch_lock:
+            self._halt_trackers.append(protocol)
+
+    def add_queue(self, queue, loop):
+        """
+        Puts each event in an asyncio queue
+
+        :param queue: asyncio.Queue to put events in
+        :param loop: event loop the queue belongs to
+        """
+        with self._dispatch_lock:
+            self._queues.append((queue, loop))
+
+    def expect(self, event_type=AvrEvent):
+        """
+        Starts waiting for an event
+
+        Call this before issuing the command which causes the event, so that the event is not missed.
+
+        :param event_type: AvrEvent class to wait for
+        :return: EventWaiter instance, call its wait method to get the event
+        """
+        waiter = EventWaiter(self, event_type)
+        with self._dispatch_lock:
+            self._waiters.append(waiter)
+        return waiter
+
+    def wait_for_event(self, event_type=AvrEvent, timeout=None):
+        """
+        Waits for the next event of a given type
+
+        :param event_type: AvrEvent class to wait for
+        :param timeout: timeout in seconds, None to wait forever
+        :return: the event, or None if the timeout passed first
+        """
+        return self.expect(event_type).wait(timeout)
+
+    def _remove_waiter(self, waiter):
+        with self._dispatch_lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def start(self):
+        """Starts polling in a background thread"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="AvrEventListener")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops polling and waits for the background thread to finish"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def poll(self):
+        """
+        Polls once for an event and dispatches it
+
+        :return: AvrEvent instance, or None if there was no event
+        """
+        with self.lock:
+            response = self.avr_command.poll_events()
+        self.polls += 1
+        event = parse_event(response)
+        if event is not None:
+            self.dispatch(event)
+        return event
+
+    def dispatch(self, event):
+        """
+        Passes an event to the callbacks, queues and waiters
+
+        :param event: AvrEvent instance
+        """
+        self.logger.debug("Event: %r", event)
+        if isinstance(event, BreakEvent):
+            with self._dispatch_lock:
+                halt_trackers = list(self._halt_trackers)
+            for protocol in halt_trackers:
+                if protocol.handler == event.handler:
+                    protocol.set_target_halted(True)
+        with self._dispatch_lock:
+            callbacks = list(self._callbacks)
+            queues = list(self._queues)
+            for waiter in self._waiters:
+                waiter._offer(event)  # pylint: disable=protected-access
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:  # pylint: disable=broad-except
+                self.logger.exception("Event callback failed")
+        for queue, loop in queues:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def _run(self):
+        poller = self.backoff.start()
+        while not self._stopping.is_set():
+            try:
+                event = self.poll()
+            except Exception as error:  # pylint: disable=broad-except
+                self.logger.warning("Event poll failed: %s", error)
+                event = None
+            if event is not None:
+                poller = self.backoff.start()
+                continue
+            self._stopping.wait(poller.next_delay())
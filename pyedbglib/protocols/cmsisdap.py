@@ -214,6 +214,9 @@ class CmsisDapDebugger(CmsisDapUnit):
     def __init__(self, transport):
         self.logger = getLogger(__name__)
         CmsisDapUnit.__init__(self, transport)
+        # Last known values of the AP CSW and TAR registers, None when unknown
+        self.ap_csw = None
+        self.ap_tar = None
 
     def dap_swj_clock(self, clock):
         """
@@ -268,6 +271,7 @@ class CmsisDapDebugger(CmsisDapUnit):
     def dap_reset_target(self):
         """Reset the target using the DAP"""
         self.logger.debug("dap_reset_target")
+        self.invalidate_ap_state()
         cmd = bytearray(1)
         cmd[0] = self.ID_DAP_ResetTarget
         rsp = self.dap_command_response(cmd)
@@ -290,8 +294,10 @@ class CmsisDapDebugger(CmsisDapUnit):
         rsp = self.dap_command_response(cmd)
         self._check_response(cmd, rsp)
         if rsp[1] != 1 or rsp[2] != self.DAP_TRANSFER_OK:
+            self.invalidate_ap_state()
             raise PyedbglibError("Read reg failed (0x{0:02X}, {1:02X})".format(rsp[1], rsp[2]))
         value = binary.unpack_le32(rsp[3:7])
+        self._track_ap_access(reg)
         return value
 
     def dap_write_reg(self, reg, value):
@@ -311,7 +317,92 @@ class CmsisDapDebugger(CmsisDapUnit):
         rsp = self.dap_command_response(cmd)
         self._check_response(cmd, rsp)
         if rsp[1] != 1 or rsp[2] != self.DAP_TRANSFER_OK:
+            self.invalidate_ap_state()
             raise PyedbglibError("Write reg failed (0x{0:02X}, {1:02X})".format(rsp[1], rsp[2]))
+        self._track_ap_access(reg, value)
+
+    def invalidate_ap_state(self):
+        """Forgets the tracked AP CSW and TAR values so that they are written again before the next block access"""
+        self.ap_csw = None
+        self.ap_tar = None
+
+    def _track_ap_access(self, reg, value=None):
+        """
+        Updates the tracked AP state after a successful register access
+
+        :param reg: register accessed
+        :param value: value written, or None for a read
+        """
+        if reg & self.DAP_TRANSFER_APnDP:
+            reg &= ~self.DAP_TRANSFER_RnW
+            if value is not None and reg == self.SWD_AP_TAR | self.DAP_TRANSFER_APnDP:
+                self.ap_tar = value
+            elif value is not None and reg == self.SWD_AP_CSW | self.DAP_TRANSFER_APnDP:
+                self.ap_csw = value
+            elif reg == self.SWD_AP_DRW | self.DAP_TRANSFER_APnDP:
+                self.ap_tar = self._ap_tar_after(self.ap_tar, self._ap_access_size())
+        elif value is not None and reg == self.DP_SELECT:
+            # Another AP or register bank may have been selected
+            self.invalidate_ap_state()
+
+    def _track_transfer(self, request, value):
+        """
+        Updates the tracked AP state after a successful transfer in a DAP_Transfer packet
+
+        :param request: transfer request byte
+        :param value: value written, or match value
+        """
+        if request & self.DAP_TRANSFER_MATCH_MASK:
+            # Writes the match mask of the debugger, not a target register
+            return
+        if request & self.DAP_TRANSFER_MATCH_VALUE:
+            # The number of reads done while waiting for a match is not known
+            if request & (self.DAP_TRANSFER_APnDP | self.DAP_TRANSFER_A2 | self.DAP_TRANSFER_A3) == \
+                    self.SWD_AP_DRW | self.DAP_TRANSFER_APnDP:
+                self.ap_tar = None
+            return
+        self._track_ap_access(request, None if request & self.DAP_TRANSFER_RnW else value)
+
+    def _ap_access_size(self):
+        """
+        Number of bytes moved by each DRW access with the tracked CSW
+
+        :return: access size in bytes, or None if it is not known
+        """
+        if self.ap_csw is None:
+            return None
+        return {self.CSW_8BIT: 1, self.CSW_16BIT: 2, self.CSW_32BIT: 4}.get(self.ap_csw & 0x07)
+
+    def _ap_tar_after(self, address, numbytes):
+        """
+        Computes the TAR value after a DRW access, as left by auto-increment
+
+        :param address: TAR value before the access, or None if unknown
+        :param numbytes: number of bytes accessed, or None if not known
+        :return: new TAR value, or None if it cannot be known
+        """
+        if address is None or numbytes is None or self.ap_csw is None:
+            return None
+        if not self.ap_csw & self.CSW_ADDRINC_ON:
+            return address
+        # Auto-increment is only guaranteed within a TAR_MAX region
+        if numbytes >= self._tar_max_chunk(address):
+            return None
+        return address + numbytes
+
+    def _ensure_block_csw(self):
+        """Makes sure the AP is set up for 32-bit accesses with auto-increment"""
+        csw = self.CSW_ADDRINC_ON | self.CSW_32BIT
+        if self.ap_csw is None or (self.ap_csw & 0x3F) != csw:
+            self.dap_write_reg(self.SWD_AP_CSW | self.DAP_TRANSFER_APnDP, csw)
+
+    def new_transfer_batch(self):
+        """
+        Create a batch of DAP transfers to be sent in as few DAP_Transfer packets as possible
+
+        :return: DapTransferBatch instance
+        """
+        return DapTransferBatch(self)
 
     def read_word(self, address):
         """
@@ -320,8 +411,12 @@ class CmsisDapDebugger(CmsisDapUnit):
         :param address: address to read
         """
         self.logger.debug("read word at 0x%08X", address)
-        self.dap_write_reg(self.SWD_AP_TAR | self.DAP_TRANSFER_APnDP, address)
-        return self.dap_read_reg(self.SWD_AP_DRW | self.DAP_TRANSFER_APnDP)
+        batch = self.new_transfer_batch()
+        batch.write(self.SWD_AP_TAR | self.DAP_TRANSFER_APnDP, address)
+        batch.read(self.SWD_AP_DRW | self.DAP_TRANSFER_APnDP)
+        results = batch.execute()
+        self._check_transfer_results(results, "Read word", address)
+        return results[1].value
 
     def write_word(self, address, data):
         """
@@ -331,8 +426,24 @@ class CmsisDapDebugger(CmsisDapUnit):
         :param data: data to write
         """
         self.logger.debug("write word at 0x%08X = 0x%08X", address, data)
-        self.dap_write_reg(self.SWD_AP_TAR | self.DAP_TRANSFER_APnDP, address)
-        self.dap_write_reg(self.SWD_AP_DRW | self.DAP_TRANSFER_APnDP, data)
+        batch = self.new_transfer_batch()
+        batch.write(self.SWD_AP_TAR | self.DAP_TRANSFER_APnDP, address)
+        batch.write(self.SWD_AP_DRW | self.DAP_TRANSFER_APnDP, data)
+        self._check_transfer_results(batch.execute(), "Write word", address)
+
+    def _check_transfer_results(self, results, operation, address):
+        """
+        Raises an error if any transfer in a batch failed
+
+        :param results: list of DapTransferResult from a batch
+        :param operation: name of the operation, for the error message
+        :param address: address accessed, for the error message
+        """
+        for result in results:
+            if result.ack != self.DAP_TRANSFER_OK:
+                self.invalidate_ap_state()
+                raise PyedbglibError("{0:s} failed (0x{1:02X}) address 0x{2:08X}".format(
+                    operation, result.ack if result.ack is not None else self.DAP_TRANSFER_INVALID, address))
 
     @staticmethod
     def multiple_of_four(x):
@@ -346,43 +457,53 @@ class CmsisDapDebugger(CmsisDapUnit):
         :param address: byte address
         :param numbytes: number of bytes
         """
+        result = bytearray(numbytes)
+        self.read_block_into(address, result)
+        return result
+
+    def read_block_into(self, address, buffer):
+        """
+        Reads a block from the device memory bus into a buffer supplied by the caller
+
+        The number of bytes read is given by the size of the buffer.
+
+        :param address: byte address
+        :param buffer: writable buffer (for example a bytearray or a memoryview slice of one)
+        :return: number of bytes read
+        """
+        output = memoryview(buffer)
+        numbytes = len(output)
         self.logger.debug("Block read of %d bytes at address 0x%08X", numbytes, address)
-        # Collect results here
-        result = bytearray()
         # In chunks of (len-header)
-        max_payload_size_bytes = self.multiple_of_four(self.transport.get_report_size() - 5)
+        report_size = self.transport.get_report_size()
+        max_payload_size_bytes = self.multiple_of_four(report_size - 5)
         self.logger.debug("Max payload size of %d bytes", max_payload_size_bytes)
-        while numbytes:
-            # Calculate read size
-            read_size_bytes = max_payload_size_bytes
-
-            # Last chunk?
-            if read_size_bytes > numbytes:
-                read_size_bytes = numbytes
-
-            # Too large for TAR?
-            tar_max_chunk = self.TAR_MAX - (address - (address & (1-self.TAR_MAX)))
-            if read_size_bytes > tar_max_chunk:
-                read_size_bytes = tar_max_chunk
+        # Responses are received into the same buffer for every chunk
+        rsp = bytearray(report_size)
+        cmd = bytearray(5)
+        cmd[0] = self.ID_DAP_TransferBlock
+        cmd[1] = 0x00
+        cmd[4] = self.SWD_AP_DRW | self.DAP_TRANSFER_RnW | self.DAP_TRANSFER_APnDP
+        self._ensure_block_csw()
+        offset = 0
+        while offset < numbytes:
+            # Calculate read size, limited by last chunk and TAR
+            read_size_bytes = min(max_payload_size_bytes, numbytes - offset, self._tar_max_chunk(address))
 
             # Log
             self.logger.debug("Read %d bytes from TAR address 0x%08X", read_size_bytes, address)
 
-            # Set TAR
-            self.dap_write_reg(self.SWD_AP_TAR | self.DAP_TRANSFER_APnDP, address)
-
-            # Read chunk
-            cmd = bytearray(2)
-            cmd[0] = self.ID_DAP_TransferBlock
-            cmd[1] = 0x00
-            cmd.extend(binary.pack_le16(read_size_bytes // 4))
-            cmd.extend([self.SWD_AP_DRW | self.DAP_TRANSFER_RnW | self.DAP_TRANSFER_APnDP])
-
-            rsp = self.dap_command_response(cmd)
+            # Read chunk, setting TAR only when auto-increment has not already left it at the address
+            cmd[2:4] = binary.pack_le16(read_size_bytes // 4)
+            if self.ap_tar == address:
+                self.dap_command_response_into(cmd, rsp)
+            else:
+                self._set_tar_and_read(address, read_size_bytes // 4, rsp)
             self._check_response(cmd, rsp)
 
             # Check outcome
             if rsp[3] != self.DAP_TRANSFER_OK:
+                self.invalidate_ap_state()
                 raise PyedbglibError("Transfer failed (0x{0:02X}) address 0x{1:08X}".format(rsp[3], address))
 
             # Extract payload
@@ -394,12 +515,13 @@ class CmsisDapDebugger(CmsisDapUnit):
                     "Unexpected number of bytes returned from block read ({0:d} != {1:d})".format(num_words_read * 4,
                                                                                                   read_size_bytes))
 
-            # Extend results
-            result.extend(rsp[4:4 + read_size_bytes])
-            numbytes -= read_size_bytes
+            # Copy results straight into the output
+            output[offset:offset + read_size_bytes] = memoryview(rsp)[4:4 + read_size_bytes]
+            self.ap_tar = self._ap_tar_after(address, read_size_bytes)
+            offset += read_size_bytes
             address += read_size_bytes
 
-        return result
+        return numbytes
 
     def write_block(self, address, data):
         """
@@ -409,36 +531,81 @@ class CmsisDapDebugger(CmsisDapUnit):
         :param data: data
         """
         self.logger.debug("Block write of %d bytes at address 0x%08X", len(data), address)
+        if isinstance(data, list):
+            data = bytearray(data)
+        # Chunks are sliced out of the caller's data without copying it
+        source = memoryview(data)
+        numbytes = len(source)
 
         # In chunks of (len-header)
         max_payload_size_bytes = self.multiple_of_four(self.transport.get_report_size() - 5)
-        while data:
-            # Calculate write size
-            write_size_bytes = max_payload_size_bytes
-            if write_size_bytes > len(data):
-                write_size_bytes = len(data)
-
-            # Too large for TAR?
-            tar_max_chunk = self.TAR_MAX - (address - (address & (1 - self.TAR_MAX)))
-            if write_size_bytes > tar_max_chunk:
-                write_size_bytes = tar_max_chunk
-
-            # Set TAR
-            self.dap_write_reg(self.SWD_AP_TAR | self.DAP_TRANSFER_APnDP, address)
-
-            cmd = bytearray(2)
+        self._ensure_block_csw()
+        offset = 0
+        while offset < numbytes:
+            # Calculate write size, limited by last chunk and TAR
+            write_size_bytes = min(max_payload_size_bytes, numbytes - offset, self._tar_max_chunk(address))
+
+            # Set TAR only when auto-increment has not already left it at the address.  Unlike for reads the TAR
+            # write is not merged with the data: DAP_Transfer would stop at a failed TAR write just as safely, but it
+            # takes 5 bytes per word written against 4 in DAP_TransferBlock, so fewer words would fit in a packet.
+            if self.ap_tar != address:
+                self.dap_write_reg(self.SWD_AP_TAR | self.DAP_TRANSFER_APnDP, address)
+
+            # The command is built in the transport frame, so this must come after the TAR write
+            cmd = bytearray(5)
             cmd[0] = self.ID_DAP_TransferBlock
             cmd[1] = 0x00
-            cmd.extend(binary.pack_le16(write_size_bytes // 4))
-            cmd.extend([self.SWD_AP_DRW | self.DAP_TRANSFER_APnDP])
-            cmd.extend(data[0:write_size_bytes])
-            rsp = self.dap_command_response(cmd)
+            cmd[2:4] = binary.pack_le16(write_size_bytes // 4)
+            cmd[4] = self.SWD_AP_DRW | self.DAP_TRANSFER_APnDP
+            frame = self.dap_command_frame()
+            frame[0:5] = cmd
+            frame[5:5 + write_size_bytes] = source[offset:offset + write_size_bytes]
+            rsp = self.dap_command_response_frame(5 + write_size_bytes)
             self._check_response(cmd, rsp)
+            if rsp[3] != self.DAP_TRANSFER_OK:
+                self.invalidate_ap_state()
+                raise PyedbglibError("Transfer failed (0x{0:02X}) address 0x{1:08X}".format(rsp[3], address))
 
-            # Shrink data buffer
-            data = data[write_size_bytes:]
+            self.ap_tar = self._ap_tar_after(address, write_size_bytes)
+            offset += write_size_bytes
             address += write_size_bytes
 
+    def _set_tar_and_read(self, address, num_words, rsp):
+        """
+        Writes TAR and reads words from DRW in a single DAP_Transfer packet
+
+        The debugger stops at the first transfer which fails, so no words are read from a stale address if the TAR
+        write faults.  The words read take as much room in the response as in a DAP_TransferBlock response.
+
+        :param address: value to write to TAR
+        :param num_words: number of words to read
+        :param rsp: bytearray to receive the response into, laid out as a DAP_TransferBlock read response
+        """
+        cmd = bytearray([self.ID_DAP_Transfer, 0x00, 1 + num_words, self.SWD_AP_TAR | self.DAP_TRANSFER_APnDP])
+        cmd.extend(binary.pack_le32(address))
+        cmd.extend([self.SWD_AP_DRW | self.DAP_TRANSFER_RnW | self.DAP_TRANSFER_APnDP] * num_words)
+        transfer_rsp = self.dap_command_response(cmd)
+        self._check_response(cmd, transfer_rsp)
+        if transfer_rsp[1] == 0:
+            # The TAR write itself failed
+            self.invalidate_ap_state()
+            raise PyedbglibError("Write reg failed (0x{0:02X}, {1:02X})".format(transfer_rsp[1], transfer_rsp[2]))
+        self.ap_tar = address
+        words_read = transfer_rsp[1] - 1
+        rsp[0] = self.ID_DAP_TransferBlock
+        rsp[1:3] = binary.pack_le16(words_read)
+        rsp[3] = transfer_rsp[2]
+        rsp[4:4 + words_read * 4] = transfer_rsp[3:3 + words_read * 4]
+
+    def _tar_max_chunk(self, address):
+        """
+        Number of bytes which can be accessed before TAR auto-increment reaches a TAR_MAX boundary
+
+        :param address: byte address
+        :return: number of bytes
+        """
+        return self.TAR_MAX - (address & (self.TAR_MAX - 1))
+
     def _send_flush_tms(self):
         cmd = bytearray(2)
         cmd[0] = self.ID_DAP_SWJ_Sequence
@@ -453,6 +620,7 @@ class CmsisDapDebugger(CmsisDapUnit):
     def init_swj(self):
         """Magic sequence to execute on pins to enable SWD in case of JTAG-default parts"""
         self.logger.debug("SWJ init sequence")
+        self.invalidate_ap_state()
         # According to ARM manuals:
         # Send at least 50 cycles with TMS=1
         self._send_flush_tms()
@@ -503,6 +671,156 @@ class CmsisDapDebugger(CmsisDapUnit):
         self.dap_write_reg(self.SWD_AP_CSW | self.DAP_TRANSFER_APnDP, self.CSW_ADDRINC_ON | self.CSW_32BIT)
 
 
+class DapTransferResult(object):
+    """
+    Outcome of a single transfer in a DapTransferBatch
+
+    ack holds the DAP_TRANSFER_* response of the transfer, or None if it was never executed because an earlier
+    transfer failed.  value holds the data read by a plain read transfer.
+    """
+
+    def __init__(self, request, data=None):
+        self.request = request
+        self.data = data
+        self.ack = None
+        self.value = None
+
+    def is_read(self):
+        """
+        Check if this transfer returns data
+
+        :return: True for read transfers which are not value-matched reads
+        """
+        return bool(self.request & CmsisDapDebugger.DAP_TRANSFER_RnW) and \
+            not self.request & CmsisDapDebugger.DAP_TRANSFER_MATCH_VALUE
+
+
+class DapTransferBatch(object):
+    """
+    Gathers DP/AP reads and writes into as few DAP_Transfer packets as the report size allows
+
+    Each packet is limited by the report size both for the command (request byte and data for each write or
+    match) and for the response (data for each read).  Transfers are executed in the order they are added, and
+    execution stops at the first transfer which fails.
+    """
+
+    # Command header: command ID, DAP index, transfer count
+    COMMAND_HEADER_SIZE = 3
+    # Response header: command ID, transfer count, transfer response
+    RESPONSE_HEADER_SIZE = 3
+    MAX_TRANSFERS_PER_PACKET = 255
+
+    def __init__(self, debugger):
+        self.logger = getLogger(__name__)
+        self.debugger = debugger
+        self.transfers = []
+
+    def __len__(self):
+        return len(self.transfers)
+
+    def read(self, reg):
+        """
+        Adds a register read
+
+        :param reg: register to read
+        """
+        self.transfers.append(DapTransferResult(reg | CmsisDapDebugger.DAP_TRANSFER_RnW))
+
+    def write(self, reg, value):
+        """
+        Adds a register write
+
+        :param reg: register to write
+        :param value: value to write
+        """
+        self.transfers.append(DapTransferResult(reg & ~CmsisDapDebugger.DAP_TRANSFER_RnW, value))
+
+    def read_match(self, reg, value):
+        """
+        Adds a read which is retried by the DAP until the (masked) register value matches
+
+        :param reg: register to read
+        :param value: value to match
+        """
+        self.transfers.append(DapTransferResult(
+            reg | CmsisDapDebugger.DAP_TRANSFER_RnW | CmsisDapDebugger.DAP_TRANSFER_MATCH_VALUE, value))
+
+    def write_match_mask(self, mask):
+        """
+        Adds a write of the match mask used by subsequent match reads
+
+        :param mask: mask to apply to the register value before matching
+        """
+        self.transfers.append(DapTransferResult(CmsisDapDebugger.DAP_TRANSFER_MATCH_MASK, mask))
+
+    def _packets(self):
+        """
+        Splits the transfers into groups which fit the report size
+
+        :return: list of (start index, end index) tuples
+        """
+        report_size = self.debugger.transport.get_report_size()
+        packets = []
+        start = 0
+        command_size = self.COMMAND_HEADER_SIZE
+        response_size = self.RESPONSE_HEADER_SIZE
+        for index, transfer in enumerate(self.transfers):
+            transfer_command_size = 1 if transfer.data is None else 5
+            transfer_response_size = 4 if transfer.is_read() else 0
+            if index > start and (command_size + transfer_command_size > report_size or
+                                  response_size + transfer_response_size > report_size or
+                                  index - start >= self.MAX_TRANSFERS_PER_PACKET):
+                packets.append((start, index))
+                start = index
+                command_size = self.COMMAND_HEADER_SIZE
+                response_size = self.RESPONSE_HEADER_SIZE
+            command_size += transfer_command_size
+            response_size += transfer_response_size
+        if start < len(self.transfers):
+            packets.append((start, len(self.transfers)))
+        return packets
+
+    def execute(self):
+        """
+        Sends all transfers in the batch
+
+        :return: list of DapTransferResult, one for each transfer in the order they were added
+        """
+        # Results of an earlier execution must not show through on transfers this execution does not reach
+        for transfer in self.transfers:
+            transfer.ack = None
+            transfer.value = None
+        for start, end in self._packets():
+            transfers = self.transfers[start:end]
+            cmd = bytearray([CmsisDapDebugger.ID_DAP_Transfer, 0x00, len(transfers)])
+            for transfer in transfers:
+                cmd.append(transfer.request)
+                if transfer.data is not None:
+                    cmd.extend(binary.pack_le32(transfer.data))
+            self.logger.debug("DAP transfer of %d transfers", len(transfers))
+            rsp = self.debugger.dap_command_response(cmd)
+            self.debugger._check_response(cmd, rsp)  # pylint: disable=protected-access
+
+            executed = rsp[1]
+            offset = self.RESPONSE_HEADER_SIZE
+            for index, transfer in enumerate(transfers):
+                if index < executed:
+                    transfer.ack = CmsisDapDebugger.DAP_TRANSFER_OK
+                elif index == executed:
+                    transfer.ack = rsp[2]
+                if transfer.ack == CmsisDapDebugger.DAP_TRANSFER_OK and transfer.is_read():
+                    transfer.value = binary.unpack_le32(rsp[offset:offset + 4])
+                    offset += 4
+            # Keep the debugger's tracking of the AP registers up to date with the transfers which succeeded
+            for transfer in transfers[:executed]:
+                self.debugger._track_transfer(transfer.request, transfer.data)  # pylint: disable=protected-access
+            if executed < len(transfers) or rsp[2] != CmsisDapDebugger.DAP_TRANSFER_OK:
+                self.logger.debug("DAP transfer stopped after %d transfers (0x%02X)", executed, rsp[2])
+                self.debugger.invalidate_ap_state()
+                break
+        return self.transfers
+
+
 class CmsisDapSamDebugger(CmsisDapDebugger):
     """SAM specific CMSIS-DAP debugger"""
 
@@ -518,6 +836,7 @@ class CmsisDapSamDebugger(CmsisDapDebugger):
         :param extend: boolean flag to extend reset
         """
         self.logger.debug("dap_reset_ext")
+        self.invalidate_ap_state()
         cmd = bytearray(7)
         cmd[0] = self.ID_DAP_SWJ_Pins
         cmd[1] = 0  # Reset LOW, TCK LOW
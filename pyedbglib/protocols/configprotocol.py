@@ -4,6 +4,7 @@ This protocol is used in manufacturing to provision Curiosity Nano kits.
 It is not intended for end-user usage - for kit customisation use the pydebuggerconfig package.
 """
 from .dapwrapper import DapWrapper
+from .jtagice3multiplexer import Jtagice3Multiplexer
 from ..util.chopper import DataChopper
 from ..util.binary import pack_le16
 
@@ -126,7 +127,8 @@ class ConfigProtocol(DapWrapper):
         cmd.extend(payload)
 
         # Vendor command, status
-        response = self.dap_command_response(cmd)
+        with Jtagice3Multiplexer.for_transport(self.transport).lock:
+            response = self.dap_command_response(cmd)
         if response[1] is not self.RSP_OK:
             message = "Programming of config returned error code: 0x{:02X}".format(response[1])
             self.logger.error(message)
@@ -155,7 +157,8 @@ class ConfigProtocol(DapWrapper):
             raise OverflowError("Byte count is too long")
 
         # Vendor command, status, len(msb), len(lsb), tag, type, data[...]
-        response = self.dap_command_response(cmd)
+        with Jtagice3Multiplexer.for_transport(self.transport).lock:
+            response = self.dap_command_response(cmd)
         if response[1] is not self.RSP_OK:
             message = "Reading of config data returned error code: 0x{:02X}".format(response[1])
             self.logger.error(message)
@@ -1,14 +1,121 @@
 """Wrapper for any protocol over CMSIS-DAP"""
 
+from collections import deque
 from logging import getLogger
 
 
+class DapPendingResponse(object):
+    """
+    Response to a command submitted to a DapCommandQueue
+
+    The response is collected from the transport when it is requested, or when the queue needs the slot
+    """
+
+    def __init__(self, queue):
+        self._queue = queue
+        self._response = None
+        self._done = False
+
+    def done(self):
+        """
+        Check if the response has been received
+
+        :return: True if the response is available
+        """
+        return self._done
+
+    def result(self):
+        """
+        Get the response, waiting for it if required
+
+        :return: response received
+        """
+        while not self._done:
+            self._queue.receive_one()
+        return self._response
+
+    def set_result(self, response):
+        """
+        Stores the response received
+
+        :param response: response received
+        """
+        self._response = response
+        self._done = True
+
+
+class DapCommandQueue(object):
+    """
+    Pipelined command queue for CMSIS-DAP commands
+
+    Commands are sent as they are submitted, keeping up to max_in_flight commands outstanding on the tool before
+    the oldest response is collected.  Responses are always collected in the order the commands were sent.
+    """
+
+    def __init__(self, transport, max_in_flight=1):
+        self.logger = getLogger(__name__)
+        self.transport = transport
+        self.max_in_flight = max(1, max_in_flight)
+        # Only transports which support blind writes and reads can keep more than one command in flight
+        self.pipelined = getattr(transport, 'supports_pipelining', lambda: False)()
+        self._in_flight = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def submit(self, packet):
+        """
+        Send a command, collecting the oldest response first if the queue is full
+
+        :param packet: bytes to send
+        :return: DapPendingResponse for the response to this command
+        """
+        pending = DapPendingResponse(self)
+        if not self.pipelined or self.max_in_flight == 1:
+            self.flush()
+            pending.set_result(self.transport.hid_transfer(packet))
+            return pending
+        while len(self._in_flight) >= self.max_in_flight:
+            self.receive_one()
+        self.transport.hid_write(packet)
+        self._in_flight.append(pending)
+        return pending
+
+    def receive_one(self):
+        """Collect the response to the oldest command in flight"""
+        if not self._in_flight:
+            return
+        pending = self._in_flight.popleft()
+        pending.set_result(self.transport.hid_read())
+
+    def flush(self):
+        """Collect the responses to all commands in flight"""
+        while self._in_flight:
+            self.receive_one()
+
+    def in_flight(self):
+        """
+        Get the number of commands sent for which no response has been collected
+
+        :return: number of commands in flight
+        """
+        return len(self._in_flight)
+
+
 class DapWrapper(object):
     """Base class for any CMSIS-DAP protocol wrapper"""
 
+    # DAP info is used to retrieve the number of packets the DAP can buffer
+    ID_DAP_INFO = 0x00
+    DAP_ID_PACKET_COUNT = 0xFE
+
     def __init__(self, transport):
         self.logger = getLogger(__name__)
         self.transport = transport
+        self.packet_count = None
         self.logger.debug("Created DapWrapper")
 
     def dap_command_response(self, packet):
@@ -20,6 +127,33 @@ class DapWrapper(object):
         """
         return self.transport.hid_transfer(packet)
 
+    def dap_command_response_into(self, packet, buffer):
+        """
+        Send a command, receive a response into a buffer supplied by the caller
+
+        :param packet: bytes to send
+        :param buffer: bytearray to receive the response into, at least one report in size
+        :return: number of bytes received
+        """
+        return self.transport.hid_transfer_into(packet, buffer)
+
+    def dap_command_frame(self):
+        """
+        Get the transport frame for building a command in place
+
+        :return: memoryview of one report, excluding the report number byte
+        """
+        return self.transport.get_report_frame()
+
+    def dap_command_response_frame(self, length):
+        """
+        Send the command built in the transport frame, receive a response
+
+        :param length: number of bytes written into the frame
+        :return: response received
+        """
+        return self.transport.hid_transfer_frame(length)
+
     def dap_command_write(self, packet):
         """
         Send a packet
@@ -36,3 +170,43 @@ class DapWrapper(object):
         :return: data received
         """
         return self.transport.hid_read()
+
+    def get_packet_count(self):
+        """
+        Get the number of command packets the DAP can buffer
+
+        The value is read using DAP_ID_PACKET_COUNT the first time it is requested
+
+        :return: number of packets which can be in flight
+        """
+        if self.packet_count is None:
+            response = self.dap_command_response(bytearray([self.ID_DAP_INFO, self.DAP_ID_PACKET_COUNT]))
+            if response[0] == self.ID_DAP_INFO and response[1] == 1 and response[2] > 0:
+                self.packet_count = response[2]
+            else:
+                self.packet_count = 1
+            self.logger.debug("DAP packet count is %d", self.packet_count)
+        return self.packet_count
+
+    def new_command_queue(self, max_in_flight=None):
+        """
+        Create a pipelined command queue on this DAP
+
+        :param max_in_flight: maximum number of commands in flight, defaults to the DAP packet count
+        :return: DapCommandQueue instance
+        """
+        if max_in_flight is None:
+            max_in_flight = self.get_packet_count()
+        return DapCommandQueue(self.transport, max_in_flight)
+
+    def dap_command_response_pipelined(self, packets, max_in_flight=None):
+        """
+        Send a batch of commands, keeping several in flight, and receive all responses
+
+        :param packets: list of packets to send
+        :param max_in_flight: maximum number of commands in flight, defaults to the DAP packet count
+        :return: list of responses received, in the same order as the packets
+        """
+        with self.new_command_queue(max_in_flight) as queue:
+            pending = [queue.submit(packet) for packet in packets]
+        return [response.result() for response in pending]
@@ -186,8 +186,9 @@ class EdbgProtocol(Jtagice3Protocol):
         # The last parameter tells what to read. If zero a whole page is read, and
         # if non-zero 32-bytes is fetched from offset 32 * parameter. The parameter
         # cannot be greater than 8
-        response = self.dap_command_response(bytearray([self.AVR_GET_CONFIG, 0x01,
-                                                        self.EDBG_CONFIG_KIT_DATA, 0x0]))
+        with self.multiplexer.lock:
+            response = self.dap_command_response(bytearray([self.AVR_GET_CONFIG, 0x01,
+                                                            self.EDBG_CONFIG_KIT_DATA, 0x0]))
 
         # Remove unused data
         if len(response) >= 256 + 6:
@@ -4,6 +4,7 @@ from logging import getLogger
 
 from .jtagice3protocol import Jtagice3Protocol
 from .jtagice3protocol import Jtagice3ResponseError
+from ..pyedbglib_errors import PyedbglibError
 from ..util import binary
 
 
@@ -20,6 +21,10 @@ class Jtagice3HousekeepingProtocol(Jtagice3Protocol):
     CMD_HOUSEKEEPING_END_SESSION = 0x11  # Sign off
     CMD_HOUSEKEEPING_FW_UPGRADE = 0x50  # Enter upgrade mode
 
+    # Event IDs
+    EVT_HOUSEKEEPING_POWER = 0x10  # Target power turned on or off
+    EVT_HOUSEKEEPING_SLEEP = 0x11  # Target entered or left sleep
+
     # Get/Set contexts
     HOUSEKEEPING_CONTEXT_CONFIG = 0x00  # Configuration parameters
     HOUSEKEEPING_CONTEXT_ANALOG = 0x01  # Analog parameters
@@ -87,6 +92,8 @@ class Jtagice3HousekeepingProtocol(Jtagice3Protocol):
     def start_session(self):
         """Starts a session with the debugger (sign-on)"""
         self.logger.debug("Housekeeping::start_session")
+        # The transport may have been reconnected to another tool since the last session
+        self.invalidate_query_cache()
         response = self.jtagice3_command_response(bytearray([self.CMD_HOUSEKEEPING_START_SESSION, self.CMD_VERSION0]))
         self.check_response(response)
 
@@ -110,6 +117,8 @@ class Jtagice3HousekeepingProtocol(Jtagice3Protocol):
         :return:
         """
         self.logger.debug("Housekeeping::enter_upgrade_mode")
+        # The firmware, and so its capabilities, is about to change
+        self.invalidate_query_cache()
         try:
             response = self.jtagice3_command_response(
                 bytearray([self.CMD_HOUSEKEEPING_FW_UPGRADE, self.CMD_VERSION0]) + binary.pack_be32(key))
@@ -122,22 +131,40 @@ class Jtagice3HousekeepingProtocol(Jtagice3Protocol):
         """Reads version info from the debugger"""
         self.logger.debug("Housekeeping::reading version info")
 
+        # Adjacent config parameters are read in one go
+        requests = [
+            (self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_HWREV, 1),
+            (self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_FWREV_MAJ, 1),
+            (self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_FWREV_MIN, 1),
+            (self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_BUILD, 2),
+            (self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_CHIP, 1),
+            (self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_BLDR_MAJ, 2),
+            (self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_DEBUG_BUILD, 1),
+            (self.HOUSEKEEPING_CONTEXT_DIAGNOSTICS, self.HOUSEKEEPING_HOST_ID, 4),
+            (self.HOUSEKEEPING_CONTEXT_DIAGNOSTICS, self.HOUSEKEEPING_HOST_REV, 1),
+        ]
+        values = self.get_many(requests)
+        for (context, offset, numbytes), value in zip(requests, values):
+            if len(value) != numbytes:
+                raise PyedbglibError("Invalid version info from context {:d} offset {:d}".format(context, offset))
+        hardware, firmware_major, firmware_minor, build, chip, bootloader, debug, host_id, host_rev = values
+
         # Results in dict form
         versions = {
             # HW version
-            'hardware': self.get_byte(self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_HWREV),
+            'hardware': hardware[0],
             # FW version
-            'firmware_major': self.get_byte(self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_FWREV_MAJ),
-            'firmware_minor': self.get_byte(self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_FWREV_MIN),
-            'build': self.get_le16(self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_BUILD),
+            'firmware_major': firmware_major[0],
+            'firmware_minor': firmware_minor[0],
+            'build': binary.unpack_le16(build),
             # BLDR
-            'bootloader': self.get_le16(self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_BLDR_MAJ),
+            'bootloader': binary.unpack_le16(bootloader),
             # Host info
-            'chip': self.get_byte(self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_CHIP),
-            'host_id': self.get_le32(self.HOUSEKEEPING_CONTEXT_DIAGNOSTICS, self.HOUSEKEEPING_HOST_ID),
-            'host_rev': self.get_byte(self.HOUSEKEEPING_CONTEXT_DIAGNOSTICS, self.HOUSEKEEPING_HOST_REV),
+            'chip': chip[0],
+            'host_id': binary.unpack_le32(host_id),
+            'host_rev': host_rev[0],
             # Misc
-            'debug': self.get_byte(self.HOUSEKEEPING_CONTEXT_CONFIG, self.HOUSEKEEPING_CONFIG_DEBUG_BUILD)
+            'debug': debug[0]
         }
 
         # Firmware Image Requirement Enumerator is only supported on some tools
@@ -0,0 +1,118 @@
+"""
+Sharing one tool between JTAGICE3 protocol objects used from several threads
+
+Every JTAGICE3 protocol object sends its commands through the multiplexer of its transport, so threads may share a
+tool as long as each of them uses its own protocol objects::
+
+    housekeeper = Jtagice3HousekeepingProtocol(transport)
+    avr = Avr8Protocol(transport)
+
+Other users of the transport within this package, namely AVR event polling and the EDBG vendor commands of
+EdbgProtocol and ConfigProtocol, take the lock of Jtagice3Multiplexer.for_transport to keep out of the way of
+JTAGICE3 commands.  Other CMSIS-DAP commands, such as those of CmsisDapDebugger, do not: do not send them on a
+transport while other threads use JTAGICE3 protocol objects on it, or hold the lock while sending them.
+"""
+import threading
+import weakref
+from logging import getLogger
+from ..util import print_helpers
+from ..pyedbglib_errors import PyedbglibError
+
+
+class Jtagice3Multiplexer(object):
+    """
+    Serialises the JTAGICE3 commands sent on one transport and matches responses to commands
+
+    The tool firmware handles one AVR command at a time, so commands are not pipelined: a command and the collection
+    of its response are done under the multiplexer lock, while the commands of other threads wait.  Each command gets
+    a sequence number from a counter shared by all protocol objects on the transport, and its response is matched by
+    sequence number.  The handler is not checked, as the version 0 ID chip commands of old EDBG firmware answer
+    with a status byte in its place.  Responses which do not match, such as a late response to a command which timed
+    out, are discarded.
+
+    The multiplexer also keeps the state shared by the protocol objects on the transport, such as query results.
+    Use for_transport to get the multiplexer of a transport.
+    """
+
+    # Non-matching responses to discard before giving up on a command
+    MAX_STALE_RESPONSES = 4
+
+    # Multiplexers by transport
+    _multiplexers = weakref.WeakKeyDictionary()
+    _multiplexers_lock = threading.Lock()
+
+    def __init__(self, transport):
+        """
+        :param transport: transport shared by the protocol objects
+        """
+        self.logger = getLogger(__name__)
+        self.transport = transport
+        # Held while a command is in progress on the transport
+        self.lock = threading.RLock()
+        self._sequence_id = 0
+        # Results of protocol queries, by (handler, context)
+        self.query_cache = {}
+        # Number of responses discarded because they did not match the command in flight
+        self.stale_responses = 0
+
+    @classmethod
+    def for_transport(cls, transport):
+        """
+        Get the multiplexer of a transport, creating it on first use
+
+        :param transport: transport to share
+        :return: Jtagice3Multiplexer instance
+        """
+        with cls._multiplexers_lock:
+            multiplexer = cls._multiplexers.get(transport)
+            if multiplexer is None:
+                multiplexer = cls(transport)
+                cls._multiplexers[transport] = multiplexer
+            return multiplexer
+
+    def next_sequence_id(self):
+        """
+        Get a sequence number not used by any command in progress
+
+        :return: sequence number, from 1 to 0xFFFE
+        """
+        with self.lock:
+            self._sequence_id += 1
+            if self._sequence_id > 0xFFFE:
+                self._sequence_id = 1
+            return self._sequence_id
+
+    def invalidate_query_cache(self):
+        """Forgets the query results of all handlers, for when the tool or its firmware has changed"""
+        self.query_cache.clear()
+
+    @staticmethod
+    def _matches(protocol, response, sequence_id):
+        """Check if a response answers the command with the given sequence number"""
+        return (len(response) >= 3 and response[0] == protocol.JTAGICE3_TOKEN and
+                response[1] + (response[2] << 8) == sequence_id)
+
+    def command_response(self, protocol, command, poll_class):
+        """
+        Sends a JTAGICE3 command on behalf of a protocol object and receives its response
+
+        :param protocol: Jtagice3Command instance sending the command
+        :param command: command bytes, without the JTAGICE3 header
+        :param poll_class: command class selecting how to wait for the response
+        :return: raw response, including the JTAGICE3 header
+        """
+        with self.lock:
+            sequence_id = self.next_sequence_id()
+            protocol.sequence_id = sequence_id
+            packet = protocol.command_header(sequence_id) + bytearray(command)
+            response = protocol.avr_command_response(packet, poll_class)
+            discarded = 0
+            while not self._matches(protocol, response, sequence_id):
+                if discarded == self.MAX_STALE_RESPONSES:
+                    raise PyedbglibError("No response to command with sequence 0x{:04X}".format(sequence_id))
+                discarded += 1
+                self.stale_responses += 1
+                self.logger.warning("Discarding response %s not matching command with sequence 0x%04X",
+                                    print_helpers.bytelist_to_hex_string(response[0:4]), sequence_id)
+                response = protocol.avr_response_receive(poll_class)
+            return response
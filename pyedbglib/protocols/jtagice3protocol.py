@@ -3,6 +3,7 @@
 from logging import getLogger
 
 from .avrcmsisdap import AvrCommand
+from .jtagice3multiplexer import Jtagice3Multiplexer
 from ..util import binary
 from ..util import print_helpers
 from ..pyedbglib_errors import PyedbglibError
@@ -44,12 +45,18 @@ class Jtagice3Command(AvrCommand):
     HANDLER_POWER = 0x22
     HANDLER_SELFTEST = 0x81
 
+    # Command classes for waiting for responses, by command ID.  Commands not listed use AvrCommand.POLL_DEFAULT
+    COMMAND_POLL_CLASSES = {}
+
     def __init__(self, transport, handler):
         super(Jtagice3Command, self).__init__(transport)
         self.logger = getLogger(__name__)
         self.logger.debug("Created JTAGICE3 command")
         self.handler = handler
+        # Sequence number of the last command sent
         self.sequence_id = 0
+        # All commands on the transport go through its multiplexer
+        self.multiplexer = Jtagice3Multiplexer.for_transport(transport)
 
     def validate_response(self, response):
         """
@@ -77,35 +84,39 @@ class Jtagice3Command(AvrCommand):
         if response[3] != self.handler:
             raise PyedbglibError("Invalid handler (0x{:02X}) in response.".format(response[3]))
 
-    def jtagice3_command_response_raw(self, command):
+    def jtagice3_command_response_raw(self, command, poll_class=None):
         """
         Sends a JTAGICE3 command and receives the corresponding response
 
         :param command:
+        :param poll_class: command class selecting how to wait for the response, None to look it up in
+            COMMAND_POLL_CLASSES
         :return:
         """
-        # Header
-        header = bytearray([self.JTAGICE3_TOKEN, self.JTAGICE3_PROTOCOL_VERSION, self.sequence_id & 0xFF,
-                            (self.sequence_id >> 8) & 0xFF, self.handler])
+        if poll_class is None:
+            poll_class = self.COMMAND_POLL_CLASSES.get(command[0], self.POLL_DEFAULT)
+        return self.multiplexer.command_response(self, command, poll_class)
 
-        # Send command, receive response
-        packet = header + bytearray(command)
-        response = self.avr_command_response(packet)
-        return response
+    def command_header(self, sequence_id):
+        """
+        Builds the JTAGICE3 header for a command to this handler
 
-    def jtagice3_command_response(self, command):
+        :param sequence_id: sequence number of the command
+        :return: header bytes
+        """
+        return bytearray([self.JTAGICE3_TOKEN, self.JTAGICE3_PROTOCOL_VERSION, sequence_id & 0xFF,
+                          (sequence_id >> 8) & 0xFF, self.handler])
+
+    def jtagice3_command_response(self, command, poll_class=None):
         """
         Sends a JTAGICE3 command and receives the corresponding response, and validates it
 
         :param command:
+        :param poll_class: command class selecting how to wait for the response, None to look it up in
+            COMMAND_POLL_CLASSES
         :return:
         """
-        response = self.jtagice3_command_response_raw(command)
-
-        # Increment sequence number
-        self.sequence_id += 1
-        if self.sequence_id > 0xFFFE:
-            self.sequence_id = 1
+        response = self.jtagice3_command_response_raw(command, poll_class)
 
         # Peel and return
         return response[4:]
@@ -229,14 +240,24 @@ class Jtagice3Protocol(Jtagice3Command):
         :param context: Query context
         :return: List of supported entries
         """
+        # Query results do not change within a session, so they are shared by all protocol objects on the transport
+        cache = self.multiplexer.query_cache
+        if (self.handler, context) in cache:
+            return bytearray(cache[(self.handler, context)])
+
         self.logger.debug("Query to context 0x{:02X}".format(context))
         resp = self.jtagice3_command_response([self.CMD_QUERY, self.CMD_VERSION0, context])
         status, data = self.peel_response(resp)
         if not status:
             msg = "Unable to QUERY (failure code 0x{:02X})".format(data[0])
             raise PyedbglibError(msg)
+        cache[(self.handler, context)] = bytearray(data)
         return data
 
+    def invalidate_query_cache(self):
+        """Forgets the query results of all handlers on this transport, for when the tool has changed"""
+        self.multiplexer.invalidate_query_cache()
+
     def set_byte(self, context, offset, value):
         """
         Sets a single byte parameter
@@ -335,3 +356,76 @@ class Jtagice3Protocol(Jtagice3Command):
             msg = "Unable to GET (failure code 0x{:02X})".format(data[0])
             raise Jtagice3ResponseError(msg, data)
         return data
+
+    @staticmethod
+    def _coalesce(requests):
+        """
+        Groups parameter accesses at contiguous offsets in the same context
+
+        :param requests: list of (context, offset, numbytes) tuples
+        :return: list of (context, offset, numbytes, members) runs, where members lists (index, offset, numbytes)
+            of the requests in the run
+        """
+        runs = []
+        ordered = sorted(enumerate(requests), key=lambda item: (item[1][0], item[1][1]))
+        for index, (context, offset, numbytes) in ordered:
+            if runs:
+                run_context, run_offset, run_numbytes, members = runs[-1]
+                # The length of a GET or SET is sent in one byte
+                if (context == run_context and offset == run_offset + run_numbytes and
+                        run_numbytes + numbytes <= 0xFF):
+                    members.append((index, offset, numbytes))
+                    runs[-1] = (run_context, run_offset, run_numbytes + numbytes, members)
+                    continue
+            runs.append((context, offset, numbytes, [(index, offset, numbytes)]))
+        return runs
+
+    def get_many(self, requests):
+        """
+        Gets several parameters, merging parameters at contiguous offsets in the same context into one GET
+
+        Merging assumes that the context is laid out by byte offset.  If a merged GET fails, its parameters are
+        fetched one by one instead.
+
+        :param requests: list of (context, offset, numbytes) tuples
+        :return: list of values read, as bytearrays, in the same order as the requests
+        """
+        results = {}
+        for context, offset, numbytes, members in self._coalesce(requests):
+            if len(members) > 1:
+                try:
+                    data = self._get_protocol(context, offset, numbytes)
+                    if len(data) == numbytes:
+                        for index, member_offset, member_numbytes in members:
+                            start = member_offset - offset
+                            results[index] = bytearray(data[start:start + member_numbytes])
+                        continue
+                except Jtagice3ResponseError:
+                    pass
+                self.logger.debug("Merged GET from context %d offset %d failed, getting one by one", context, offset)
+            for index, member_offset, member_numbytes in members:
+                results[index] = bytearray(self._get_protocol(context, member_offset, member_numbytes))
+        return [results[index] for index in range(len(requests))]
+
+    def set_many(self, requests):
+        """
+        Sets several parameters, merging parameters at contiguous offsets in the same context into one SET
+
+        Merging assumes that the context is laid out by byte offset.  If a merged SET fails, its parameters are
+        set one by one instead.
+
+        :param requests: list of (context, offset, data) tuples
+        """
+        values = [bytearray(data) for _, _, data in requests]
+        runs = self._coalesce([(context, offset, len(data))
+                               for (context, offset, _), data in zip(requests, values)])
+        for context, offset, _, members in runs:
+            if len(members) > 1:
+                try:
+                    self._set_protocol(context, offset, bytearray().join(values[index] for index, _, _ in members))
+                    continue
+                except PyedbglibError:
+                    self.logger.debug("Merged SET to context %d offset %d failed, setting one by one",
+                                      context, offset)
+            for index, member_offset, _ in members:
+                self._set_protocol(context, member_offset, values[index])
@@ -19,3 +19,13 @@ class PyedbglibNotSupportedError(PyedbglibError):
     def __init__(self, msg=None, code=0):
         super(PyedbglibNotSupportedError, self).__init__(msg)
         self.code = code
+
+
+class PyedbglibTimeoutError(PyedbglibError):
+    """
+    Signals that an operation did not complete in time
+    """
+
+    def __init__(self, msg=None, code=0):
+        super(PyedbglibTimeoutError, self).__init__(msg)
+        self.code = code
@@ -0,0 +1,104 @@
+import sys
+import threading
+import unittest
+from mock import Mock
+
+from pyedbglib.pyedbglib_errors import PyedbglibTimeoutError
+
+# The asyncio modules use async/await syntax, which does not parse on Python 2
+ASYNCIO_SUPPORTED = sys.version_info >= (3, 5)
+if ASYNCIO_SUPPORTED:
+    import asyncio
+    from pyedbglib.hidtransport.asynchidtransport import AsyncHidTransport
+    from pyedbglib.protocols.asyncavrcmsisdap import AsyncAvrCommand
+
+
+@unittest.skipUnless(ASYNCIO_SUPPORTED, "asyncio support requires Python 3.5 or later")
+class TestAsyncHidTransport(unittest.TestCase):
+    """Tests for the asyncio HID transport wrapper"""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.transport = Mock()
+        self.transport.get_report_size.return_value = 64
+
+    def _run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_transfer_returns_transport_response(self):
+        self.transport.hid_transfer.side_effect = lambda packet: bytearray([packet[0], 0x00])
+        async_transport = AsyncHidTransport(self.transport)
+        self.addCleanup(async_transport.close)
+        response = self._run(async_transport.hid_transfer(bytearray([0x42])))
+        self.assertEqual(response, bytearray([0x42, 0x00]))
+
+    def test_transport_errors_are_raised_in_caller(self):
+        self.transport.hid_transfer.side_effect = IOError("Device gone")
+        async_transport = AsyncHidTransport(self.transport)
+        self.addCleanup(async_transport.close)
+        with self.assertRaises(IOError):
+            self._run(async_transport.hid_transfer(bytearray([0x00])))
+
+    def test_slow_transfer_times_out(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.transport.hid_transfer.side_effect = lambda packet: release.wait()
+        async_transport = AsyncHidTransport(self.transport, timeout=0.05)
+        with self.assertRaises(PyedbglibTimeoutError):
+            self._run(async_transport.hid_transfer(bytearray([0x00])))
+        release.set()
+        async_transport.close()
+
+    def test_late_reports_are_discarded_after_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        late_reports = []
+
+        def slow_transfer(packet):
+            release.wait()
+            # The tool answered twice; only the first answer was consumed by the timed out request
+            late_reports.append(bytearray([0xEE]))
+            return bytearray([0xEE])
+
+        def hid_read():
+            if not late_reports:
+                raise PyedbglibTimeoutError("No report")
+            return late_reports.pop(0)
+
+        self.transport.read_timeout_ms = None
+        self.transport.hid_transfer.side_effect = slow_transfer
+        self.transport.hid_read.side_effect = hid_read
+        async_transport = AsyncHidTransport(self.transport, timeout=0.05)
+        self.addCleanup(async_transport.close)
+        with self.assertRaises(PyedbglibTimeoutError):
+            self._run(async_transport.hid_transfer(bytearray([0x00])))
+        release.set()
+        with self.assertRaises(PyedbglibTimeoutError):
+            self._run(async_transport.hid_read(timeout=1.0))
+        self.assertEqual(self.transport.set_read_timeout.call_args_list[-1][0], (None,))
+
+
+@unittest.skipUnless(ASYNCIO_SUPPORTED, "asyncio support requires Python 3.5 or later")
+class TestAsyncAvrCommand(unittest.TestCase):
+    """Tests for the asyncio AVR command wrapper"""
+
+    def test_command_response_is_reassembled(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        transport = Mock()
+        transport.get_report_size.return_value = 64
+        responses = [bytearray([0x80, 0x01]),
+                     bytearray([0x81, 0x00]),
+                     bytearray([0x81, 0x11, 0x00, 0x03, 0x0E, 0x00, 0x00])]
+
+        def hid_transfer(packet, timeout=None):
+            future = loop.create_future()
+            future.set_result(responses.pop(0))
+            return future
+
+        transport.hid_transfer.side_effect = hid_transfer
+        avr = AsyncAvrCommand(transport)
+        response = loop.run_until_complete(avr.avr_command_response(bytearray([0x0E, 0x00, 0x00, 0x00, 0x01])))
+        self.assertEqual(response, [0x0E, 0x00, 0x00])
+        self.assertEqual(avr.last_poll_count, 2)
@@ -0,0 +1,127 @@
+import unittest
+from mock import Mock, patch
+
+from pyedbglib.protocols.ati import AsynchronousTransportInterface, VENDOR_COMMAND_ATI, iter_chunks
+from pyedbglib.pyedbglib_errors import PyedbglibTimeoutError
+from pyedbglib.util.backoff import PollBackoff
+
+NOT_READY = bytearray([0x00, 0x01])
+OK = bytearray([0x00, 0x02])
+
+
+class TestAsynchronousTransportInterface(unittest.TestCase):
+    """Tests for the ATI buffer transfers"""
+
+    def setUp(self):
+        self.transport = Mock()
+        self.transport.get_report_size.return_value = 64
+        self.ati = AsynchronousTransportInterface(self.transport)
+        self.ati.dap_command_response = Mock()
+
+    @patch('pyedbglib.util.backoff.time.sleep')
+    def test_write_buffer_backs_off_while_not_ready(self, sleep):
+        self.ati.dap_command_response.side_effect = [NOT_READY, NOT_READY, NOT_READY, OK, OK]
+        self.ati.write_buffer(1, bytearray(100))
+        self.assertEqual(self.ati.dap_command_response.call_count, 5)
+        self.assertEqual(self.ati.not_ready_polls, 3)
+        # Two immediate retries, then a delay
+        sleep.assert_called_once_with(0.0005)
+
+    @patch('pyedbglib.util.backoff.time.sleep')
+    def test_read_buffer_counts_not_ready_polls(self, _sleep):
+        data = bytearray([VENDOR_COMMAND_ATI, 0x00, 0x00, 0x04, 1, 2, 3, 4])
+        self.ati.dap_command_response.side_effect = [bytearray([VENDOR_COMMAND_ATI, 0x01]), data]
+        self.assertEqual(self.ati.read_buffer(0, 4), bytearray([1, 2, 3, 4]))
+        self.assertEqual(self.ati.not_ready_polls, 1)
+
+    def test_timeout_raises(self):
+        self.ati.ready_poll = PollBackoff(initial_delay=0.001, max_delay=0.001, timeout=0.01)
+        self.ati.dap_command_response.return_value = NOT_READY
+        with self.assertRaises(PyedbglibTimeoutError):
+            self.ati.write_command_buffer(bytearray(4))
+
+    @patch('pyedbglib.util.backoff.time.sleep')
+    def test_no_timeout_by_default(self, _sleep):
+        self.ati.dap_command_response.side_effect = [NOT_READY] * 2000 + [OK]
+        self.ati.write_command_buffer(bytearray(4))
+        self.assertEqual(self.ati.not_ready_polls, 2000)
+
+    def test_ready_timeout_is_opt_in(self):
+        ati = AsynchronousTransportInterface(self.transport, ready_timeout=0.01)
+        ati.dap_command_response = Mock(return_value=NOT_READY)
+        with self.assertRaises(PyedbglibTimeoutError):
+            ati.write_command_buffer(bytearray(4))
+
+    def test_write_buffer_fragments_views(self):
+        self.ati.send_fragment = Mock()
+        self.ati.write_buffer(1, bytearray(range(130)))
+        fragments = [bytearray(call[0][2]) for call in self.ati.send_fragment.call_args_list]
+        self.assertEqual([len(fragment) for fragment in fragments], [60, 60, 10])
+        self.assertEqual(bytearray().join(fragments), bytearray(range(130)))
+        self.assertIsInstance(self.ati.send_fragment.call_args_list[0][0][2], memoryview)
+
+    def test_write_stream_alternates_buffers(self):
+        log = []
+        self.ati.write_data_buffer = lambda buffer_id, data: log.append(('write', buffer_id, bytes(data)))
+        start = lambda buffer_id: log.append(('start', buffer_id))
+
+        def finish(buffer_id):
+            log.append(('finish', buffer_id))
+            return buffer_id
+
+        chunks = iter_chunks(bytearray(b'aabbc'), 2)
+        results = list(self.ati.write_stream(chunks, start, finish, buffer_ids=(3, 4)))
+        self.assertEqual(results, [3, 4, 3])
+        self.assertEqual(log, [('write', 3, b'aa'), ('start', 3), ('write', 4, b'bb'), ('finish', 3), ('start', 4),
+                               ('write', 3, b'c'), ('finish', 4), ('start', 3), ('finish', 3)])
+
+    def test_read_stream_alternates_buffers(self):
+        log = []
+
+        def read(buffer_id, num_bytes):
+            log.append(('read', buffer_id))
+            return bytearray([buffer_id] * num_bytes)
+
+        self.ati.read_data_buffer = read
+        start = lambda buffer_id, index: log.append(('start', buffer_id, index))
+        finish = lambda buffer_id: log.append(('finish', buffer_id))
+        data = list(self.ati.read_stream(3, start, finish, num_bytes=2, buffer_ids=(3, 4)))
+        self.assertEqual(data, [bytearray([3, 3]), bytearray([4, 4]), bytearray([3, 3])])
+        self.assertEqual(log, [('start', 3, 0), ('finish', 3), ('start', 4, 1), ('read', 3), ('finish', 4),
+                               ('start', 3, 2), ('read', 4), ('finish', 3), ('read', 3)])
+
+    def test_closed_write_stream_finishes_started_buffer(self):
+        log = []
+        self.ati.write_data_buffer = lambda buffer_id, data: log.append(('write', buffer_id))
+        start = lambda buffer_id: log.append(('start', buffer_id))
+        finish = lambda buffer_id: log.append(('finish', buffer_id))
+        stream = self.ati.write_stream(iter_chunks(bytearray(b'aabbcc'), 2), start, finish, buffer_ids=(3, 4))
+        next(stream)
+        stream.close()
+        self.assertEqual(log, [('write', 3), ('start', 3), ('write', 4), ('finish', 3), ('start', 4), ('finish', 4)])
+
+    def test_failed_write_stream_finishes_started_buffer(self):
+        finish = Mock()
+
+        def write(buffer_id, data):
+            if buffer_id == 4:
+                raise IOError("write failed")
+
+        self.ati.write_data_buffer = write
+        with self.assertRaises(IOError):
+            list(self.ati.write_stream(iter_chunks(bytearray(4), 2), Mock(), finish, buffer_ids=(3, 4)))
+        finish.assert_called_once_with(3)
+
+    def test_failed_read_stream_finishes_started_buffer(self):
+        log = []
+
+        def read(buffer_id, num_bytes):
+            raise IOError("read failed")
+
+        self.ati.read_data_buffer = read
+        stream = self.ati.read_stream(5, lambda buffer_id, index: log.append(('start', buffer_id)),
+                                      lambda buffer_id: log.append(('finish', buffer_id)), num_bytes=2,
+                                      buffer_ids=(3, 4))
+        with self.assertRaises(IOError):
+            next(stream)
+        self.assertEqual(log, [('start', 3), ('finish', 3), ('start', 4), ('finish', 4)])
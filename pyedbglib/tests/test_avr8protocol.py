@@ -0,0 +1,165 @@
+import unittest
+from mock import Mock
+
+from pyedbglib.protocols.avr8protocol import Avr8Protocol
+from pyedbglib.pyedbglib_errors import PyedbglibError
+
+
+class TestAvr8MemoryStreams(unittest.TestCase):
+    """Tests for chunked memory access in avr8protocol.Avr8Protocol"""
+
+    def setUp(self):
+        transport = Mock()
+        transport.get_report_size.return_value = 64
+        self.avr = Avr8Protocol(transport)
+        self.memory = bytearray(range(256)) * 16
+        self.reads = []
+        self.writes = []
+
+        def memory_read(memtype, address, num_bytes):
+            self.reads.append((address, num_bytes))
+            return self.memory[address:address + num_bytes]
+
+        def memory_write(memtype, address, data):
+            self.writes.append((address, len(data)))
+            self.memory[address:address + len(data)] = data
+
+        self.avr.memory_read = memory_read
+        self.avr.memory_write = memory_write
+
+    def test_chunk_size_fits_one_command_and_whole_pages(self):
+        self.assertEqual(self.avr.memory_chunk_size(Avr8Protocol.AVR8_MEMTYPE_SRAM), 15 * 60 - 7)
+        self.avr.set_page_size(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 128)
+        self.assertEqual(self.avr.memory_chunk_size(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, write=True), 768)
+
+    def test_read_stream_yields_chunks(self):
+        chunks = list(self.avr.memory_read_stream(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0x10, 1000, chunk=400))
+        self.assertEqual(self.reads, [(0x10, 400), (0x1A0, 400), (0x330, 200)])
+        self.assertEqual(bytearray().join(chunks), self.memory[0x10:0x10 + 1000])
+
+    def test_write_stream_regroups_chunks_on_aligned_addresses(self):
+        data = [bytearray([0xA5] * 100)] * 7
+        written = self.avr.memory_write_stream(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0x40, data, chunk=256)
+        self.assertEqual(written, 700)
+        self.assertEqual(self.writes, [(0x40, 192), (0x100, 256), (0x200, 252)])
+        self.assertEqual(self.memory[0x40:0x40 + 700], bytearray([0xA5] * 700))
+
+    def test_write_stream_pads_paged_memory_to_whole_pages(self):
+        data = [bytearray([0xA5] * 100)] * 7
+        self.avr.set_page_size(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 128)
+        written = self.avr.memory_write_stream(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 0x40, data, chunk=256)
+        self.assertEqual(written, 700)
+        self.assertEqual(self.writes, [(0x00, 256), (0x100, 256), (0x200, 256)])
+        self.assertEqual(self.memory[0x00:0x40], bytearray([0xFF] * 0x40))
+        self.assertEqual(self.memory[0x40:0x40 + 700], bytearray([0xA5] * 700))
+        self.assertEqual(self.memory[0x40 + 700:0x300], bytearray([0xFF] * 4))
+
+    def test_write_stream_does_not_cross_pages(self):
+        self.avr.set_page_size(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 64)
+        self.avr.memory_write_stream(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 0x10, [bytearray(100)], chunk=64)
+        self.assertEqual(self.writes, [(0x00, 64), (0x40, 64)])
+
+    def test_write_stream_needs_page_size_for_paged_memory(self):
+        data = [bytearray(100)]
+        with self.assertRaises(PyedbglibError):
+            self.avr.memory_write_stream(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 0, data)
+        self.avr.set_page_size(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 128)
+        with self.assertRaises(PyedbglibError):
+            self.avr.memory_write_stream(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 0, data, chunk=200)
+        self.assertEqual(self.writes, [])
+        self.assertEqual(self.avr.memory_write_stream(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0, data), 100)
+
+
+    def test_memory_crc_command_and_response(self):
+        self.avr.jtagice3_command_response = Mock(
+            return_value=bytearray([Avr8Protocol.RSP_AVR8_DATA, 0x00, 0x26, 0x39, 0xF4, 0xCB, 0x00]))
+        crc = self.avr.memory_crc(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 0x1000, 0x200)
+        self.assertEqual(crc, 0xCBF43926)
+        self.avr.jtagice3_command_response.assert_called_once_with(
+            bytearray([Avr8Protocol.CMD_AVR8_CRC, 0x00, Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE,
+                       0x00, 0x10, 0x00, 0x00, 0x00, 0x02, 0x00, 0x00]))
+
+class TestAvr8MemoryCache(unittest.TestCase):
+    """Tests for the optional memory cache in avr8protocol.Avr8Protocol"""
+
+    def setUp(self):
+        transport = Mock()
+        transport.get_report_size.return_value = 64
+        self.avr = Avr8Protocol(transport)
+        self.memory = bytearray(range(256))
+        self.reads = []
+
+        def memory_read(memtype, address, num_bytes):
+            self.reads.append((memtype, address, num_bytes))
+            return self.memory[address:address + num_bytes]
+
+        self.avr._memory_read_uncached = memory_read
+        self.avr.jtagice3_command_response = Mock(return_value=bytearray([Avr8Protocol.RSP_AVR8_OK, 0x00]))
+        self.avr.enable_memory_cache((Avr8Protocol.AVR8_MEMTYPE_SRAM, Avr8Protocol.AVR8_MEMTYPE_REGFILE))
+        self.avr.set_target_halted(True)
+
+    def test_overlapping_reads_are_served_from_one_aligned_fetch(self):
+        self.assertEqual(self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0x12, 8), self.memory[0x12:0x1A])
+        self.assertEqual(self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0x14, 10), self.memory[0x14:0x1E])
+        self.assertEqual(self.reads, [(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0x10, 16)])
+
+    def test_missing_blocks_are_fetched_in_one_read(self):
+        self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0x40, 1)
+        self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0x10, 0x60)
+        self.assertEqual(self.reads[1:], [(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0x10, 0x30),
+                                          (Avr8Protocol.AVR8_MEMTYPE_SRAM, 0x50, 0x20)])
+
+    def test_step_invalidates_cache(self):
+        self.avr.regfile_read()
+        self.avr.regfile_read()
+        self.avr.step()
+        self.avr.regfile_read()
+        self.assertEqual(self.reads, [(Avr8Protocol.AVR8_MEMTYPE_REGFILE, 0, 32)] * 2)
+
+    def test_reads_are_not_cached_while_target_may_run(self):
+        self.avr.run()
+        self.avr.regfile_read()
+        self.avr.regfile_read()
+        self.assertEqual(len(self.reads), 2)
+        self.avr.set_target_halted(True)
+        self.avr.regfile_read()
+        self.avr.regfile_read()
+        self.assertEqual(len(self.reads), 3)
+
+    def test_session_commands_invalidate_cache(self):
+        # Data response carrying a device ID for activate_physical
+        self.avr.jtagice3_command_response.return_value = bytearray([Avr8Protocol.RSP_AVR8_DATA, 0x00,
+                                                                     1, 2, 3, 4, 0x00])
+        for command in [self.avr.enter_progmode, self.avr.leave_progmode, self.avr.activate_physical,
+                        self.avr.deactivate_physical]:
+            self.avr.set_target_halted(True)
+            self.avr.regfile_read()
+            command()
+            self.avr.set_target_halted(True)
+            self.avr.regfile_read()
+        self.assertEqual(len(self.reads), 8)
+
+    def test_default_memtypes_exclude_sram(self):
+        self.avr.enable_memory_cache()
+        self.assertNotIn(Avr8Protocol.AVR8_MEMTYPE_SRAM, self.avr.cached_memtypes)
+        self.assertIn(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, self.avr.cached_memtypes)
+
+    def test_paged_blocks_follow_the_current_page_size(self):
+        self.avr.enable_memory_cache((Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE,))
+        self.avr.set_target_halted(True)
+        self.avr.set_page_size(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 64)
+        self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 0x44, 4)
+        self.avr.set_page_size(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 128)
+        self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 0x44, 4)
+        self.assertEqual(self.reads, [(Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 0x40, 64),
+                                      (Avr8Protocol.AVR8_MEMTYPE_FLASH_PAGE, 0x00, 128)])
+
+    def test_cached_and_uncached_reads_return_bytearrays(self):
+        self.avr._memory_read_uncached = lambda memtype, address, num_bytes: list(range(num_bytes))
+        self.assertIsInstance(self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_SRAM, 0, 4), bytearray)
+        self.assertIsInstance(self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_OCD, 0, 4), bytearray)
+
+    def test_uncached_memtypes_always_read_target(self):
+        self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_OCD, 0, 4)
+        self.avr.memory_read(Avr8Protocol.AVR8_MEMTYPE_OCD, 0, 4)
+        self.assertEqual(len(self.reads), 2)
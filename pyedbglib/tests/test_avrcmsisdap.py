@@ -0,0 +1,83 @@
+import unittest
+from mock import Mock, patch
+
+from pyedbglib.protocols.avrcmsisdap import AvrCommand, AvrCommandError, AvrFrameCodec
+from pyedbglib.protocols.avr8protocol import Avr8Protocol
+from pyedbglib.util.backoff import PollBackoff
+
+NOT_READY = bytearray([0x81, 0x00])
+COMMAND_ACK = bytearray([0x80, 0x01])
+
+
+def _response_frame(payload):
+    return bytearray([0x81, 0x11, 0x00, len(payload)]) + bytearray(payload)
+
+
+class TestAvrFrameCodec(unittest.TestCase):
+    """Tests for AVR command fragmentation and response parsing"""
+
+    def test_command_is_split_into_padded_fragments(self):
+        command = bytearray(range(100))
+        fragments = AvrFrameCodec(64).fragment_command_packet(command)
+        self.assertEqual(len(fragments), 2)
+        self.assertEqual(fragments[0][0:4], bytearray([0x80, 0x12, 0x00, 60]))
+        self.assertEqual(fragments[0][4:], command[0:60])
+        self.assertEqual(fragments[1][0:4], bytearray([0x80, 0x22, 0x00, 40]))
+        self.assertEqual(fragments[1][4:44], command[60:])
+        self.assertEqual(fragments[1][44:], bytearray(20))
+
+    def test_fragments_do_not_share_the_template(self):
+        codec = AvrFrameCodec(64)
+        codec.fragment_command_packet([0xFF] * 10)
+        self.assertEqual(codec.fragment_command_packet([0x01])[0][5:], bytearray(59))
+
+    def test_response_payload_is_extracted(self):
+        response = bytearray([0x81, 0x11, 0x00, 0x03, 0x0E, 0x01, 0x02]) + bytearray(57)
+        info, size, payload = AvrFrameCodec.parse_response_fragment(response)
+        self.assertEqual((info, size, payload), (0x11, 3, bytearray([0x0E, 0x01, 0x02])))
+
+    def test_short_response_raises(self):
+        with self.assertRaises(AvrCommandError):
+            AvrFrameCodec.parse_response_fragment(bytearray([0x81, 0x11, 0x00, 0x08, 0x0E]))
+
+
+class TestAvrResponseWait(unittest.TestCase):
+    """Tests for waiting for AVR responses in avrcmsisdap.AvrCommand"""
+
+    def setUp(self):
+        self.transport = Mock()
+        self.transport.get_report_size.return_value = 64
+        self.sleep_patcher = patch("pyedbglib.util.backoff.time.sleep")
+        self.sleep = self.sleep_patcher.start()
+        self.addCleanup(self.sleep_patcher.stop)
+
+    def test_first_miss_is_re_polled_immediately(self):
+        self.transport.hid_transfer.side_effect = [COMMAND_ACK, NOT_READY, _response_frame([0x0E, 0x00])]
+        avr = AvrCommand(self.transport)
+        self.assertEqual(avr.avr_command_response(bytearray([0x0E])), [0x0E, 0x00])
+        self.assertEqual(avr.last_poll_count, 2)
+        self.sleep.assert_not_called()
+
+    def test_poll_class_selects_strategy(self):
+        self.transport.hid_transfer.side_effect = [COMMAND_ACK, NOT_READY, NOT_READY, _response_frame([0x0E])]
+        avr = AvrCommand(self.transport)
+        avr.set_poll_strategy(AvrCommand.POLL_ERASE, PollBackoff(initial_delay=0.2, immediate_polls=0))
+        avr.avr_command_response(bytearray([0x0E]), AvrCommand.POLL_ERASE)
+        self.assertEqual(self.sleep.call_args_list[0][0][0], 0.2)
+        self.assertEqual(avr.last_poll_count, 3)
+
+    def test_timeout_raises(self):
+        self.transport.hid_transfer.side_effect = lambda packet: COMMAND_ACK if packet[0] == 0x80 else NOT_READY
+        avr = AvrCommand(self.transport)
+        avr.timeout = 0
+        with self.assertRaises(AvrCommandError):
+            avr.avr_command_response(bytearray([0x0E]))
+
+    def test_avr8_commands_are_classified(self):
+        protocol = Avr8Protocol(self.transport)
+        protocol.avr_command_response = Mock(
+            side_effect=lambda packet, poll_class: bytearray([0x0E, packet[2], packet[3], 0x12, 0x80]))
+        protocol.jtagice3_command_response(bytearray([Avr8Protocol.CMD_AVR8_ERASE, 0x00]))
+        self.assertEqual(protocol.avr_command_response.call_args[0][1], AvrCommand.POLL_ERASE)
+        protocol.jtagice3_command_response(bytearray([Avr8Protocol.CMD_AVR8_PC_READ, 0x00]))
+        self.assertEqual(protocol.avr_command_response.call_args[0][1], AvrCommand.POLL_DEFAULT)
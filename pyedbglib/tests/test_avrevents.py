@@ -0,0 +1,94 @@
+import threading
+import unittest
+from mock import Mock
+
+from pyedbglib.protocols.avrevents import AvrEventListener, AvrEvent, BreakEvent, IdrEvent, SleepEvent, parse_event
+from pyedbglib.protocols.avrcmsisdap import AvrCommandError
+from pyedbglib.protocols.jtagice3multiplexer import Jtagice3Multiplexer
+from pyedbglib.util.backoff import PollBackoff
+
+NO_EVENT = bytearray([0x82, 0x00, 0x00])
+BREAK_EVENT = bytearray([0x82, 0x00, 0x0A, 0x0E, 0xFF, 0xFF, 0x12, 0x40, 0x34, 0x12, 0x00, 0x00, 0x01])
+
+
+class TestParseEvent(unittest.TestCase):
+    """Tests for parsing AVR_EVENT responses"""
+
+    def test_no_event(self):
+        self.assertIsNone(parse_event(NO_EVENT))
+
+    def test_break_event(self):
+        event = parse_event(BREAK_EVENT)
+        self.assertIsInstance(event, BreakEvent)
+        self.assertEqual(event.program_counter, 0x1234)
+        self.assertEqual(event.cause, 0x01)
+
+    def test_idr_and_sleep_events(self):
+        idr = parse_event(bytearray([0x82, 0x00, 0x06, 0x0E, 0x00, 0x00, 0x12, 0x41, 0xA5]))
+        self.assertIsInstance(idr, IdrEvent)
+        self.assertEqual(idr.value, 0xA5)
+        sleep = parse_event(bytearray([0x82, 0x00, 0x06, 0x0E, 0x00, 0x00, 0x01, 0x11, 0x01]))
+        self.assertIsInstance(sleep, SleepEvent)
+        self.assertTrue(sleep.sleeping)
+
+    def test_unknown_event(self):
+        event = parse_event(bytearray([0x82, 0x00, 0x06, 0x0E, 0x00, 0x00, 0x22, 0x55, 0x07]))
+        self.assertIs(type(event), AvrEvent)
+        self.assertEqual(event.payload, bytearray([0x07]))
+
+    def test_invalid_response_raises(self):
+        with self.assertRaises(AvrCommandError):
+            parse_event(bytearray([0x81, 0x00, 0x00]))
+
+
+class TestAvrEventListener(unittest.TestCase):
+    """Tests for the background event listener"""
+
+    def setUp(self):
+        self.avr = Mock()
+        self.listener = AvrEventListener(self.avr, backoff=PollBackoff(initial_delay=0.001, max_delay=0.002))
+
+    def test_poll_dispatches_to_callbacks_and_waiters(self):
+        self.avr.poll_events.return_value = BREAK_EVENT
+        callback = Mock()
+        self.listener.add_callback(callback)
+        waiter = self.listener.expect(BreakEvent)
+        event = self.listener.poll()
+        callback.assert_called_once_with(event)
+        self.assertIs(waiter.wait(0), event)
+        self.assertEqual(self.listener._waiters, [])
+
+    def test_break_marks_tracked_protocol_halted_before_waiters_wake(self):
+        self.avr.poll_events.return_value = BREAK_EVENT
+        avr8 = Mock(handler=parse_event(BREAK_EVENT).handler)
+        other = Mock(handler=0x13)
+        self.listener.track_halts(avr8)
+        self.listener.track_halts(other)
+        self.listener.add_callback(lambda event: avr8.set_target_halted.assert_called_once_with(True))
+        self.listener.poll()
+        avr8.set_target_halted.assert_called_once_with(True)
+        other.set_target_halted.assert_not_called()
+
+    def test_wait_ignores_other_event_types(self):
+        self.avr.poll_events.return_value = BREAK_EVENT
+        waiter = self.listener.expect(IdrEvent)
+        self.listener.poll()
+        self.assertIsNone(waiter.wait(0))
+
+    def test_background_thread_delivers_event(self):
+        self.avr.poll_events.side_effect = [NO_EVENT, NO_EVENT, BREAK_EVENT] + [NO_EVENT] * 1000
+        waiter = self.listener.expect(BreakEvent)
+        with self.listener:
+            event = waiter.wait(5.0)
+        self.assertIsInstance(event, BreakEvent)
+        self.assertGreaterEqual(self.listener.polls, 3)
+
+    def test_polls_share_the_command_lock(self):
+        self.assertIs(self.listener.lock, Jtagice3Multiplexer.for_transport(self.avr.transport).lock)
+        polled = threading.Event()
+        self.avr.poll_events.side_effect = lambda: polled.set() or NO_EVENT
+        with self.listener.lock:
+            self.listener.start()
+            self.assertFalse(polled.wait(0.05))
+        self.assertTrue(polled.wait(5.0))
+        self.listener.stop()
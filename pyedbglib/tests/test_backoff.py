@@ -0,0 +1,33 @@
+import unittest
+from mock import patch
+
+from pyedbglib.util.backoff import PollBackoff
+
+
+class TestPollBackoff(unittest.TestCase):
+    """Tests for the polling back-off policy"""
+
+    def test_delays_grow_to_max_after_immediate_polls(self):
+        poller = PollBackoff(initial_delay=0.001, factor=2.0, max_delay=0.005, immediate_polls=2).start()
+        delays = [poller.next_delay() for _ in range(7)]
+        self.assertEqual(delays, [0.0, 0.0, 0.001, 0.002, 0.004, 0.005, 0.005])
+        self.assertEqual(poller.polls, 7)
+
+    def test_no_timeout_never_expires(self):
+        poller = PollBackoff().start()
+        self.assertIsNone(poller.remaining())
+        self.assertFalse(poller.expired())
+
+    @patch("pyedbglib.util.backoff._clock")
+    def test_wait_gives_up_after_timeout(self, mock_clock):
+        mock_clock.return_value = 100.0
+        poller = PollBackoff(initial_delay=0.0, immediate_polls=0).start(timeout=1.0)
+        self.assertTrue(poller.wait())
+        mock_clock.return_value = 101.5
+        self.assertFalse(poller.wait())
+
+    @patch("pyedbglib.util.backoff._clock")
+    def test_delay_is_capped_by_deadline(self, mock_clock):
+        mock_clock.return_value = 10.0
+        poller = PollBackoff(initial_delay=0.5, immediate_polls=0, timeout=0.2).start()
+        self.assertAlmostEqual(poller.next_delay(), 0.2)
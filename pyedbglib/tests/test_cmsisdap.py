@@ -0,0 +1,216 @@
+import unittest
+from mock import Mock
+
+from pyedbglib.protocols.cmsisdap import CmsisDapDebugger
+from pyedbglib.util import binary
+from pyedbglib.pyedbglib_errors import PyedbglibError
+
+AP_TAR = CmsisDapDebugger.SWD_AP_TAR | CmsisDapDebugger.DAP_TRANSFER_APnDP
+AP_DRW = CmsisDapDebugger.SWD_AP_DRW | CmsisDapDebugger.DAP_TRANSFER_APnDP
+
+
+class TestDapTransferBatch(unittest.TestCase):
+    """Tests for batched DAP_Transfer packets in cmsisdap"""
+
+    def setUp(self):
+        self.transport = Mock()
+        self.transport.get_report_size.return_value = 64
+        self.debugger = CmsisDapDebugger(self.transport)
+        self.commands = []
+
+    def _respond_ok(self, read_value=0x12345678):
+        def hid_transfer(cmd):
+            self.commands.append(bytearray(cmd))
+            count = cmd[2]
+            rsp = bytearray([cmd[0], count, CmsisDapDebugger.DAP_TRANSFER_OK])
+            index = 3
+            for _ in range(count):
+                request = cmd[index]
+                index += 1
+                if not request & CmsisDapDebugger.DAP_TRANSFER_RnW or \
+                        request & CmsisDapDebugger.DAP_TRANSFER_MATCH_VALUE:
+                    index += 4
+                if request & CmsisDapDebugger.DAP_TRANSFER_RnW and \
+                        not request & CmsisDapDebugger.DAP_TRANSFER_MATCH_VALUE:
+                    rsp.extend(binary.pack_le32(read_value))
+            return rsp
+        self.transport.hid_transfer.side_effect = hid_transfer
+
+    def test_write_word_uses_one_packet(self):
+        self._respond_ok()
+        self.debugger.write_word(0x20000000, 0xCAFEBABE)
+        self.assertEqual(len(self.commands), 1)
+        expected = bytearray([CmsisDapDebugger.ID_DAP_Transfer, 0x00, 2, AP_TAR]) + binary.pack_le32(0x20000000)
+        expected += bytearray([AP_DRW]) + binary.pack_le32(0xCAFEBABE)
+        self.assertEqual(self.commands[0], expected)
+
+    def test_read_word_returns_value_from_one_packet(self):
+        self._respond_ok(read_value=0xDEADBEEF)
+        self.assertEqual(self.debugger.read_word(0x20000000), 0xDEADBEEF)
+        self.assertEqual(len(self.commands), 1)
+
+    def test_writes_are_split_by_report_size(self):
+        self._respond_ok()
+        batch = self.debugger.new_transfer_batch()
+        for i in range(24):
+            batch.write(AP_DRW, i)
+        results = batch.execute()
+        # 3 header bytes + 12 writes of 5 bytes fit in 64 bytes
+        self.assertEqual([cmd[2] for cmd in self.commands], [12, 12])
+        self.assertTrue(all(result.ack == CmsisDapDebugger.DAP_TRANSFER_OK for result in results))
+
+    def test_reads_are_split_by_response_size(self):
+        self._respond_ok()
+        batch = self.debugger.new_transfer_batch()
+        for _ in range(20):
+            batch.read(AP_DRW)
+        results = batch.execute()
+        # 3 header bytes + 15 words read fit in 64 bytes
+        self.assertEqual([cmd[2] for cmd in self.commands], [15, 5])
+        self.assertEqual([result.value for result in results], [0x12345678] * 20)
+
+    def test_match_transfers_carry_data_but_return_none(self):
+        self._respond_ok()
+        batch = self.debugger.new_transfer_batch()
+        batch.write_match_mask(0x01)
+        batch.read_match(AP_DRW, 0x01)
+        results = batch.execute()
+        self.assertEqual(len(self.commands[0]), 3 + 5 + 5)
+        self.assertEqual(self.commands[0][3], CmsisDapDebugger.DAP_TRANSFER_MATCH_MASK)
+        self.assertIsNone(results[1].value)
+
+    def test_failed_transfer_reports_ack_and_stops(self):
+        self.transport.hid_transfer.return_value = bytearray([CmsisDapDebugger.ID_DAP_Transfer, 1,
+                                                              CmsisDapDebugger.DAP_TRANSFER_FAULT])
+        batch = self.debugger.new_transfer_batch()
+        batch.write(AP_TAR, 0)
+        batch.write(AP_DRW, 1)
+        batch.write(AP_DRW, 2)
+        results = batch.execute()
+        self.assertEqual([result.ack for result in results],
+                         [CmsisDapDebugger.DAP_TRANSFER_OK, CmsisDapDebugger.DAP_TRANSFER_FAULT, None])
+
+    def test_execute_again_resets_results(self):
+        self._respond_ok()
+        batch = self.debugger.new_transfer_batch()
+        batch.read(AP_DRW)
+        batch.read(AP_DRW)
+        batch.execute()
+        self.transport.hid_transfer.side_effect = None
+        self.transport.hid_transfer.return_value = bytearray([CmsisDapDebugger.ID_DAP_Transfer, 0,
+                                                              CmsisDapDebugger.DAP_TRANSFER_FAULT])
+        results = batch.execute()
+        self.assertEqual([result.ack for result in results], [CmsisDapDebugger.DAP_TRANSFER_FAULT, None])
+        self.assertEqual([result.value for result in results], [None, None])
+
+
+class TestBlockTransfers(unittest.TestCase):
+    """Tests for block reads and writes in cmsisdap"""
+
+    def setUp(self):
+        self.transport = Mock()
+        self.transport.get_report_size.return_value = 64
+        self.transport.supports_pipelining.return_value = True
+        self.debugger = CmsisDapDebugger(self.transport)
+        self.memory = bytearray(range(256)) * 16
+        self.tar = 0
+        self.tar_writes = []
+        self.tar_fault = False
+        self.block_commands = []
+        self.pending = []
+
+        def handle(cmd):
+            cmd = bytearray(cmd)
+            if cmd[0] == CmsisDapDebugger.ID_DAP_Info:
+                return bytearray([cmd[0], 1, 2])
+            if cmd[0] == CmsisDapDebugger.ID_DAP_Transfer:
+                rsp = bytearray([cmd[0], 0, CmsisDapDebugger.DAP_TRANSFER_OK])
+                index = 3
+                for _ in range(cmd[2]):
+                    request = cmd[index]
+                    index += 1
+                    if request == AP_TAR:
+                        if self.tar_fault:
+                            rsp[2] = CmsisDapDebugger.DAP_TRANSFER_FAULT
+                            return rsp
+                        self.tar = binary.unpack_le32(cmd[index:index + 4])
+                        self.tar_writes.append(self.tar)
+                    elif request == AP_DRW | CmsisDapDebugger.DAP_TRANSFER_RnW:
+                        rsp += self.memory[self.tar:self.tar + 4]
+                        self.tar += 4
+                    if not request & CmsisDapDebugger.DAP_TRANSFER_RnW:
+                        index += 4
+                    rsp[1] += 1
+                return rsp
+            self.block_commands.append(cmd)
+            words = binary.unpack_le16(cmd[2:4])
+            rsp = bytearray([cmd[0], cmd[2], cmd[3], CmsisDapDebugger.DAP_TRANSFER_OK])
+            if cmd[4] & CmsisDapDebugger.DAP_TRANSFER_RnW:
+                rsp += self.memory[self.tar:self.tar + words * 4]
+            else:
+                self.memory[self.tar:self.tar + words * 4] = cmd[5:5 + words * 4]
+            self.tar += words * 4
+            return rsp
+
+        def hid_transfer_into(cmd, buffer):
+            rsp = handle(cmd)
+            buffer[0:len(rsp)] = rsp
+            return len(rsp)
+
+        frame = bytearray(64)
+        self.transport.get_report_frame.side_effect = lambda: memoryview(frame)
+        self.transport.hid_transfer_frame.side_effect = lambda length: handle(frame[:length])
+        self.transport.hid_transfer.side_effect = handle
+        self.transport.hid_transfer_into.side_effect = hid_transfer_into
+        self.transport.hid_write.side_effect = lambda cmd: self.pending.append(handle(cmd))
+        self.transport.hid_read.side_effect = lambda: self.pending.pop(0)
+
+    def test_read_block_into_fills_caller_buffer(self):
+        buffer = bytearray(200)
+        self.assertEqual(self.debugger.read_block_into(0x100, buffer), 200)
+        self.assertEqual(buffer, self.memory[0x100:0x100 + 200])
+
+    def test_read_block_does_not_cross_tar_boundary(self):
+        self.assertEqual(self.debugger.read_block(0x3F0, 32), self.memory[0x3F0:0x410])
+        self.assertEqual(self.tar_writes, [0x3F0, 0x400])
+
+    def test_write_block_writes_all_chunks(self):
+        data = bytearray([0xA5] * 152)
+        self.debugger.write_block(0x200, data)
+        self.assertEqual(self.memory[0x200:0x200 + 152], data)
+        self.assertEqual([binary.unpack_le16(cmd[2:4]) for cmd in self.block_commands], [14, 14, 10])
+
+    def test_tar_is_written_only_at_start_and_tar_boundaries(self):
+        self.debugger.read_block(0x300, 0x200)
+        self.assertEqual(self.tar_writes, [0x300, 0x400])
+
+    def test_consecutive_blocks_reuse_tar(self):
+        self.debugger.write_block(0x100, bytearray(56))
+        self.debugger.write_block(0x138, bytearray(56))
+        self.assertEqual(self.tar_writes, [0x100])
+
+    def test_invalidated_state_forces_tar_write(self):
+        self.debugger.read_block(0x100, 56)
+        self.debugger.invalidate_ap_state()
+        self.debugger.read_block(0x138, 56)
+        self.assertEqual(self.tar_writes, [0x100, 0x138])
+
+    def test_tar_fault_reads_nothing(self):
+        self.tar_fault = True
+        with self.assertRaises(PyedbglibError):
+            self.debugger.read_block(0x100, 56)
+        self.assertEqual(self.block_commands, [])
+        self.assertIsNone(self.debugger.ap_tar)
+
+    def test_block_after_word_access_reuses_tar(self):
+        self.debugger.dap_write_reg(CmsisDapDebugger.SWD_AP_CSW | CmsisDapDebugger.DAP_TRANSFER_APnDP,
+                                    CmsisDapDebugger.CSW_ADDRINC_ON | CmsisDapDebugger.CSW_32BIT)
+        self.debugger.read_word(0x100)
+        self.assertEqual(self.debugger.read_block(0x104, 8), self.memory[0x104:0x10C])
+        self.assertEqual(self.tar_writes, [0x100])
+
+    def test_tar_tracking_follows_csw_size(self):
+        self.debugger.dap_write_reg(CmsisDapDebugger.SWD_AP_CSW | CmsisDapDebugger.DAP_TRANSFER_APnDP,
+                                    CmsisDapDebugger.CSW_ADDRINC_ON | CmsisDapDebugger.CSW_16BIT)
+        self.debugger.write_word(0x100, 0)
+        self.assertEqual(self.debugger.ap_tar, 0x102)
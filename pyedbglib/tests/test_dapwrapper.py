@@ -0,0 +1,67 @@
+import unittest
+from mock import Mock
+
+from pyedbglib.protocols.dapwrapper import DapWrapper
+
+
+class TestDapCommandQueue(unittest.TestCase):
+    """Tests for the pipelined command queue in dapwrapper"""
+
+    def setUp(self):
+        self.transport = Mock()
+        self.transport.supports_pipelining.return_value = True
+        self.sent = []
+        self.responses = []
+
+        def hid_write(packet):
+            self.sent.append(packet)
+            self.responses.append(bytearray([packet[0], 0x00]))
+            return len(packet)
+
+        def hid_read():
+            return self.responses.pop(0)
+
+        self.transport.hid_write.side_effect = hid_write
+        self.transport.hid_read.side_effect = hid_read
+        self.dap = DapWrapper(self.transport)
+
+    def test_packet_count_is_read_once_from_dap_info(self):
+        self.transport.hid_transfer.return_value = bytearray([0x00, 0x01, 0x04])
+        self.assertEqual(self.dap.get_packet_count(), 4)
+        self.assertEqual(self.dap.get_packet_count(), 4)
+        self.transport.hid_transfer.assert_called_once_with(bytearray([0x00, 0xFE]))
+
+    def test_packet_count_defaults_to_one_on_invalid_response(self):
+        self.transport.hid_transfer.return_value = bytearray([0xFF, 0x00, 0x00])
+        self.assertEqual(self.dap.get_packet_count(), 1)
+
+    def test_pipelined_responses_are_returned_in_order(self):
+        packets = [bytearray([i]) for i in range(10)]
+        responses = self.dap.dap_command_response_pipelined(packets, max_in_flight=3)
+        self.assertEqual([response[0] for response in responses], list(range(10)))
+        self.assertEqual(self.sent, packets)
+
+    def test_queue_never_exceeds_max_in_flight(self):
+        queue = self.dap.new_command_queue(max_in_flight=2)
+        queue.submit(bytearray([1]))
+        queue.submit(bytearray([2]))
+        self.assertEqual(queue.in_flight(), 2)
+        queue.submit(bytearray([3]))
+        self.assertEqual(queue.in_flight(), 2)
+        self.assertEqual(self.transport.hid_read.call_count, 1)
+
+    def test_result_collects_outstanding_responses(self):
+        queue = self.dap.new_command_queue(max_in_flight=4)
+        first = queue.submit(bytearray([1]))
+        second = queue.submit(bytearray([2]))
+        self.assertFalse(second.done())
+        self.assertEqual(second.result()[0], 2)
+        self.assertTrue(first.done())
+        self.assertEqual(queue.in_flight(), 0)
+
+    def test_transport_without_pipelining_uses_hid_transfer(self):
+        self.transport.supports_pipelining.return_value = False
+        self.transport.hid_transfer.side_effect = lambda packet: bytearray([packet[0], 0x00])
+        responses = self.dap.dap_command_response_pipelined([bytearray([5]), bytearray([6])], max_in_flight=4)
+        self.assertEqual([response[0] for response in responses], [5, 6])
+        self.transport.hid_write.assert_not_called()
@@ -0,0 +1,48 @@
+import unittest
+from mock import MagicMock, patch
+
+from pyedbglib.hidtransport.devicecache import DeviceCache
+
+
+class TestDeviceCache(unittest.TestCase):
+    """Tests for the shared enumeration cache"""
+
+    @patch("pyedbglib.hidtransport.devicecache.time")
+    def test_enumeration_is_reused_until_expired(self, mock_time):
+        enumerate_function = MagicMock(return_value=[{'vendor_id': 0x03EB}])
+        cache = DeviceCache(ttl=2.0)
+        mock_time.time.return_value = 10.0
+        cache.get("hidapi", enumerate_function)
+        mock_time.time.return_value = 11.5
+        self.assertEqual(cache.get("hidapi", enumerate_function), [{'vendor_id': 0x03EB}])
+        self.assertEqual(enumerate_function.call_count, 1)
+        mock_time.time.return_value = 12.5
+        cache.get("hidapi", enumerate_function)
+        self.assertEqual(enumerate_function.call_count, 2)
+
+    def test_invalidate_forces_enumeration(self):
+        enumerate_function = MagicMock(return_value=[])
+        cache = DeviceCache(ttl=60.0)
+        cache.get("hidapi", enumerate_function)
+        cache.invalidate()
+        cache.get("hidapi", enumerate_function)
+        self.assertEqual(enumerate_function.call_count, 2)
+
+    def test_cache_is_off_by_default(self):
+        enumerate_function = MagicMock(return_value=[])
+        cache = DeviceCache()
+        cache.get("hidapi", enumerate_function)
+        cache.get("hidapi", enumerate_function)
+        self.assertEqual(enumerate_function.call_count, 2)
+
+    def test_reuse_enumerates_once_whatever_the_ttl(self):
+        enumerate_function = MagicMock(return_value=[])
+        cache = DeviceCache()
+        with cache.reuse():
+            cache.get("hidapi", enumerate_function)
+            with cache.reuse():
+                cache.get("hidapi", enumerate_function)
+            cache.get("hidapi", enumerate_function)
+        self.assertEqual(enumerate_function.call_count, 1)
+        cache.get("hidapi", enumerate_function)
+        self.assertEqual(enumerate_function.call_count, 2)
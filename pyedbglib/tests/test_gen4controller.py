@@ -0,0 +1,139 @@
+import unittest
+from mock import Mock
+
+from pyedbglib.primitive.gen4controller import Gen4Controller, Gen4Exception, Gen4Pipeline, script_command_buffer
+from pyedbglib.protocols.ati import ATI_FRAME_PAYLOAD
+
+
+def frames_payload(frames):
+    return bytearray().join(frame[ATI_FRAME_PAYLOAD:] for frame in frames)
+
+
+class TestGen4Controller(unittest.TestCase):
+    """Tests for compiled GEN4 scripts"""
+
+    def setUp(self):
+        transport = Mock()
+        transport.get_report_size.return_value = 64
+        self.controller = Gen4Controller(transport)
+
+    def _command(self, address, length):
+        command = self.controller.new_command(bytearray(range(100)))
+        command.add_parameter(bytearray([address & 0xFF, address >> 8]))
+        command.add_parameter(bytearray([length]))
+        return command
+
+    def test_compile_builds_command_frames(self):
+        command = self._command(0x1234, 0x40)
+        compiled = self.controller.compile_script(command)
+        self.assertEqual(len(compiled.frames), 2)
+        self.assertEqual(frames_payload(compiled.frames), script_command_buffer(command.generate_bytestream()))
+
+    def test_compile_reuses_cached_script_with_new_parameters(self):
+        self.controller.build_frames = Mock(side_effect=self.controller.build_frames)
+        first_command = self._command(0x1234, 0x40)
+        first = self.controller.compile_script(first_command)
+        command = self._command(0xABCD, 0x20)
+        second = self.controller.compile_script(command)
+        self.assertEqual(self.controller.build_frames.call_count, 1)
+        self.assertEqual(frames_payload(second.frames), script_command_buffer(command.generate_bytestream()))
+        # Each caller gets its own script, so compiling or patching one leaves the others alone
+        second.patch([bytearray(2), bytearray(1)])
+        self.assertEqual(frames_payload(first.frames), script_command_buffer(first_command.generate_bytestream()))
+        third = self.controller.compile_script(command)
+        self.assertEqual(frames_payload(third.frames), script_command_buffer(command.generate_bytestream()))
+
+    def test_compiled_scripts_are_bounded(self):
+        self.controller.MAX_COMPILED_SCRIPTS = 2
+        self.controller.build_frames = Mock(side_effect=self.controller.build_frames)
+        self.controller.compile_script(self.controller.new_command(bytearray([1])))
+        self.controller.compile_script(self.controller.new_command(bytearray([2])))
+        self.controller.compile_script(self.controller.new_command(bytearray([1])))
+        self.controller.compile_script(self.controller.new_command(bytearray([3])))
+        self.assertEqual(len(self.controller.compiled_scripts), 2)
+        # The least recently used script was dropped, not the first one compiled
+        self.controller.compile_script(self.controller.new_command(bytearray([1])))
+        self.assertEqual(self.controller.build_frames.call_count, 3)
+        self.controller.clear_compiled_scripts()
+        self.assertEqual(len(self.controller.compiled_scripts), 0)
+
+    def test_patch_checks_parameter_sizes(self):
+        compiled = self.controller.compile_script(self._command(0x1234, 0x40))
+        with self.assertRaises(Gen4Exception):
+            compiled.patch([bytearray(2)])
+        with self.assertRaises(Gen4Exception):
+            compiled.patch([bytearray(2), bytearray(2)])
+
+    def test_finish_script_execution_checks_status(self):
+        self.controller.receive_script_execution_response = Mock(side_effect=[raw_response(0, 7),
+                                                                              raw_response(0x42, 0)])
+        self.assertEqual(self.controller.finish_script_execution(), 7)
+        with self.assertRaises(Gen4Exception):
+            self.controller.finish_script_execution()
+
+    def test_execute_many(self):
+        self.controller.send_frames = Mock()
+        self.controller.finish_script_execution = Mock(side_effect=[1, 2, 3])
+        results = self.controller.execute_many(self._command(0, 0),
+                                               [[bytearray([i, 0]), bytearray([i])] for i in range(3)])
+        self.assertEqual(results, [1, 2, 3])
+        self.assertEqual(self.controller.send_frames.call_count, 3)
+        self.assertEqual(frames_payload(self.controller.send_frames.call_args[0][1]),
+                         script_command_buffer(self._command(2, 2).generate_bytestream()))
+
+
+def raw_response(status, result):
+    return bytearray([1, status, 0, 0x10, 0x00, 0, 0, 0, 0]) + bytearray([result, 0, 0, 0])
+
+
+class TestGen4Pipeline(unittest.TestCase):
+    """Tests for pipelined GEN4 script execution"""
+
+    def setUp(self):
+        self.log = []
+        self.controller = Mock()
+        self.controller.write_data_buffer.side_effect = lambda buffer_id, data: self.log.append(('write', buffer_id))
+        self.controller.start_script_execution.side_effect = lambda script: self.log.append(('start', script))
+        self.controller.read_data_buffer.side_effect = \
+            lambda buffer_id, num_bytes: self.log.append(('read', buffer_id)) or bytearray(num_bytes)
+        self.responses = [raw_response(0, 1), raw_response(0, 2), raw_response(0x42, 0)]
+
+        def receive():
+            self.log.append(('finish',))
+            return self.responses.pop(0)
+
+        self.controller.receive_script_execution_response.side_effect = receive
+
+    def test_transfers_overlap_execution(self):
+        pipeline = Gen4Pipeline(self.controller, buffer_ids=(3, 4))
+        first = pipeline.submit('a', data=bytearray(4), read_bytes=2)
+        second = pipeline.submit('b', data=bytearray(4))
+        self.assertFalse(second.done())
+        pipeline.flush()
+        self.assertEqual(self.log, [('write', 3), ('start', 'a'), ('write', 4), ('finish',), ('start', 'b'),
+                                    ('read', 3), ('finish',)])
+        self.assertEqual(first.result().result, 1)
+        self.assertEqual(first.result().data, bytearray(2))
+        self.assertEqual(first.result().execution_time, 0x10)
+        self.assertEqual(second.result().result, 2)
+
+    def test_failed_script_sets_exception(self):
+        with Gen4Pipeline(self.controller) as pipeline:
+            futures = [pipeline.submit(script) for script in ['a', 'b', 'c']]
+        self.assertIsInstance(futures[2].exception(), Gen4Exception)
+        self.assertEqual(futures[1].result().result, 2)
+
+    def test_failed_submit_does_not_use_running_buffer(self):
+        pipeline = Gen4Pipeline(self.controller, buffer_ids=(3, 4))
+        first = pipeline.submit('a', data=bytearray(4))
+        self.controller.write_data_buffer.side_effect = IOError("write failed")
+        failed = pipeline.submit('b', data=bytearray(4))
+        self.assertIsInstance(failed.exception(), IOError)
+        self.controller.write_data_buffer.side_effect = lambda buffer_id, data: self.log.append(('write', buffer_id))
+        third = pipeline.submit('c', data=bytearray(4))
+        pipeline.flush()
+        # Script 'a' was still running on buffer 3, so the next script gets buffer 4
+        self.assertEqual(self.log, [('write', 3), ('start', 'a'), ('write', 4), ('finish',), ('start', 'c'),
+                                    ('finish',)])
+        self.assertEqual(first.result().result, 1)
+        self.assertEqual(third.result().result, 2)
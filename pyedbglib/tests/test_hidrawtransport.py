@@ -0,0 +1,110 @@
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from mock import patch
+
+from pyedbglib.hidtransport.hidrawtransport import HidrawTransport
+from pyedbglib.hidtransport.hidtransportbase import HidTool
+from pyedbglib.pyedbglib_errors import PyedbglibTimeoutError
+
+
+def _write_attribute(directory, name, value):
+    with open(os.path.join(directory, name), 'w') as attribute:
+        attribute.write(value + "\n")
+
+
+class TestHidrawDetectDevices(unittest.TestCase):
+    """Tests for sysfs enumeration in hidrawtransport.HidrawTransport"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.sysfs = os.path.join(self.root, "class", "hidraw")
+        os.makedirs(self.sysfs)
+
+    def _add_device(self, hidraw_name, vendor_id, product_id, serial, product):
+        usb_device = os.path.join(self.root, "devices", "usb1", hidraw_name + "-dev")
+        interface = os.path.join(usb_device, "1-1:1.0")
+        hid_device = os.path.join(interface, "0003:{}:{}.0001".format(vendor_id, product_id))
+        os.makedirs(hid_device)
+        _write_attribute(usb_device, "idVendor", vendor_id)
+        _write_attribute(usb_device, "idProduct", product_id)
+        _write_attribute(usb_device, "serial", serial)
+        _write_attribute(usb_device, "product", product)
+        _write_attribute(usb_device, "manufacturer", "Microchip Technology Incorporated")
+        _write_attribute(interface, "bInterfaceNumber", "00")
+        os.makedirs(os.path.join(self.sysfs, hidraw_name))
+        os.symlink(hid_device, os.path.join(self.sysfs, hidraw_name, "device"))
+
+    def test_only_microchip_devices_are_detected(self):
+        self._add_device("hidraw0", "03eb", "2175", "MCHP3280000000001234", "nEDBG CMSIS-DAP")
+        self._add_device("hidraw1", "046d", "c52b", "", "USB Receiver")
+        transport = HidrawTransport(sysfs_root=self.sysfs, dev_root="/dev")
+        self.assertEqual(len(transport.devices), 1)
+        device = transport.devices[0]
+        self.assertEqual(device.vendor_id, 0x03EB)
+        self.assertEqual(device.product_id, 0x2175)
+        self.assertEqual(device.serial_number, "MCHP3280000000001234")
+        self.assertEqual(device.product_string, "nEDBG CMSIS-DAP")
+        self.assertEqual(device.path, "/dev/hidraw0")
+        self.assertEqual(device.interface_number, 0)
+
+    def test_detect_devices_does_not_duplicate(self):
+        self._add_device("hidraw0", "03eb", "2175", "MCHP3280000000001234", "nEDBG CMSIS-DAP")
+        transport = HidrawTransport(sysfs_root=self.sysfs, dev_root="/dev")
+        transport.detect_devices()
+        self.assertEqual(len(transport.devices), 1)
+
+    def test_missing_sysfs_detects_nothing(self):
+        transport = HidrawTransport(sysfs_root=os.path.join(self.root, "missing"))
+        self.assertEqual(transport.devices, [])
+
+
+class TestHidrawTransfers(unittest.TestCase):
+    """Tests for hidrawtransport.HidrawTransport I/O, using a socket pair in place of the device node"""
+
+    def setUp(self):
+        self.host, self.tool = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.addCleanup(self.tool.close)
+        patcher = patch("pyedbglib.hidtransport.hidrawtransport.HidrawTransport._open_device_node",
+                        return_value=self.host.detach())
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self.transport = HidrawTransport(sysfs_root=tempfile.gettempdir() + "/no-such-hidraw")
+        nedbg = HidTool(0x03EB, 0x2175, "MCHP3280000000001234", "nEDBG CMSIS-DAP")
+        nedbg.path = "/dev/hidraw0"
+        self.transport.devices = [nedbg]
+        self.assertTrue(self.transport.connect())
+        self.addCleanup(self.transport.disconnect)
+
+    def test_write_sends_padded_report_with_report_number(self):
+        self.transport.hid_write(bytearray([0x00, 0xFE]))
+        report = self.tool.recv(1024)
+        self.assertEqual(len(report), 65)
+        self.assertEqual(bytearray(report[0:3]), bytearray([0x00, 0x00, 0xFE]))
+
+    def test_frame_write_pads_after_length(self):
+        self.transport.hid_write(bytearray([0xFF] * 64))
+        self.tool.recv(1024)
+        frame = self.transport.get_report_frame()
+        frame[0:2] = bytearray([0x05, 0x00])
+        self.transport.hid_write_frame(2)
+        report = bytearray(self.tool.recv(1024))
+        self.assertEqual(report, bytearray([0x00, 0x05]) + bytearray(63))
+
+    def test_transfer_returns_response(self):
+        self.tool.send(bytes(bytearray([0x00, 0x01, 0x02])))
+        self.assertEqual(self.transport.hid_transfer(bytearray([0x00, 0xFE])), bytearray([0x00, 0x01, 0x02]))
+
+    def test_read_into_fills_buffer(self):
+        self.tool.send(bytes(bytearray([0x81, 0x01])))
+        buffer = bytearray(64)
+        self.assertEqual(self.transport.hid_read_into(buffer), 2)
+        self.assertEqual(buffer[0:2], bytearray([0x81, 0x01]))
+
+    def test_read_times_out(self):
+        self.transport.set_read_timeout(10)
+        with self.assertRaises(PyedbglibTimeoutError):
+            self.transport.hid_read()
@@ -0,0 +1,42 @@
+import unittest
+from mock import MagicMock
+
+from pyedbglib.hidtransport.hotplug import HotplugWatcher
+from pyedbglib.hidtransport.hidtransportbase import HidTool
+
+
+class TestHotplugWatcher(unittest.TestCase):
+    """Tests for add/remove reporting in HotplugWatcher"""
+
+    def test_update_reports_added_and_removed_tools(self):
+        first = HidTool(0x03EB, 0x2175, "MCHP0001", "nEDBG CMSIS-DAP", "Microchip")
+        second = HidTool(0x03EB, 0x2175, "MCHP0002", "nEDBG CMSIS-DAP", "Microchip")
+        on_add = MagicMock()
+        on_remove = MagicMock()
+        watcher = HotplugWatcher(on_add=on_add, on_remove=on_remove)
+        watcher.update([first])
+        on_add.assert_called_once_with(first)
+
+        on_add.reset_mock()
+        second_again = HidTool(0x03EB, 0x2175, "MCHP0002", "nEDBG CMSIS-DAP", "Microchip")
+        watcher.update([second])
+        watcher.update([second_again])
+        on_add.assert_called_once_with(second)
+        on_remove.assert_called_once_with(first)
+        # Tools already known are kept, so state set on them survives a re-enumeration
+        self.assertIs(watcher.get_devices()[0], second)
+
+    def test_watch_enumerates_again_after_a_change(self):
+        tool = HidTool(0x03EB, 0x2175, "MCHP0001", "nEDBG CMSIS-DAP", "Microchip")
+        on_add = MagicMock()
+        watcher = HotplugWatcher(on_add=on_add)
+        watcher._snapshot = frozenset()
+        # The tool shows up on USB at the first poll, but its HID interface is only bound by the second
+        watcher._sysfs_snapshot = MagicMock(return_value=frozenset(["1-1"]))
+        watcher._enumerate = MagicMock(side_effect=[[], [tool], [tool], [tool]])
+        watcher._stop = MagicMock()
+        watcher._stop.wait.side_effect = [False, False, False, False, True]
+        watcher._watch()
+        on_add.assert_called_once_with(tool)
+        # Enumeration stops once it finds no change
+        self.assertEqual(watcher._enumerate.call_count, 3)
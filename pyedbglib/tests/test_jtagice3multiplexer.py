@@ -0,0 +1,110 @@
+import threading
+import unittest
+from mock import Mock
+
+from pyedbglib.protocols.housekeepingprotocol import Jtagice3HousekeepingProtocol
+from pyedbglib.protocols.avr8protocol import Avr8Protocol
+from pyedbglib.protocols.edbgprotocol import EdbgProtocol
+from pyedbglib.protocols.jtagice3multiplexer import Jtagice3Multiplexer
+from pyedbglib.pyedbglib_errors import PyedbglibError
+
+
+class FakeTool(object):
+    """Answers each JTAGICE3 GET command with its sequence number, handler and the offset requested"""
+
+    def __init__(self):
+        self.busy = threading.Lock()
+        self.command = None
+        self.stale = []
+        self.overlaps = 0
+
+    def get_report_size(self):
+        return 64
+
+    def send(self, packet):
+        if not self.busy.acquire(False):
+            self.overlaps += 1
+            return
+        self.command = bytearray(packet)
+
+    def receive(self, poll_class):
+        if self.stale:
+            return self.stale.pop(0)
+        command = self.command
+        self.busy.release()
+        return bytearray([0x0E, command[2], command[3], command[4], 0x84, 0x00, command[8], 0x00])
+
+
+class TestJtagice3Multiplexer(unittest.TestCase):
+    """Tests for sharing a tool between threads with Jtagice3Multiplexer"""
+
+    def setUp(self):
+        self.tool = FakeTool()
+        self.multiplexer = Jtagice3Multiplexer.for_transport(self.tool)
+
+    def _attach(self, protocol_class):
+        protocol = protocol_class(self.tool)
+        protocol.avr_command_send = Mock(side_effect=self.tool.send)
+        protocol.avr_response_receive = Mock(side_effect=self.tool.receive)
+        return protocol
+
+    def test_threads_get_their_own_responses(self):
+        results = {}
+
+        def run(protocol, command_id):
+            results[command_id] = [protocol.get_byte(0x00, command_id) for _ in range(50)]
+
+        threads = [threading.Thread(target=run, args=(self._attach(protocol_class), command_id))
+                   for protocol_class, command_id in [(Jtagice3HousekeepingProtocol, 0x01), (Avr8Protocol, 0x02),
+                                                      (Jtagice3HousekeepingProtocol, 0x03)]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.tool.overlaps, 0)
+        for command_id in (0x01, 0x02, 0x03):
+            self.assertEqual(results[command_id], [command_id] * 50)
+
+    def test_stale_response_is_discarded(self):
+        housekeeper = self._attach(Jtagice3HousekeepingProtocol)
+        self.tool.stale.append(bytearray([0x0E, 0x99, 0x00, 0x01, 0x80, 0x00]))
+        self.assertEqual(housekeeper.get_byte(0x00, 0x05), 0x05)
+        self.assertEqual(self.multiplexer.stale_responses, 1)
+
+    def test_protocols_on_a_transport_share_one_multiplexer(self):
+        housekeeper = self._attach(Jtagice3HousekeepingProtocol)
+        avr = self._attach(Avr8Protocol)
+        self.assertIs(housekeeper.multiplexer, self.multiplexer)
+        self.assertIs(avr.multiplexer, self.multiplexer)
+        self.assertIsNot(Jtagice3Multiplexer.for_transport(FakeTool()), self.multiplexer)
+
+    def test_sequence_numbers_are_shared(self):
+        housekeeper = self._attach(Jtagice3HousekeepingProtocol)
+        avr = self._attach(Avr8Protocol)
+        housekeeper.get_byte(0x00, 0x01)
+        avr.get_byte(0x00, 0x02)
+        self.assertEqual(avr.sequence_id, housekeeper.sequence_id + 1)
+
+    def test_unmatched_responses_give_up(self):
+        housekeeper = self._attach(Jtagice3HousekeepingProtocol)
+        self.tool.stale.extend([bytearray([0x0E, 0x99, 0x00, 0x01, 0x80, 0x00])] * 5)
+        with self.assertRaises(PyedbglibError):
+            housekeeper.get_byte(0x00, 0x05)
+        self.assertEqual(self.multiplexer.stale_responses, 4)
+
+    def test_legacy_response_without_handler_is_matched(self):
+        edbg = self._attach(EdbgProtocol)
+        edbg.check_command_exists = Mock(side_effect=NotImplementedError("CMD_EDBG_REFRESH_ID_CHIP"))
+        # Old EDBG firmware answers version 0 ID chip commands with a status byte where the handler should be
+        edbg.avr_response_receive = Mock(side_effect=lambda poll_class: bytearray(
+            [0x0E, self.tool.command[2], self.tool.command[3], EdbgProtocol.RSP_EDBG_OK]))
+        edbg.refresh_id_chip()
+        self.assertEqual(self.multiplexer.stale_responses, 0)
+
+    def test_kit_info_read_holds_the_lock(self):
+        edbg = EdbgProtocol(self.tool)
+        edbg.dap_command_response = Mock(side_effect=lambda packet: self.assertTrue(self.multiplexer.lock._is_owned())
+                                         or bytearray(8))
+        edbg.read_edbg_extra_info()
+        edbg.dap_command_response.assert_called_once_with(
+            bytearray([EdbgProtocol.AVR_GET_CONFIG, 0x01, EdbgProtocol.EDBG_CONFIG_KIT_DATA, 0x00]))
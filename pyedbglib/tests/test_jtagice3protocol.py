@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+from mock import Mock
+
+from pyedbglib.protocols.edbgprotocol import EdbgProtocol
+from pyedbglib.protocols.housekeepingprotocol import Jtagice3HousekeepingProtocol
+from pyedbglib.protocols.jtagice3multiplexer import Jtagice3Multiplexer
+from pyedbglib.protocols.jtagice3protocol import Jtagice3Protocol, Jtagice3ResponseError
+from pyedbglib.pyedbglib_errors import PyedbglibError
+from pyedbglib.util.querycache import QueryCacheStore
+
+
+class TestJtagice3BatchedParameters(unittest.TestCase):
+    """Tests for get_many and set_many in jtagice3protocol.Jtagice3Protocol"""
+
+    def setUp(self):
+        transport = Mock()
+        transport.get_report_size.return_value = 64
+        self.protocol = Jtagice3HousekeepingProtocol(transport)
+        self.contexts = {0x00: bytearray(range(0x10, 0x20)), 0x81: bytearray(range(0x40, 0x50))}
+        self.gets = []
+
+        def get_protocol(context, offset, numbytes):
+            self.gets.append((context, offset, numbytes))
+            return self.contexts[context][offset:offset + numbytes]
+
+        self.protocol._get_protocol = Mock(side_effect=get_protocol)
+        self.protocol._set_protocol = Mock()
+
+    def test_contiguous_gets_are_merged(self):
+        values = self.protocol.get_many([(0x00, 3, 2), (0x81, 2, 4), (0x00, 0, 3), (0x81, 3, 1), (0x00, 5, 1)])
+        self.assertEqual(values, [bytearray([0x13, 0x14]), bytearray([0x42, 0x43, 0x44, 0x45]),
+                                  bytearray([0x10, 0x11, 0x12]), bytearray([0x43]), bytearray([0x15])])
+        self.assertEqual(self.gets, [(0x00, 0, 6), (0x81, 2, 4), (0x81, 3, 1)])
+
+    def test_failed_merged_get_falls_back_to_single_gets(self):
+        def get_protocol(context, offset, numbytes):
+            self.gets.append((context, offset, numbytes))
+            if numbytes > 1:
+                raise Jtagice3ResponseError("Unable to GET", 0x10)
+            return bytearray([offset])
+
+        self.protocol._get_protocol.side_effect = get_protocol
+        self.assertEqual(self.protocol.get_many([(0x00, 0, 1), (0x00, 1, 1)]), [bytearray([0]), bytearray([1])])
+        self.assertEqual(self.gets, [(0x00, 0, 2), (0x00, 0, 1), (0x00, 1, 1)])
+
+    def test_invalid_merged_get_response_is_not_retried(self):
+        self.protocol._get_protocol.side_effect = PyedbglibError("Invalid token (0x00) in response.")
+        with self.assertRaises(PyedbglibError):
+            self.protocol.get_many([(0x00, 0, 1), (0x00, 1, 1)])
+        self.assertEqual(self.protocol._get_protocol.call_count, 1)
+
+    def test_contiguous_sets_are_merged(self):
+        self.protocol.set_many([(0x01, 1, [0x22]), (0x01, 0, [0x11]), (0x02, 0, [0x33])])
+        self.assertEqual([call[0] for call in self.protocol._set_protocol.call_args_list],
+                         [(0x01, 0, bytearray([0x11, 0x22])), (0x02, 0, bytearray([0x33]))])
+
+    def test_version_info_needs_few_round_trips(self):
+        versions = self.protocol.read_version_info()
+        self.assertEqual(versions['build'], 0x1413)
+        self.assertEqual(versions['host_id'], 0x45444342)
+        self.assertEqual(len(self.gets), 4)
+
+    def test_short_version_info_raises(self):
+        self.contexts[0x81] = bytearray(2)
+        with self.assertRaises(PyedbglibError):
+            self.protocol.read_version_info()
+
+
+class TestJtagice3QueryCache(unittest.TestCase):
+    """Tests for caching query results on the transport"""
+
+    def setUp(self):
+        self.transport = Mock()
+        self.transport.get_report_size.return_value = 64
+        self.transport.device.serial_number = "MCHP0001"
+        self.query_cache = Jtagice3Multiplexer.for_transport(self.transport).query_cache
+
+    def _protocol(self, protocol_class):
+        protocol = protocol_class(self.transport)
+        protocol.jtagice3_command_response = Mock(return_value=bytearray([0x81, 0x00, 0x50, 0x51, 0x7E]))
+        return protocol
+
+    def test_query_is_sent_once_per_session(self):
+        edbg = self._protocol(EdbgProtocol)
+        for _ in range(16):
+            edbg.check_command_exists(EdbgProtocol.CMD_EDBG_READ_ID_CHIP)
+        self.assertEqual(edbg.jtagice3_command_response.call_count, 1)
+        # Other handlers have their own query results
+        housekeeper = self._protocol(Jtagice3HousekeepingProtocol)
+        housekeeper.query(0x00)
+        self.assertEqual(housekeeper.jtagice3_command_response.call_count, 1)
+
+    def test_upgrade_mode_invalidates_queries(self):
+        housekeeper = self._protocol(Jtagice3HousekeepingProtocol)
+        housekeeper.query(0x00)
+        self.assertNotEqual(self.query_cache, {})
+        housekeeper.enter_upgrade_mode()
+        self.assertEqual(self.query_cache, {})
+
+    def test_start_session_invalidates_queries(self):
+        housekeeper = self._protocol(Jtagice3HousekeepingProtocol)
+        housekeeper.query(0x00)
+        housekeeper.jtagice3_command_response.return_value = bytearray([0x80, 0x00])
+        housekeeper.start_session()
+        self.assertEqual(self.query_cache, {})
+
+    def test_query_results_are_persisted_per_firmware(self):
+        self._protocol(EdbgProtocol).query(EdbgProtocol.EDBG_QUERY_COMMANDS)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = QueryCacheStore(os.path.join(directory, "queries.json"))
+        store.save(self.transport, "1.2.3")
+        saved = dict(self.query_cache)
+        self.query_cache.clear()
+        self.assertEqual(store.load(self.transport, "1.2.4"), 0)
+        self.assertEqual(store.load(self.transport, "1.2.3"), 1)
+        self.assertEqual(self.query_cache, saved)
+        self.assertNotEqual(saved, {})
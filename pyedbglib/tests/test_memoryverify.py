@@ -0,0 +1,63 @@
+import unittest
+from mock import Mock
+
+from pyedbglib.protocols.jtagice3protocol import Jtagice3ResponseError
+from pyedbglib.util.memoryverify import MemoryVerifier, crc32
+
+
+class TestMemoryVerifier(unittest.TestCase):
+    """Tests for CRC based memory verification"""
+
+    def setUp(self):
+        self.memory = bytearray([0xFF]) * 256
+        self.avr = Mock()
+        self.avr.memory_crc.side_effect = lambda memtype, address, length: crc32(self.memory[address:address + length])
+        self.avr.memory_read_stream.side_effect = \
+            lambda memtype, address, length: iter([self.memory[address:address + length]])
+
+    def test_crc32_check_value(self):
+        self.assertEqual(crc32(bytearray(b"123456789")), 0xCBF43926)
+
+    def test_matching_regions_are_not_read_back(self):
+        self.memory[0:64] = bytearray(range(64))
+        verifier = MemoryVerifier(self.avr, 0xB0, page_size=16, region_size=32)
+        self.assertTrue(verifier.verify([(0, bytearray(range(64)))]))
+        self.assertEqual(self.avr.memory_crc.call_count, 2)
+        self.avr.memory_read_stream.assert_not_called()
+
+    def test_diff_finds_changed_pages(self):
+        image = bytearray(range(64))
+        self.memory[0:64] = image
+        self.memory[40] = 0x00
+        verifier = MemoryVerifier(self.avr, 0xB0, page_size=16, region_size=32, host_crc=crc32)
+        self.assertEqual(verifier.diff([(0, image)]), {32: image[32:48]})
+        self.assertEqual(verifier.regions_read_back, 1)
+
+    def test_unmatched_crc_algorithm_falls_back_to_read_back(self):
+        self.memory[0:16] = bytearray([0x5A] * 16)
+        self.memory[16:32] = bytearray([0xA5] * 16)
+        verifier = MemoryVerifier(self.avr, 0xB0, page_size=16, host_crc=lambda data: 0, region_size=16)
+        self.assertTrue(verifier.verify([(0, bytearray([0x5A] * 16 + [0xA5] * 16))]))
+        self.assertEqual(verifier.regions_read_back, 2)
+        # The first region matched although its CRCs did not, so the tool's CRCs are not asked for again
+        self.assertFalse(verifier.crc_supported)
+        self.assertEqual(self.avr.memory_crc.call_count, 1)
+
+    def test_no_host_crc_reads_back(self):
+        image = bytearray(range(64))
+        self.memory[0:64] = image
+        verifier = MemoryVerifier(self.avr, 0xB0, page_size=16, region_size=32, host_crc=None)
+        self.assertTrue(verifier.verify([(0, image)]))
+        self.avr.memory_crc.assert_not_called()
+        self.assertEqual(verifier.regions_read_back, 2)
+
+    def test_crc_error_falls_back_to_read_back(self):
+        self.avr.memory_crc.side_effect = Jtagice3ResponseError("CRC failed", 0x43)
+        image = bytearray(range(64))
+        self.memory[0:64] = image
+        self.memory[40] = 0x00
+        verifier = MemoryVerifier(self.avr, 0xB0, page_size=16, region_size=32, host_crc=crc32)
+        self.assertEqual(verifier.diff([(0, image)]), {32: image[32:48]})
+        self.assertFalse(verifier.crc_supported)
+        self.assertEqual(self.avr.memory_crc.call_count, 1)
+        self.assertEqual(verifier.regions_read_back, 2)
@@ -0,0 +1,73 @@
+import unittest
+from mock import Mock
+
+from pyedbglib.primitive.primitivecontroller import PrimitiveController, PrimitiveControllerCommand, \
+    primitive_command_buffer
+from pyedbglib.protocols.ati import ATI_FRAME_PAYLOAD
+from pyedbglib.pyedbglib_errors import PyedbglibError
+
+
+class TestPrimitiveControllerCommand(unittest.TestCase):
+    """Tests for primitive command parameters"""
+
+    def test_parameters_in_bytestream(self):
+        command = PrimitiveControllerCommand(bytearray([0xAA, 0xBB]))
+        command.add_parameter(0x01, 0x12345678, flags=0x80)
+        command.add_parameter(0x02, 0x10)
+        self.assertEqual(command.generate_bytestream(),
+                         bytearray([0xFF, 0xFF, 0x02,
+                                    0x01, 0x80, 0x78, 0x56, 0x34, 0x12,
+                                    0x02, 0x00, 0x10, 0x00, 0x00, 0x00,
+                                    0xFF, 0xAA, 0xBB]))
+
+    def test_set_parameter_updates_value(self):
+        command = PrimitiveControllerCommand(bytearray())
+        command.add_parameter(0x01, 0x1000, flags=0x80)
+        command.set_parameter(0x01, 0x2000)
+        command.set_parameter(0x03, 0x04)
+        self.assertEqual(command.parameters, [bytearray([0x01, 0x80, 0x00, 0x20, 0x00, 0x00]),
+                                              bytearray([0x03, 0x00, 0x04, 0x00, 0x00, 0x00])])
+
+
+class TestPrimitiveController(unittest.TestCase):
+    """Tests for running primitive commands with parameters"""
+
+    def test_execute_with_parameters(self):
+        transport = Mock()
+        transport.get_report_size.return_value = 64
+        controller = PrimitiveController(transport)
+        sent = []
+        controller.send_frames = Mock(side_effect=lambda buffer_id, frames: sent.append(
+            bytearray().join(frame[ATI_FRAME_PAYLOAD:] for frame in frames)))
+        controller.receive_primitive_execution_response = Mock(side_effect=lambda: sent[-1][-8:-4])
+        controller.build_frames = Mock(side_effect=controller.build_frames)
+        command = controller.new_command(bytearray(range(100)))
+        command.add_parameter(0x01, 0)
+        results = controller.execute_with_parameters(command, [{0x01: 0x10}, {0x01: 0x20}, {0x02: 0x2000},
+                                                               {0x01: 0x30}])
+        # Built once, and again when a parameter is added
+        self.assertEqual(controller.build_frames.call_count, 2)
+        expected = PrimitiveControllerCommand(bytearray(range(100)))
+        expected.add_parameter(0x01, 0x10)
+        self.assertEqual(sent[0], primitive_command_buffer([expected.generate_bytestream()]))
+        expected.set_parameter(0x01, 0x20)
+        self.assertEqual(sent[1], primitive_command_buffer([expected.generate_bytestream()]))
+        expected.set_parameter(0x02, 0x2000)
+        self.assertEqual(sent[2], primitive_command_buffer([expected.generate_bytestream()]))
+        # Values set for one parameter set are kept for the next
+        expected.set_parameter(0x01, 0x30)
+        self.assertEqual(sent[3], primitive_command_buffer([expected.generate_bytestream()]))
+        self.assertEqual(len(results), 4)
+        # The caller's command keeps its parameter values
+        self.assertEqual(command.parameters, [bytearray([0x01, 0x00, 0x00, 0x00, 0x00, 0x00])])
+
+    def test_long_block_raises(self):
+        transport = Mock()
+        transport.get_report_size.return_value = 64
+        controller = PrimitiveController(transport)
+        controller.write_command_buffer = Mock()
+        with self.assertRaises(PyedbglibError):
+            controller.start_primitive_execution([bytearray(10), bytearray(256)])
+        controller.write_command_buffer.assert_not_called()
+        controller.start_primitive_execution([bytearray(255)])
+        controller.write_command_buffer.assert_called_once()
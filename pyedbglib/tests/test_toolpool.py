@@ -0,0 +1,56 @@
+import unittest
+from mock import MagicMock
+
+from pyedbglib.hidtransport.hidtransportbase import HidTool
+from pyedbglib.hidtransport.toolpool import ToolPool
+from pyedbglib.hidtransport.devicecache import device_cache
+
+SERIAL_NUMBERS = ["MCHP0001", "MCHP0002", "MCHP0003"]
+
+
+def _transport_factory():
+    transport = MagicMock()
+    transport.get_matching_tools.return_value = [HidTool(0x03EB, 0x2175, serial, "nEDBG CMSIS-DAP", "Microchip")
+                                                 for serial in SERIAL_NUMBERS]
+    transport.connect.return_value = True
+    return transport
+
+
+class TestToolPool(unittest.TestCase):
+    """Tests for running operations on several tools with ToolPool"""
+
+    def test_run_collects_results_and_errors_per_tool(self):
+        def operation(transport, offset):
+            serial_number = transport.connect.call_args[1]['serial_number']
+            if serial_number == "MCHP0002":
+                raise IOError("USB error")
+            return int(serial_number[-1]) + offset
+
+        with ToolPool(transport_factory=_transport_factory) as pool:
+            self.assertEqual(pool.serial_numbers(), SERIAL_NUMBERS)
+            results = pool.run(operation, 10)
+
+        self.assertEqual(results["MCHP0001"].value, 11)
+        self.assertEqual(results["MCHP0003"].value, 13)
+        self.assertFalse(results["MCHP0002"].ok)
+        self.assertIsInstance(results["MCHP0002"].error, IOError)
+
+    def test_close_disconnects_all_tools(self):
+        pool = ToolPool(transport_factory=_transport_factory)
+        pool.open()
+        transports = list(pool.transports.values())
+        pool.close()
+        for transport in transports:
+            transport.disconnect.assert_called_once_with()
+        self.assertEqual(pool.serial_numbers(), [])
+
+    def test_open_enumerates_once(self):
+        enumerate_function = MagicMock(return_value=[])
+
+        def transport_factory():
+            device_cache.get("test", enumerate_function)
+            return _transport_factory()
+
+        with ToolPool(transport_factory=transport_factory) as pool:
+            self.assertEqual(pool.serial_numbers(), SERIAL_NUMBERS)
+        self.assertEqual(enumerate_function.call_count, 1)
@@ -0,0 +1,32 @@
+import unittest
+
+from pyedbglib.util.writeplanner import FlashWritePlanner, WriteOperation
+
+
+class TestFlashWritePlanner(unittest.TestCase):
+    """Tests for flash write planning"""
+
+    def test_adjacent_pages_are_merged_and_padded(self):
+        planner = FlashWritePlanner(page_size=4)
+        operations = planner.plan([(0x02, [0x11, 0x22, 0x33, 0x44]), (0x06, [0x55])])
+        self.assertEqual(operations, [WriteOperation(WriteOperation.CHIP_ERASE),
+                                      WriteOperation(WriteOperation.WRITE, 0x00,
+                                                     bytearray([0xFF, 0xFF, 0x11, 0x22, 0x33, 0x44, 0x55, 0xFF]))])
+
+    def test_blank_pages_are_skipped_after_chip_erase(self):
+        planner = FlashWritePlanner(page_size=4)
+        operations = planner.plan({0x00: [0x01] * 4 + [0xFF] * 4 + [0x02] * 4})
+        self.assertEqual([(op.kind, op.address) for op in operations],
+                         [(WriteOperation.CHIP_ERASE, 0), (WriteOperation.WRITE, 0x00), (WriteOperation.WRITE, 0x08)])
+
+    def test_page_erase_only_touched_pages(self):
+        planner = FlashWritePlanner(page_size=4)
+        operations = planner.plan([(0x10, [0x01]), (0x20, [0xFF])], chip_erase=False)
+        self.assertEqual([(op.kind, op.address) for op in operations],
+                         [(WriteOperation.PAGE_ERASE, 0x10), (WriteOperation.PAGE_ERASE, 0x20),
+                          (WriteOperation.WRITE, 0x10)])
+
+    def test_writes_are_limited_to_max_write_size(self):
+        planner = FlashWritePlanner(page_size=4, max_write_size=10)
+        operations = planner.plan([(0x00, [0x00] * 20)])
+        self.assertEqual([len(op.data) for op in operations[1:]], [8, 8, 4])
@@ -0,0 +1,92 @@
+"""Back-off policy for polling a tool which is not ready yet"""
+
+import time
+
+# Prefer a clock which never goes backwards where available (Python 3)
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class PollBackoff(object):
+    """
+    Delay policy for polling
+
+    The first immediate_polls polls which find the tool not ready are retried straight away.  After that the delay
+    starts at initial_delay and is multiplied by factor for every poll, up to max_delay.  Polling gives up once
+    timeout has passed since the first poll.  All times are in seconds, and a timeout of None polls forever.
+    """
+
+    def __init__(self, initial_delay=0.001, factor=2.0, max_delay=0.05, timeout=None, immediate_polls=1):
+        # pylint: disable=too-many-arguments
+        self.initial_delay = initial_delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.immediate_polls = immediate_polls
+
+    def start(self, timeout=None):
+        """
+        Starts polling according to this policy
+
+        :param timeout: timeout in seconds overriding the policy timeout, None to use the policy timeout
+        :return: BackoffPoller instance
+        """
+        return BackoffPoller(self, self.timeout if timeout is None else timeout)
+
+
+class BackoffPoller(object):
+    """Keeps track of the delays and the deadline while polling according to a PollBackoff policy"""
+
+    def __init__(self, policy, timeout):
+        self.policy = policy
+        self.polls = 0
+        self.delay = policy.initial_delay
+        self.deadline = None if timeout is None else _clock() + timeout
+
+    def remaining(self):
+        """
+        Get the time left before the deadline
+
+        :return: seconds left (never negative), or None if there is no deadline
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - _clock())
+
+    def expired(self):
+        """
+        Check if the deadline has passed
+
+        :return: True if polling should give up
+        """
+        return self.deadline is not None and _clock() >= self.deadline
+
+    def next_delay(self):
+        """
+        Records a poll which found the tool not ready and works out how long to wait before the next poll
+
+        :return: delay in seconds, or None if the deadline has passed
+        """
+        self.polls += 1
+        if self.expired():
+            return None
+        if self.polls <= self.policy.immediate_polls:
+            return 0.0
+        delay = self.delay
+        self.delay = min(self.delay * self.policy.factor, self.policy.max_delay)
+        remaining = self.remaining()
+        if remaining is not None:
+            delay = min(delay, remaining)
+        return delay
+
+    def wait(self):
+        """
+        Records a poll which found the tool not ready and sleeps before the next poll
+
+        :return: False if the deadline has passed and polling should give up, True otherwise
+        """
+        delay = self.next_delay()
+        if delay is None:
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
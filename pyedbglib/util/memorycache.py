@@ -0,0 +1,82 @@
+"""Host-side cache of target memory, for use while the target is halted"""
+
+
+class MemoryCache(object):
+    """
+    Caches target memory in aligned blocks, by memory type
+
+    Reads are rounded out to whole blocks, and blocks missing from the cache are fetched with as few reads as
+    possible.  The owner must call invalidate whenever target memory may have changed.
+    """
+
+    def __init__(self, block_size=16, block_sizes=None, max_fetch=None):
+        """
+        :param block_size: default block size in bytes
+        :param block_sizes: function returning the block size in bytes of a memory type, or None to use block_size.
+            It is called at every read, and the blocks cached for a memory type are dropped when its size changes
+        :param max_fetch: function returning the largest read in bytes for a memory type, None for no limit
+        """
+        self.block_size = block_size
+        self.block_sizes = block_sizes
+        self.max_fetch = max_fetch
+        self._blocks = {}
+        # Number of reads served without accessing the target, and number of fetches from the target
+        self.hits = 0
+        self.fetches = 0
+
+    def invalidate(self, memtype=None):
+        """
+        Forgets cached memory
+
+        :param memtype: memory type to forget, None to forget all
+        """
+        if memtype is None:
+            self._blocks.clear()
+        else:
+            self._blocks.pop(memtype, None)
+
+    def _fetch_size(self, memtype, block_size):
+        """Get the largest number of whole blocks to fetch in one read, in bytes"""
+        if self.max_fetch is None:
+            return None
+        limit = self.max_fetch(memtype)
+        return max(block_size, limit - limit % block_size)
+
+    def read(self, memtype, address, num_bytes, fetch):
+        """
+        Reads memory through the cache
+
+        :param memtype: memory type
+        :param address: start address
+        :param num_bytes: number of bytes
+        :param fetch: function reading from the target, called as fetch(memtype, address, num_bytes)
+        :return: bytearray of data
+        """
+        block_size = (self.block_sizes and self.block_sizes(memtype)) or self.block_size
+        cached_block_size, blocks = self._blocks.get(memtype, (None, None))
+        if cached_block_size != block_size:
+            blocks = {}
+            self._blocks[memtype] = (block_size, blocks)
+        first = address - address % block_size
+        end = address + num_bytes
+        missing = [block for block in range(first, end, block_size) if block not in blocks]
+        if not missing:
+            self.hits += 1
+        fetch_size = self._fetch_size(memtype, block_size)
+
+        # Fetch runs of consecutive missing blocks in one read each
+        index = 0
+        while index < len(missing):
+            start = missing[index]
+            count = 1
+            while (index + count < len(missing) and missing[index + count] == start + count * block_size and
+                   (fetch_size is None or (count + 1) * block_size <= fetch_size)):
+                count += 1
+            data = bytearray(fetch(memtype, start, count * block_size))
+            self.fetches += 1
+            for block in range(count):
+                blocks[start + block * block_size] = data[block * block_size:(block + 1) * block_size]
+            index += count
+
+        data = bytearray().join(blocks[block] for block in range(first, end, block_size))
+        return data[address - first:end - first]
@@ -0,0 +1,123 @@
+"""Verifying and diffing target memory against an image, optionally using target-side CRCs"""
+
+import binascii
+from logging import getLogger
+from ..protocols.jtagice3protocol import Jtagice3ResponseError
+from .writeplanner import FlashWritePlanner
+
+
+def crc32(data):
+    """
+    Computes the CRC-32 of data, as in IEEE 802.3 (reflected polynomial 0xEDB88320, initial and final XOR 0xFFFFFFFF)
+
+    This is the default host CRC used to check the CRCs returned by CMD_AVR8_CRC.
+
+    :param data: bytearray
+    :return: CRC as an unsigned 32-bit value
+    """
+    return binascii.crc32(bytes(data)) & 0xFFFFFFFF
+
+
+class MemoryVerifier(object):
+    """
+    Finds the pages of an image which differ from target memory
+
+    The image is split into regions of whole pages.  Without a host_crc every region is read back and compared.  With
+    a host_crc matching the algorithm of the tool, the CRC of each region is computed by the tool and compared with
+    the same CRC computed on the host, so matching regions are never read back.  Regions whose CRCs differ are read
+    back and compared page by page, so the result never depends on the host and tool CRCs agreeing: a CRC mismatch
+    only costs a read.  CRCs are not used again by this verifier if the tool rejects the CRC command, or if a region
+    whose CRCs differ turns out to match, as the tool then uses another algorithm than host_crc.
+    """
+
+    def __init__(self, avr, memtype, page_size, region_size=4096, host_crc=crc32, crc_mask=0xFFFFFFFF):
+        """
+        :param avr: Avr8Protocol instance
+        :param memtype: memory type to verify
+        :param page_size: page size in bytes
+        :param region_size: bytes covered by one CRC command, rounded down to whole pages
+        :param host_crc: function computing the CRC of a bytearray the same way as the tool, None to read back all
+            regions.  Defaults to crc32
+        :param crc_mask: bits of the CRC to compare, for example 0xFFFFFF for tools returning 24-bit CRCs
+        """
+        # pylint: disable=too-many-arguments
+        self.logger = getLogger(__name__)
+        self.avr = avr
+        self.memtype = memtype
+        self.planner = FlashWritePlanner(page_size)
+        self.page_size = page_size
+        self.region_size = max(page_size, region_size - region_size % page_size)
+        self.host_crc = host_crc
+        self.crc_mask = crc_mask
+        # False once the tool has rejected a CRC command or its CRCs have not matched host_crc
+        self.crc_supported = host_crc is not None
+        # Number of regions read back in the last diff
+        self.regions_read_back = 0
+
+    def _crc_matches(self, address, data):
+        """
+        Compares the CRC of a region on the tool with the CRC of the data
+
+        :param address: region address
+        :param data: expected region data
+        :return: True if the CRCs match, False if they differ or CRCs are not supported
+        """
+        if not self.crc_supported:
+            return False
+        try:
+            target_crc = self.avr.memory_crc(self.memtype, address, len(data))
+        except Jtagice3ResponseError as error:
+            self.logger.info("Memory CRC not supported (%s), reading back instead", error)
+            self.crc_supported = False
+            return False
+        return (self.host_crc(data) ^ target_crc) & self.crc_mask == 0
+
+    def _regions(self, pages):
+        """
+        Groups pages into contiguous regions of up to region_size bytes
+
+        :param pages: dict of page data by page address
+        :return: list of (address, data) regions
+        """
+        regions = []
+        for page_address in sorted(pages):
+            if regions:
+                address, data = regions[-1]
+                if address + len(data) == page_address and len(data) < self.region_size:
+                    data.extend(pages[page_address])
+                    continue
+            regions.append((page_address, bytearray(pages[page_address])))
+        return regions
+
+    def diff(self, image):
+        """
+        Finds the pages of an image which differ from target memory
+
+        :param image: iterable of (address, data) segments, or a dict of data by address
+        :return: dict of page data from the image by page address, for the pages which differ
+        """
+        self.regions_read_back = 0
+        changed = {}
+        for address, data in self._regions(self.planner.paginate(image)):
+            crc_checked = self.crc_supported
+            if self._crc_matches(address, data):
+                continue
+            self.regions_read_back += 1
+            target_data = bytearray().join(self.avr.memory_read_stream(self.memtype, address, len(data)))
+            if crc_checked and self.crc_supported and target_data == data:
+                self.logger.info("Memory CRC does not match the host CRC algorithm, reading back instead")
+                self.crc_supported = False
+            for offset in range(0, len(data), self.page_size):
+                page = data[offset:offset + self.page_size]
+                if target_data[offset:offset + self.page_size] != page:
+                    changed[address + offset] = page
+        return changed
+
+    def verify(self, image):
+        """
+        Checks that target memory matches an image
+
+        :param image: iterable of (address, data) segments, or a dict of data by address
+        :return: True if all of the image matches
+        """
+        return not self.diff(image)
@@ -0,0 +1,79 @@
+"""Persistent storage of protocol query results, by tool serial number and firmware version"""
+
+import json
+from logging import getLogger
+from ..protocols.jtagice3multiplexer import Jtagice3Multiplexer
+
+
+class QueryCacheStore(object):
+    """
+    Saves the query results shared by the protocol objects on a transport to a JSON file, and loads them back in
+    later sessions
+
+    Results are stored per tool serial number and firmware version, so results saved before a firmware upgrade are
+    never used with the new firmware.  Example::
+
+        store = QueryCacheStore("pyedbglib_queries.json")
+        housekeeper.start_session()
+        versions = housekeeper.read_version_info()
+        firmware = "{}.{}.{}".format(versions['firmware_major'], versions['firmware_minor'], versions['build'])
+        store.load(transport, firmware)
+        ...
+        store.save(transport, firmware)
+    """
+
+    def __init__(self, path):
+        """
+        :param path: JSON file to store query results in
+        """
+        self.logger = getLogger(__name__)
+        self.path = path
+
+    @staticmethod
+    def _tool_key(transport, firmware_version):
+        """Get the key identifying a tool and firmware version in the file"""
+        return "{}/{}".format(transport.device.serial_number, firmware_version)
+
+    def _read(self):
+        """
+        Reads the file
+
+        :return: dict of stored results by tool key, empty if the file is missing or unreadable
+        """
+        try:
+            with open(self.path, 'r') as store:
+                return json.load(store)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def load(self, transport, firmware_version):
+        """
+        Adds the query results stored for the connected tool to the query cache of the transport
+
+        Load after start_session, which clears the query cache.
+
+        :param transport: connected transport
+        :param firmware_version: firmware version string of the tool
+        :return: number of query results loaded
+        """
+        entries = self._read().get(self._tool_key(transport, firmware_version), {})
+        cache = Jtagice3Multiplexer.for_transport(transport).query_cache
+        for key, data in entries.items():
+            handler, context = key.split(":")
+            cache[(int(handler), int(context))] = bytearray(data)
+        self.logger.debug("Loaded %d query results from %s", len(entries), self.path)
+        return len(entries)
+
+    def save(self, transport, firmware_version):
+        """
+        Stores the query results in the query cache of the transport for the connected tool
+
+        :param transport: connected transport
+        :param firmware_version: firmware version string of the tool
+        """
+        stored = self._read()
+        stored[self._tool_key(transport, firmware_version)] = dict(
+            ("{}:{}".format(handler, context), list(data))
+            for (handler, context), data in Jtagice3Multiplexer.for_transport(transport).query_cache.items())
+        with open(self.path, 'w') as store:
+            json.dump(stored, store, indent=1, sort_keys=True)
@@ -0,0 +1,130 @@
+"""Page-aware planning of flash writes from a sparse memory image"""
+
+
+class WriteOperation(object):
+    """One command in a flash write plan"""
+
+    CHIP_ERASE = 'chip_erase'
+    PAGE_ERASE = 'page_erase'
+    WRITE = 'write'
+
+    def __init__(self, kind, address=0, data=None):
+        """
+        :param kind: CHIP_ERASE, PAGE_ERASE or WRITE
+        :param address: page address to erase or start address to write
+        :param data: bytearray to write, whole pages
+        """
+        self.kind = kind
+        self.address = address
+        self.data = data
+
+    def __eq__(self, other):
+        return (isinstance(other, WriteOperation) and
+                (self.kind, self.address, self.data) == (other.kind, other.address, other.data))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        if self.kind == self.WRITE:
+            return "WriteOperation({}, 0x{:08X}, {} bytes)".format(self.kind, self.address, len(self.data))
+        return "WriteOperation({}, 0x{:08X})".format(self.kind, self.address)
+
+
+class FlashWritePlanner(object):
+    """
+    Plans the fewest commands needed to program a sparse memory image into flash
+
+    Data is padded with the erased value to whole pages.  Adjacent pages are merged into writes of up to
+    max_write_size bytes.  After a chip erase, pages which are all erased value are not written at all.  Without a
+    chip erase, each page touched by the image is page erased first.
+    """
+
+    def __init__(self, page_size, max_write_size=None, erased_value=0xFF):
+        """
+        :param page_size: flash page size in bytes
+        :param max_write_size: largest write in bytes, rounded down to whole pages, None for no limit
+        :param erased_value: value of an erased flash byte
+        """
+        if page_size <= 0:
+            raise ValueError("Invalid page size {}".format(page_size))
+        self.page_size = page_size
+        if max_write_size is not None:
+            max_write_size = max(page_size, max_write_size - max_write_size % page_size)
+        self.max_write_size = max_write_size
+        self.erased_value = erased_value
+
+    def paginate(self, image):
+        """
+        Splits a sparse memory image into pages
+
+        :param image: iterable of (address, data) segments, or a dict of data by address.  Later segments
+            overwrite earlier ones where they overlap
+        :return: dict of page data by page address
+        """
+        if isinstance(image, dict):
+            image = sorted(image.items())
+        pages = {}
+        for address, data in image:
+            data = memoryview(bytearray(data))
+            offset = 0
+            while offset < len(data):
+                page_address = (address + offset) - (address + offset) % self.page_size
+                page_offset = address + offset - page_address
+                size = min(self.page_size - page_offset, len(data) - offset)
+                page = pages.get(page_address)
+                if page is None:
+                    page = bytearray([self.erased_value]) * self.page_size
+                    pages[page_address] = page
+                page[page_offset:page_offset + size] = data[offset:offset + size]
+                offset += size
+        return pages
+
+    def plan(self, image, chip_erase=True):
+        """
+        Plans the commands needed to program an image
+
+        :param image: iterable of (address, data) segments, or a dict of data by address
+        :param chip_erase: True to start with a chip erase, False to erase only the pages written
+        :return: list of WriteOperation
+        """
+        pages = self.paginate(image)
+        blank = bytearray([self.erased_value]) * self.page_size
+        operations = []
+        if chip_erase:
+            operations.append(WriteOperation(WriteOperation.CHIP_ERASE))
+        else:
+            for page_address in sorted(pages):
+                operations.append(WriteOperation(WriteOperation.PAGE_ERASE, page_address))
+
+        write = None
+        for page_address in sorted(pages):
+            page = pages[page_address]
+            if page == blank:
+                # Already erased
+                continue
+            if (write is not None and write.address + len(write.data) == page_address and
+                    (self.max_write_size is None or len(write.data) < self.max_write_size)):
+                write.data.extend(page)
+            else:
+                write = WriteOperation(WriteOperation.WRITE, page_address, bytearray(page))
+                operations.append(write)
+        return operations
+
+
+def execute_plan(avr, operations, memtype, chip_erase_mode=0):
+    """
+    Executes a flash write plan on an AVR8 protocol instance
+
+    :param avr: Avr8Protocol instance
+    :param operations: list of WriteOperation from FlashWritePlanner.plan
+    :param memtype: memory type to write
+    :param chip_erase_mode: erase mode used for chip erase
+    """
+    for operation in operations:
+        if operation.kind == WriteOperation.CHIP_ERASE:
+            avr.erase(chip_erase_mode)
+        elif operation.kind == WriteOperation.PAGE_ERASE:
+            avr.page_erase(operation.address)
+        else:
+            avr.memory_write(memtype, operation.address, operation.data)
@@ -81,6 +81,7 @@ setup(
     install_requires=[
         'cython<0.29.8;python_version<="2.7"', # To ensure there exists a wheel for win32/py27
         'cython;python_version>="3"', # No requirements going forward
+        'futures;python_version<"3"', # concurrent.futures backport
         'hidapi',
         'pyserial'
     ],